@@ -11,3 +11,20 @@ from .prompts import *
 from .server import *
 from .worker import *
 from .batch import *
+from .asset_index import *
+from .lod import *
+from .bounds import *
+from .asset_cache import *
+from .cache_manager import *
+from .datablock_cache import *
+from .pipeline import *
+from .chunks import *
+from .combination_store import *
+from .uploader import *
+from .progress import *
+from .scheduler import *
+from .locality import *
+from .autoscaler import *
+from .offers import *
+from .benchmark import *
+from .ledger import *
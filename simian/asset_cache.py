@@ -0,0 +1,197 @@
+import errno
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no fcntl
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Point SIMIAN_CACHE_ROOT at a shared volume to share downloads between processes and containers
+CACHE_ROOT = os.environ.get(
+    "SIMIAN_CACHE_ROOT", os.path.join(os.path.expanduser("~"), ".simian")
+)
+DOWNLOAD_TIMEOUT = 60
+STALE_LOCK_TIMEOUT = 3600
+
+_inflight_locks: Dict[str, threading.Lock] = {}
+_inflight_guard = threading.Lock()
+
+
+def get_cache_path(*parts: str) -> str:
+    """
+    Get a path inside the shared cache root.
+
+    Args:
+        *parts (str): Path components relative to the cache root.
+
+    Returns:
+        str: The absolute cache path.
+    """
+    return os.path.join(CACHE_ROOT, *parts)
+
+
+@functools.lru_cache(maxsize=None)
+def get_http_session() -> requests.Session:
+    """
+    Get the HTTP session shared by all downloads of this process.
+
+    Returns:
+        requests.Session: A session with a connection pool large enough for concurrent downloads.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _get_inflight_lock(path: str) -> threading.Lock:
+    """
+    Get the in-process lock that deduplicates concurrent fetches of a path.
+
+    Args:
+        path (str): The cached file path.
+
+    Returns:
+        threading.Lock: The lock for the path.
+    """
+    with _inflight_guard:
+        return _inflight_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+@contextmanager
+def file_lock(path: str, poll_interval: float = 0.1) -> Iterator[None]:
+    """
+    Hold an exclusive, host-wide lock on `<path>.lock`.
+
+    Uses `fcntl.flock` where available, which is released automatically if the process
+    dies. Elsewhere an exclusively created lock file is used, and lock files older than
+    STALE_LOCK_TIMEOUT are treated as abandoned.
+
+    Args:
+        path (str): The path to lock.
+        poll_interval (float, optional): Seconds between attempts without fcntl. Defaults to 0.1.
+
+    Yields:
+        None
+    """
+    lock_path = f"{path}.lock"
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+
+    if fcntl is not None:
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return
+
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            try:
+                if time.time() - os.path.getmtime(lock_path) > STALE_LOCK_TIMEOUT:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(poll_interval)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+
+@contextmanager
+def single_flight(path: str) -> Iterator[None]:
+    """
+    Hold both the in-process and the host-wide lock for a cached path.
+
+    Callers should check again whether the file exists once they hold the lock, since
+    another thread or process may have fetched it in the meantime.
+
+    Args:
+        path (str): The cached file path.
+
+    Yields:
+        None
+    """
+    with _get_inflight_lock(path):
+        with file_lock(path):
+            yield
+
+
+def fetch_cached(path: str, fetch: Callable[[str], None]) -> str:
+    """
+    Make sure a cached file exists, fetching it at most once across threads and processes.
+
+    Concurrent callers in the same process wait on the in-flight fetch instead of
+    starting their own, and other processes wait on the file lock. `fetch` is called
+    with a temporary path and the file is renamed into place only after it returns,
+    so readers never see a partially written file.
+
+    Args:
+        path (str): The cached file path.
+        fetch (Callable[[str], None]): Writes the file to the path it is given.
+
+    Returns:
+        str: The cached file path.
+    """
+    if os.path.exists(path):
+        return path
+
+    with single_flight(path):
+        if os.path.exists(path):
+            return path
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            fetch(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return path
+
+
+def download_to_cache(url: str, path: str, timeout: float = DOWNLOAD_TIMEOUT) -> str:
+    """
+    Download a url into the cache unless it is already there.
+
+    Args:
+        url (str): The url to download.
+        path (str): The cached file path.
+        timeout (float, optional): Connect and read timeout in seconds. Defaults to DOWNLOAD_TIMEOUT.
+
+    Returns:
+        str: The cached file path.
+    """
+
+    def fetch(tmp_path: str) -> None:
+        response = get_http_session().get(url, stream=True, timeout=timeout)
+        try:
+            response.raise_for_status()
+            with open(tmp_path, "wb") as file:
+                for chunk in response.iter_content(1024 * 1024):
+                    file.write(chunk)
+        finally:
+            response.close()
+
+    return fetch_cached(path, fetch)
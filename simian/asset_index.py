@@ -0,0 +1,483 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import bpy
+
+from .bounds import get_object_bounds
+from .object import load_object
+from .scene import initialize_scene
+from .vendor import objaverse
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+"""
+Columns stored for every scanned asset in the asset index.
+
+- "uid": The Objaverse uid of the object.
+- "status": "ok" if the object imported cleanly, "failed" if it did not and
+  "scanning" while a scan process is working on it.
+- "error": The error message of a failed scan.
+- "face_count" / "vertex_count": Total geometry over all meshes of the object.
+- "bbox_x" / "bbox_y" / "bbox_z": World-space bounding box size after import.
+- "has_armature" / "has_modifiers": Whether the object needs armature or modifier baking.
+- "texture_count" / "max_texture_size" / "texture_pixels": Embedded image statistics.
+- "file_size": Size of the downloaded file in bytes.
+- "import_time": Seconds spent importing the file into Blender.
+- "scanned_at": Unix timestamp of the scan.
+"""
+ASSET_INDEX_COLUMNS: Dict[str, str] = {
+    "uid": "TEXT PRIMARY KEY",
+    "status": "TEXT NOT NULL",
+    "error": "TEXT",
+    "face_count": "INTEGER",
+    "vertex_count": "INTEGER",
+    "bbox_x": "REAL",
+    "bbox_y": "REAL",
+    "bbox_z": "REAL",
+    "has_armature": "INTEGER",
+    "has_modifiers": "INTEGER",
+    "texture_count": "INTEGER",
+    "max_texture_size": "INTEGER",
+    "texture_pixels": "INTEGER",
+    "file_size": "INTEGER",
+    "import_time": "REAL",
+    "scanned_at": "REAL",
+}
+
+
+def open_asset_index(index_path: str) -> sqlite3.Connection:
+    """
+    Open the asset index database, creating it if it does not exist.
+
+    The database runs in WAL mode so several scan processes can write to it at once.
+
+    Args:
+        index_path (str): Path to the SQLite file.
+
+    Returns:
+        sqlite3.Connection: The open connection.
+    """
+    index_dir = os.path.dirname(index_path)
+    if index_dir:
+        os.makedirs(index_dir, exist_ok=True)
+
+    conn = sqlite3.connect(index_path, timeout=60)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    columns = ", ".join(f"{name} {kind}" for name, kind in ASSET_INDEX_COLUMNS.items())
+    conn.execute(f"CREATE TABLE IF NOT EXISTS assets ({columns})")
+    conn.commit()
+    return conn
+
+
+def record_asset_stats(conn: sqlite3.Connection, stats: Dict[str, Any]) -> None:
+    """
+    Insert or replace the row of a single asset.
+
+    Args:
+        conn (sqlite3.Connection): Connection returned by `open_asset_index`.
+        stats (Dict[str, Any]): Asset statistics, keyed by column name. Must contain "uid" and "status".
+
+    Returns:
+        None
+    """
+    stats = {key: value for key, value in stats.items() if key in ASSET_INDEX_COLUMNS}
+    stats.setdefault("scanned_at", time.time())
+    columns = ", ".join(stats.keys())
+    placeholders = ", ".join("?" for _ in stats)
+    conn.execute(
+        f"INSERT OR REPLACE INTO assets ({columns}) VALUES ({placeholders})",
+        list(stats.values()),
+    )
+    conn.commit()
+
+
+def get_scanned_uids(conn: sqlite3.Connection) -> set:
+    """
+    Get the uids that already have a finished scan, successful or not.
+
+    Args:
+        conn (sqlite3.Connection): Connection returned by `open_asset_index`.
+
+    Returns:
+        set: The uids with status "ok" or "failed".
+    """
+    rows = conn.execute("SELECT uid FROM assets WHERE status != 'scanning'")
+    return {row["uid"] for row in rows}
+
+
+def load_asset_index(index_path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Load the whole asset index into memory.
+
+    Args:
+        index_path (str): Path to the SQLite file.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: A dictionary mapping the uid to its row.
+    """
+    conn = open_asset_index(index_path)
+    try:
+        rows = conn.execute("SELECT * FROM assets WHERE status != 'scanning'")
+        return {row["uid"]: dict(row) for row in rows}
+    finally:
+        conn.close()
+
+
+def filter_asset_uids(
+    uids: List[str],
+    asset_index: Dict[str, Dict[str, Any]],
+    max_faces: Optional[int] = None,
+    max_import_time: Optional[float] = None,
+    max_texture_size: Optional[int] = None,
+    include_unscanned: bool = True,
+) -> List[str]:
+    """
+    Filter uids by the properties recorded in the asset index.
+
+    Assets that failed to import are always dropped.
+
+    Args:
+        uids (List[str]): The candidate uids.
+        asset_index (Dict[str, Dict[str, Any]]): The index returned by `load_asset_index`.
+        max_faces (Optional[int]): Drop assets with more faces than this. Defaults to None.
+        max_import_time (Optional[float]): Drop assets that took longer than this many seconds to import. Defaults to None.
+        max_texture_size (Optional[int]): Drop assets with a larger embedded texture. Defaults to None.
+        include_unscanned (bool): Keep uids that are not in the index. Defaults to True.
+
+    Returns:
+        List[str]: The uids that pass all filters, in their original order.
+    """
+    filtered = []
+    for uid in uids:
+        stats = asset_index.get(uid)
+        if stats is None:
+            if include_unscanned:
+                filtered.append(uid)
+            continue
+        if stats["status"] != "ok":
+            continue
+        if max_faces is not None and (stats["face_count"] or 0) > max_faces:
+            continue
+        if max_import_time is not None and (stats["import_time"] or 0) > max_import_time:
+            continue
+        if (
+            max_texture_size is not None
+            and (stats["max_texture_size"] or 0) > max_texture_size
+        ):
+            continue
+        filtered.append(uid)
+    return filtered
+
+
+def get_asset_weights(
+    uids: List[str], asset_index: Dict[str, Dict[str, Any]]
+) -> List[float]:
+    """
+    Weight uids inversely to their measured import cost, so cheap assets are sampled more often.
+
+    Unscanned uids get the weight of an asset with the median import time.
+
+    Args:
+        uids (List[str]): The uids to weight.
+        asset_index (Dict[str, Dict[str, Any]]): The index returned by `load_asset_index`.
+
+    Returns:
+        List[float]: One weight per uid.
+    """
+    import_times = sorted(
+        stats["import_time"]
+        for stats in asset_index.values()
+        if stats["status"] == "ok" and stats["import_time"] is not None
+    )
+    median_time = import_times[len(import_times) // 2] if import_times else 1.0
+
+    weights = []
+    for uid in uids:
+        stats = asset_index.get(uid)
+        if stats is None or stats["import_time"] is None:
+            import_time = median_time
+        else:
+            import_time = stats["import_time"]
+        weights.append(1.0 / (1.0 + import_time))
+    return weights
+
+
+def scan_object(uid: str, object_path: str) -> Dict[str, Any]:
+    """
+    Import an object into an empty scene and measure its properties.
+
+    Args:
+        uid (str): The uid of the object.
+        object_path (str): Local path to the object file.
+
+    Returns:
+        Dict[str, Any]: The statistics of the object, keyed by asset index column.
+    """
+    initialize_scene()
+
+    start_time = time.time()
+    load_object(object_path)
+    import_time = time.time() - start_time
+
+    face_count = 0
+    vertex_count = 0
+    has_armature = False
+    has_modifiers = False
+    min_coord = [float("inf")] * 3
+    max_coord = [-float("inf")] * 3
+
+    for obj in bpy.context.scene.objects:
+        if obj.type == "ARMATURE":
+            has_armature = True
+        if obj.type != "MESH":
+            continue
+        face_count += len(obj.data.polygons)
+        vertex_count += len(obj.data.vertices)
+        for modifier in obj.modifiers:
+            has_modifiers = True
+            if modifier.type == "ARMATURE":
+                has_armature = True
+        bbox_min, bbox_max = get_object_bounds(obj) or (min_coord, max_coord)
+        min_coord = [min(min_coord[i], bbox_min[i]) for i in range(3)]
+        max_coord = [max(max_coord[i], bbox_max[i]) for i in range(3)]
+
+    if face_count == 0:
+        min_coord = max_coord = [0.0, 0.0, 0.0]
+
+    texture_sizes = [
+        tuple(image.size)
+        for image in bpy.data.images
+        if image.type == "IMAGE" and image.size[0] > 0
+    ]
+
+    return {
+        "uid": uid,
+        "status": "ok",
+        "error": None,
+        "face_count": face_count,
+        "vertex_count": vertex_count,
+        "bbox_x": max_coord[0] - min_coord[0],
+        "bbox_y": max_coord[1] - min_coord[1],
+        "bbox_z": max_coord[2] - min_coord[2],
+        "has_armature": int(has_armature),
+        "has_modifiers": int(has_modifiers),
+        "texture_count": len(texture_sizes),
+        "max_texture_size": max((max(size) for size in texture_sizes), default=0),
+        "texture_pixels": sum(width * height for width, height in texture_sizes),
+        "file_size": os.path.getsize(object_path),
+        "import_time": import_time,
+    }
+
+
+def scan_objects(uids: List[str], index_path: str) -> None:
+    """
+    Download and scan objects one after another, recording each one in the index.
+
+    Before an object is scanned its row is marked "scanning", so a crash of the
+    process can be attributed to the right asset by the parent job.
+
+    Args:
+        uids (List[str]): The uids to scan.
+        index_path (str): Path to the SQLite file.
+
+    Returns:
+        None
+    """
+    conn = open_asset_index(index_path)
+    for uid in uids:
+        record_asset_stats(conn, {"uid": uid, "status": "scanning"})
+        try:
+            object_paths = objaverse.load_objects([uid])
+            if uid not in object_paths:
+                raise ValueError(f"Could not download object {uid}")
+            stats = scan_object(uid, object_paths[uid])
+        except Exception as e:
+            logger.error(f"Failed to scan {uid}: {e}")
+            stats = {"uid": uid, "status": "failed", "error": str(e)}
+        record_asset_stats(conn, stats)
+    conn.close()
+
+
+def _scan_chunk(uids: List[str], index_path: str, timeout: int) -> None:
+    """
+    Scan a chunk of uids in child processes until every uid has a finished row.
+
+    If a child process crashes or times out, the uid it was working on is recorded
+    as failed and a new process continues with the rest of the chunk.
+
+    Args:
+        uids (List[str]): The uids to scan.
+        index_path (str): Path to the SQLite file.
+        timeout (int): Maximum time in seconds for a child process.
+
+    Returns:
+        None
+    """
+    remaining = list(uids)
+    while remaining:
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump(remaining, f)
+            uids_file = f.name
+
+        command = [
+            sys.executable,
+            "-m",
+            "simian.asset_index",
+            "--",
+            "--worker",
+            "--uids_file",
+            uids_file,
+            "--index_path",
+            index_path,
+        ]
+        error = None
+        try:
+            result = subprocess.run(command, timeout=timeout, check=False)
+            if result.returncode != 0:
+                error = f"Scan process exited with code {result.returncode}"
+        except subprocess.TimeoutExpired:
+            error = f"Scan process timed out after {timeout} seconds"
+        finally:
+            os.remove(uids_file)
+
+        conn = open_asset_index(index_path)
+        if error is not None:
+            placeholders = ", ".join("?" for _ in remaining)
+            conn.execute(
+                f"UPDATE assets SET status = 'failed', error = ?, scanned_at = ? "
+                f"WHERE status = 'scanning' AND uid IN ({placeholders})",
+                [error, time.time(), *remaining],
+            )
+            conn.commit()
+        scanned = get_scanned_uids(conn)
+        conn.close()
+
+        still_remaining = [uid for uid in remaining if uid not in scanned]
+        if len(still_remaining) == len(remaining):
+            # the process made no progress at all, retrying would loop forever
+            logger.error(f"Scan process failed before scanning any object: {error}")
+            break
+        remaining = still_remaining
+
+
+def run_asset_scan(
+    uids: List[str],
+    index_path: str,
+    processes: int = 4,
+    chunk_size: int = 50,
+    timeout: int = 3600,
+    rescan: bool = False,
+) -> None:
+    """
+    Scan a list of objects in parallel and record their properties in the asset index.
+
+    Args:
+        uids (List[str]): The uids to scan.
+        index_path (str): Path to the SQLite file.
+        processes (int): Number of scan processes to run at once. Defaults to 4.
+        chunk_size (int): Number of objects handled by one process. Defaults to 50.
+        timeout (int): Maximum time in seconds for one process. Defaults to 3600.
+        rescan (bool): Scan objects that are already in the index again. Defaults to False.
+
+    Returns:
+        None
+    """
+    conn = open_asset_index(index_path)
+    if not rescan:
+        scanned = get_scanned_uids(conn)
+        uids = [uid for uid in uids if uid not in scanned]
+    conn.close()
+
+    logger.info(f"Scanning {len(uids)} objects with {processes} processes")
+
+    chunks = [uids[i : i + chunk_size] for i in range(0, len(uids), chunk_size)]
+    with ThreadPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(_scan_chunk, chunk, index_path, timeout) for chunk in chunks
+        ]
+        for future in futures:
+            future.result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build an offline index of asset properties."
+    )
+    parser.add_argument(
+        "--captions_path",
+        type=str,
+        default="datasets/cap3d_captions.json",
+        help="Path to the captions JSON file whose keys are the uids to scan.",
+    )
+    parser.add_argument(
+        "--uids_file",
+        type=str,
+        default=None,
+        help="Path to a JSON list of uids to scan instead of the captions file.",
+    )
+    parser.add_argument(
+        "--index_path",
+        type=str,
+        default="datasets/asset_index.sqlite",
+        help="Path to the SQLite asset index.",
+    )
+    parser.add_argument(
+        "--processes", type=int, default=4, help="Number of scan processes."
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=50,
+        help="Number of objects scanned by one process.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        default=3600,
+        help="Maximum time in seconds for one scan process.",
+    )
+    parser.add_argument(
+        "--rescan", action="store_true", help="Rescan objects already in the index."
+    )
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="Scan the uids in this process. Used internally by the scan job.",
+    )
+
+    if "--" in sys.argv:
+        argv = sys.argv[sys.argv.index("--") + 1 :]
+    else:
+        argv = sys.argv[1:]
+
+    args = parser.parse_args(argv)
+
+    if args.uids_file is not None:
+        with open(args.uids_file, "r") as f:
+            uids = json.load(f)
+    else:
+        with open(args.captions_path, "r") as f:
+            uids = list(json.load(f).keys())
+
+    if args.worker:
+        scan_objects(uids, args.index_path)
+    else:
+        run_asset_scan(
+            uids,
+            args.index_path,
+            processes=args.processes,
+            chunk_size=args.chunk_size,
+            timeout=args.timeout,
+            rescan=args.rescan,
+        )
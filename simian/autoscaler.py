@@ -0,0 +1,659 @@
+import atexit
+import itertools
+import logging
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from redis import Redis
+
+from .offers import OfferSelector
+from .progress import get_node_name
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Seconds between heartbeats of a worker
+HEARTBEAT_INTERVAL = 30.0
+# A node whose last heartbeat is older than this is considered dead
+HEARTBEAT_TIMEOUT = 300.0
+# A rented node that never sent a heartbeat within this many seconds failed to start
+STARTUP_TIMEOUT = 1800.0
+# A node idle for this many seconds may be terminated
+IDLE_TIMEOUT = 300.0
+# The shared celery queue in Redis
+CELERY_QUEUE = "celery"
+# Command the rented Vast.ai instances run
+WORKER_COMMAND = "celery -A {module_name} worker --loglevel=info --concurrency=1 --prefetch-multiplier=1"
+
+
+def _decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def get_node_key(node: str) -> str:
+    """
+    Get the Redis key of the heartbeat hash of a node.
+
+    Args:
+        node (str): The node name. On Vast.ai this is the instance id, see `get_node_name`.
+
+    Returns:
+        str: The key.
+    """
+    return f"simian:node:{node}"
+
+
+def send_heartbeat(redis_client: Redis, node: Optional[str] = None) -> None:
+    """
+    Record that this node is alive.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        node (Optional[str], optional): The node name. Defaults to `get_node_name()`.
+
+    Returns:
+        None
+    """
+    node_key = get_node_key(node or get_node_name())
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hset(node_key, "last_seen", time.time())
+    pipe.hsetnx(node_key, "busy", 0)
+    pipe.hsetnx(node_key, "state_since", time.time())
+    pipe.expire(node_key, int(HEARTBEAT_TIMEOUT * 10))
+    pipe.execute()
+
+
+def set_node_busy(
+    redis_client: Redis,
+    busy: bool,
+    combinations: int = 0,
+    hostname: Optional[str] = None,
+    node: Optional[str] = None,
+) -> None:
+    """
+    Record that this node started or finished rendering a task.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        busy (bool): True when a task starts, False when it finished.
+        combinations (int, optional): Combinations rendered by the finished task. Defaults to 0.
+        hostname (Optional[str], optional): The celery hostname of the worker, to check its
+            direct queue before terminating it. Defaults to None.
+        node (Optional[str], optional): The node name. Defaults to `get_node_name()`.
+
+    Returns:
+        None
+    """
+    node_key = get_node_key(node or get_node_name())
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hset(
+        node_key,
+        mapping={"busy": int(busy), "state_since": time.time(), "last_seen": time.time()},
+    )
+    if hostname:
+        pipe.hset(node_key, "hostname", hostname)
+    if combinations:
+        pipe.hincrby(node_key, "combinations", combinations)
+    if not busy:
+        pipe.hincrby(node_key, "tasks", 1)
+    pipe.expire(node_key, int(HEARTBEAT_TIMEOUT * 10))
+    pipe.execute()
+
+
+def publish_uploads(redis_client: Redis, uploads: int, node: Optional[str] = None) -> None:
+    """
+    Record how many files this node still has to upload. Idle nodes are not terminated
+    before their uploads are done.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        uploads (int): Files still waiting for upload.
+        node (Optional[str], optional): The node name. Defaults to `get_node_name()`.
+
+    Returns:
+        None
+    """
+    redis_client.hset(get_node_key(node or get_node_name()), "uploads", uploads)
+
+
+def publish_benchmark(
+    redis_client: Redis, result: Dict[str, Any], node: Optional[str] = None
+) -> None:
+    """
+    Add the results of the startup benchmark to the heartbeat hash of this node.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        result (Dict[str, Any]): The results of `run_benchmark_process`.
+        node (Optional[str], optional): The node name. Defaults to `get_node_name()`.
+
+    Returns:
+        None
+    """
+    node_key = get_node_key(node or get_node_name())
+    # prefixed so they never clash with the heartbeat fields
+    mapping = {f"benchmark_{key}": value for key, value in result.items() if value is not None}
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hset(node_key, mapping=mapping)
+    pipe.expire(node_key, int(HEARTBEAT_TIMEOUT * 10))
+    pipe.execute()
+
+
+def start_heartbeat(redis_client: Redis, interval: float = HEARTBEAT_INTERVAL) -> threading.Thread:
+    """
+    Send heartbeats from a background thread for as long as the process runs.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        interval (float, optional): Seconds between heartbeats. Defaults to HEARTBEAT_INTERVAL.
+
+    Returns:
+        threading.Thread: The heartbeat thread.
+    """
+
+    def beat():
+        while True:
+            try:
+                send_heartbeat(redis_client)
+            except Exception as e:
+                logger.warning(f"Failed to send heartbeat: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=beat, name="simian-heartbeat", daemon=True)
+    thread.start()
+    return thread
+
+
+class NodeProvider:
+    """
+    Rents and terminates worker nodes. Subclasses talk to a cloud, see `VastProvider`.
+
+    Nodes are rented from the offers of `search_offers`, cheapest first, or best value
+    first when an `OfferSelector` is given.
+    """
+
+    def __init__(self, selector: Optional[OfferSelector] = None):
+        """
+        Args:
+            selector (Optional[OfferSelector], optional): Ranks the offers by measured renders per dollar. Defaults to None, by price.
+        """
+        self.selector = selector
+        # offers of machines dropped for performing far below their type
+        self.excluded_offers: Set[Any] = set()
+
+    def search_offers(self) -> List[Dict[str, Any]]:
+        """
+        Get the offers that can be rented.
+
+        Returns:
+            List[Dict[str, Any]]: Offers with an "id", the price per hour "dph_total", "gpu_name" and "num_gpus".
+        """
+        raise NotImplementedError
+
+    def create_node(self, offer: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Rent the machine of an offer and start the worker on it.
+
+        Args:
+            offer (Dict[str, Any]): The offer.
+
+        Returns:
+            Dict[str, Any]: The node, with at least an "instance_id".
+        """
+        raise NotImplementedError
+
+    def rent(self, count: int) -> List[Dict[str, Any]]:
+        """
+        Rent nodes.
+
+        Args:
+            count (int): The number of nodes to rent.
+
+        Returns:
+            List[Dict[str, Any]]: The rented nodes, each with an "instance_id" and its "offer".
+        """
+        offers = [
+            offer for offer in self.search_offers() if offer["id"] not in self.excluded_offers
+        ]
+        if self.selector is not None:
+            offers = self.selector.rank_offers(offers)
+        else:
+            offers = sorted(offers, key=lambda offer: offer["dph_total"])
+
+        nodes = []
+        for offer in offers:
+            if len(nodes) >= count:
+                break
+            try:
+                node = self.create_node(offer)
+            except Exception as e:
+                logger.warning(f"Failed to rent offer {offer['id']}: {e}")
+                continue
+            node["offer"] = offer
+            nodes.append(node)
+        return nodes
+
+    def terminate(self, nodes: List[Dict[str, Any]]) -> None:
+        """
+        Terminate nodes.
+
+        Args:
+            nodes (List[Dict[str, Any]]): Nodes returned by `rent`.
+
+        Returns:
+            None
+        """
+        raise NotImplementedError
+
+
+class VastProvider(NodeProvider):
+    """
+    Rents Vast.ai instances running the simian worker through distributask.
+    """
+
+    def __init__(
+        self,
+        distributask: Any,
+        max_price: float,
+        docker_image: str,
+        module_name: str,
+        env_settings: Optional[Dict[str, Any]] = None,
+        selector: Optional[OfferSelector] = None,
+    ):
+        """
+        Args:
+            distributask (Distributask): The distributask instance.
+            max_price (float): Maximum price per hour of a node.
+            docker_image (str): The worker image.
+            module_name (str): The celery module the workers run.
+            env_settings (Optional[Dict[str, Any]], optional): Environment of the workers. Defaults to None.
+            selector (Optional[OfferSelector], optional): Ranks the offers by measured renders per dollar. Defaults to None, by price.
+        """
+        super().__init__(selector)
+        self.distributask = distributask
+        self.max_price = max_price
+        self.docker_image = docker_image
+        self.module_name = module_name
+        self.env_settings = env_settings
+
+    def search_offers(self) -> List[Dict[str, Any]]:
+        return self.distributask.search_offers(self.max_price)
+
+    def create_node(self, offer: Dict[str, Any]) -> Dict[str, Any]:
+        instance = self.distributask.create_instance(
+            offer["id"],
+            self.docker_image,
+            self.module_name,
+            env_settings=self.env_settings,
+            command=WORKER_COMMAND.format(module_name=self.module_name),
+        )
+        return {"offer_id": offer["id"], "instance_id": instance["new_contract"]}
+
+    def rent(self, count: int) -> List[Dict[str, Any]]:
+        nodes = super().rent(count)
+        # like distributask.rent_nodes, never leave nodes running after the coordinator exits
+        atexit.register(self.distributask.terminate_nodes, nodes)
+        return nodes
+
+    def terminate(self, nodes: List[Dict[str, Any]]) -> None:
+        self.distributask.terminate_nodes(nodes)
+
+
+class LocalProvider(NodeProvider):
+    """
+    Stand-in for the Vast.ai offers API that only records rentals, for tests and dry runs.
+    """
+
+    def __init__(
+        self,
+        available: int = 1000,
+        offers: Optional[List[Dict[str, Any]]] = None,
+        selector: Optional[OfferSelector] = None,
+    ):
+        """
+        Args:
+            available (int, optional): The number of identical free offers, without `offers`. Defaults to 1000.
+            offers (Optional[List[Dict[str, Any]]], optional): The offers, each can be rented once at a time. Defaults to None.
+            selector (Optional[OfferSelector], optional): Ranks the offers by measured renders per dollar. Defaults to None, by price.
+        """
+        super().__init__(selector)
+        if offers is None:
+            offers = [
+                {"id": i, "gpu_name": "local", "num_gpus": 1, "dph_total": 0.0}
+                for i in range(available)
+            ]
+        self.available = list(offers)
+        self.rented: List[Dict[str, Any]] = []
+        self.terminated: List[Dict[str, Any]] = []
+        self._ids = itertools.count(1)
+
+    def search_offers(self) -> List[Dict[str, Any]]:
+        return list(self.available)
+
+    def create_node(self, offer: Dict[str, Any]) -> Dict[str, Any]:
+        self.available.remove(offer)
+        node = {"offer_id": offer["id"], "instance_id": next(self._ids)}
+        self.rented.append(node)
+        return node
+
+    def terminate(self, nodes: List[Dict[str, Any]]) -> None:
+        self.available += [node["offer"] for node in nodes if "offer" in node]
+        self.terminated += nodes
+
+
+class Autoscaler:
+    """
+    Keeps the number of rented nodes matched to the work left in the job.
+
+    Workers send heartbeats and mark themselves busy or idle around every task, see
+    `send_heartbeat` and `set_node_busy`. From those and the queue depth, each `step`
+    rents nodes when the job would otherwise miss its target duration, terminates nodes
+    that stopped sending heartbeats or never started, and terminates surplus nodes only
+    once they are idle and their queue is empty.
+
+    With an `OfferSelector` on the provider, nodes whose startup benchmark falls far below
+    their offer type are replaced, and every terminated node records its renders per dollar.
+    """
+
+    def __init__(
+        self,
+        provider: NodeProvider,
+        redis_client: Redis,
+        max_nodes: int,
+        min_nodes: int = 0,
+        target_seconds: Optional[float] = None,
+        idle_timeout: float = IDLE_TIMEOUT,
+        heartbeat_timeout: float = HEARTBEAT_TIMEOUT,
+        startup_timeout: float = STARTUP_TIMEOUT,
+    ):
+        """
+        Args:
+            provider (NodeProvider): Rents and terminates the nodes.
+            redis_client (Redis): The Redis client of the broker.
+            max_nodes (int): Maximum number of nodes.
+            min_nodes (int, optional): Nodes kept while work is left. Defaults to 0.
+            target_seconds (Optional[float], optional): Seconds the rest of the job should
+                take. Defaults to None, use as many nodes as there are tasks, up to max_nodes.
+            idle_timeout (float, optional): Seconds a node must be idle before it is terminated. Defaults to IDLE_TIMEOUT.
+            heartbeat_timeout (float, optional): Seconds without heartbeat after which a node is dead. Defaults to HEARTBEAT_TIMEOUT.
+            startup_timeout (float, optional): Seconds a new node has to send its first heartbeat. Defaults to STARTUP_TIMEOUT.
+        """
+        self.provider = provider
+        self.redis_client = redis_client
+        self.max_nodes = max_nodes
+        self.min_nodes = min_nodes
+        self.target_seconds = target_seconds
+        self.idle_timeout = idle_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        self.startup_timeout = startup_timeout
+        self.nodes: List[Dict[str, Any]] = []
+        self.terminated: List[Dict[str, Any]] = []
+
+    def add_nodes(self, nodes: List[Dict[str, Any]], now: Optional[float] = None) -> None:
+        """
+        Manage nodes rented elsewhere, e.g. at the start of the job.
+
+        Args:
+            nodes (List[Dict[str, Any]]): Nodes with an "instance_id".
+            now (Optional[float], optional): When they were rented. Defaults to time.time().
+
+        Returns:
+            None
+        """
+        now = time.time() if now is None else now
+        for node in nodes:
+            node.setdefault("rented_at", now)
+        self.nodes += nodes
+
+    def get_queue_depth(self, queue: str = CELERY_QUEUE) -> int:
+        """
+        Get the number of tasks waiting in a queue.
+
+        Args:
+            queue (str, optional): The queue name. Defaults to the shared queue.
+
+        Returns:
+            int: The number of waiting tasks.
+        """
+        return int(self.redis_client.llen(queue))
+
+    def drain_node_queue(self, hostname: str) -> int:
+        """
+        Move the tasks routed to a node's own queue back to the shared queue.
+
+        Args:
+            hostname (str): The celery hostname of the node's worker.
+
+        Returns:
+            int: The number of moved tasks.
+        """
+        moved = 0
+        while self.redis_client.rpoplpush(f"{hostname}.dq2", CELERY_QUEUE) is not None:
+            moved += 1
+        return moved
+
+    def get_node_states(self, now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the state of every managed node from its heartbeats.
+
+        Args:
+            now (Optional[float], optional): The current time. Defaults to time.time().
+
+        Returns:
+            Dict[str, Dict[str, Any]]: By instance id, the "state" ("starting", "busy",
+            "idle" or "dead"), seconds in that state and the heartbeat fields. Idle nodes
+            with "uploads" left are still uploading their outputs.
+        """
+        now = time.time() if now is None else now
+        pipe = self.redis_client.pipeline(transaction=False)
+        for node in self.nodes:
+            pipe.hgetall(get_node_key(str(node["instance_id"])))
+        states = {}
+        for node, fields in zip(self.nodes, pipe.execute()):
+            fields = {_decode(key): _decode(value) for key, value in fields.items()}
+            hostname = fields.pop("hostname", None)
+            fields = {key: float(value) for key, value in fields.items()}
+            if not fields:
+                state = "dead" if now - node["rented_at"] > self.startup_timeout else "starting"
+                seconds = now - node["rented_at"]
+            elif now - fields.get("last_seen", 0.0) > self.heartbeat_timeout:
+                state, seconds = "dead", now - fields.get("last_seen", 0.0)
+            else:
+                state = "busy" if fields.get("busy") else "idle"
+                seconds = now - fields.get("state_since", now)
+            states[str(node["instance_id"])] = {
+                "state": state,
+                "seconds": seconds,
+                "hostname": hostname,
+                **fields,
+            }
+        return states
+
+    def get_desired_nodes(
+        self, remaining: int, node_rate: Optional[float], outstanding: int
+    ) -> int:
+        """
+        Get the number of nodes the rest of the job needs.
+
+        Args:
+            remaining (int): Combinations left in the job.
+            node_rate (Optional[float]): Combinations per second of one node, None if unknown.
+            outstanding (int): Tasks waiting in the queue or rendering.
+
+        Returns:
+            int: The number of nodes.
+        """
+        if remaining <= 0 or outstanding <= 0:
+            return 0
+        needed = self.max_nodes
+        if self.target_seconds and node_rate:
+            needed = math.ceil(remaining / (node_rate * self.target_seconds))
+        # more nodes than tasks would only idle
+        needed = min(needed, outstanding)
+        return max(self.min_nodes, min(needed, self.max_nodes))
+
+    def step(
+        self, remaining: int, node_rate: Optional[float] = None, now: Optional[float] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Rent or terminate nodes once.
+
+        Args:
+            remaining (int): Combinations left in the job.
+            node_rate (Optional[float], optional): Combinations per second of one node. Defaults to None.
+            now (Optional[float], optional): The current time. Defaults to time.time().
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: The "rented" and "terminated" nodes, and the
+            "dead" ones among the terminated, whose running tasks were lost.
+        """
+        now = time.time() if now is None else now
+        states = self.get_node_states(now)
+        queue_depth = self.get_queue_depth()
+        busy = sum(1 for state in states.values() if state["state"] == "busy")
+        desired = self.get_desired_nodes(remaining, node_rate, queue_depth + busy)
+
+        # dead and underperforming nodes are replaced if the work still needs them
+        dead = [
+            node for node in self.nodes if states[str(node["instance_id"])]["state"] == "dead"
+        ]
+        terminate = list(dead)
+        def is_done(node: Dict[str, Any]) -> bool:
+            # idle, and the outputs of its last task are uploaded
+            state = states[str(node["instance_id"])]
+            return state["state"] == "idle" and not state.get("uploads")
+
+        # underperforming nodes finish their current task first
+        self.check_benchmarks(states)
+        terminate += [node for node in self.nodes if node.get("underperforming") and is_done(node)]
+        live = [node for node in self.nodes if node not in terminate]
+
+        surplus = len(live) - desired
+        if surplus > 0:
+            # only nodes that are idle with nothing left in their own queue
+            idle = [
+                node
+                for node in live
+                if is_done(node) and states[str(node["instance_id"])]["seconds"] >= self.idle_timeout
+            ]
+            idle.sort(key=lambda node: -states[str(node["instance_id"])]["seconds"])
+            for node in idle:
+                if surplus <= 0:
+                    break
+                hostname = states[str(node["instance_id"])]["hostname"]
+                if hostname and self.get_queue_depth(f"{hostname}.dq2") > 0:
+                    continue
+                terminate.append(node)
+                live.remove(node)
+                surplus -= 1
+
+        if terminate:
+            logger.info(f"Terminating {len(terminate)} nodes")
+            self.terminate(terminate, states, now)
+
+        rented = []
+        if desired > len(live):
+            logger.info(f"Renting {desired - len(live)} nodes, {queue_depth} tasks queued")
+            rented = self.provider.rent(desired - len(live))
+            self.add_nodes(rented, now)
+        return {"rented": rented, "terminated": terminate, "dead": dead}
+
+    def check_benchmarks(self, states: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Record the startup benchmarks of new nodes and mark the ones far below their offer
+        type as "underperforming".
+
+        Args:
+            states (Dict[str, Dict[str, Any]]): The node states of `get_node_states`.
+
+        Returns:
+            None
+        """
+        selector = self.provider.selector
+        if selector is None:
+            return
+        for node in self.nodes:
+            fps = states[str(node["instance_id"])].get("benchmark_fps")
+            if "offer" not in node or node.get("benchmark_fps") is not None or fps is None:
+                continue
+            node["benchmark_fps"] = fps
+            if selector.record_benchmark(node["offer"], fps):
+                logger.info(
+                    f"Dropping node {node['instance_id']}, its benchmark of {fps:.2f} fps is far "
+                    f"below its offer type"
+                )
+                self.provider.excluded_offers.add(node["offer"]["id"])
+                node["underperforming"] = True
+
+    def terminate(
+        self,
+        nodes: List[Dict[str, Any]],
+        states: Optional[Dict[str, Dict[str, Any]]] = None,
+        now: Optional[float] = None,
+        drain: bool = True,
+    ) -> None:
+        """
+        Terminate managed nodes and record the renders per dollar of their offer types.
+
+        Args:
+            nodes (List[Dict[str, Any]]): The nodes.
+            states (Optional[Dict[str, Dict[str, Any]]], optional): The node states of `get_node_states`. Defaults to None, read them.
+            now (Optional[float], optional): The current time. Defaults to time.time().
+            drain (bool, optional): Move the tasks routed to the nodes back to the shared queue. Defaults to True.
+
+        Returns:
+            None
+        """
+        now = time.time() if now is None else now
+        selector = self.provider.selector
+        if states is None and (drain or selector is not None):
+            try:
+                states = self.get_node_states(now)
+            except Exception:
+                logger.exception("Failed to read node states")
+                states = {}
+
+        if drain:
+            for node in nodes:
+                hostname = states.get(str(node["instance_id"]), {}).get("hostname")
+                if not hostname:
+                    continue
+                try:
+                    moved = self.drain_node_queue(hostname)
+                except Exception:
+                    logger.exception(f"Failed to drain the queue of {hostname}")
+                    continue
+                if moved:
+                    logger.info(f"Moved {moved} tasks of {hostname} to the shared queue")
+
+        if selector is not None:
+            for node in nodes:
+                if "offer" not in node:
+                    continue
+                hours = (now - node["rented_at"]) / 3600
+                selector.record_renders(
+                    node["offer"],
+                    int(states.get(str(node["instance_id"]), {}).get("combinations", 0)),
+                    hours * node["offer"]["dph_total"],
+                )
+            try:
+                selector.save()
+            except Exception:
+                logger.exception("Failed to save offer stats")
+
+        self.provider.terminate(nodes)
+        self.terminated += nodes
+        self.nodes = [node for node in self.nodes if node not in nodes]
+
+    def shutdown(self) -> None:
+        """
+        Terminate every managed node.
+
+        Returns:
+            None
+        """
+        if self.nodes:
+            # the job is over, tasks left in node queues are copies of finished ones
+            self.terminate(list(self.nodes), drain=False)
@@ -1,64 +1,182 @@
 import os
-from typing import Dict
-import requests
+import re
+from typing import Dict, Optional
 import bpy
 import logging
+import requests
+
+from .asset_cache import download_to_cache, fetch_cached
+from .cache_manager import use_cached
+from .datablock_cache import get_datablock_cache
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
+# Equirectangular widths of the resolution tiers Poly Haven publishes
+HDRI_TIERS = {"1k": 1024, "2k": 2048, "4k": 4096, "8k": 8192}
+# HDRI texels per rendered pixel when picking a tier from the render width
+HDRI_TEXELS_PER_PIXEL = 2.0
+# Matches the tier directory and the tier suffix of the file name
+_TIER_PATTERN = re.compile(r"(?<=/)\d+k(?=/)|(?<=_)\d+k(?=\.\w+$)")
+
+
+def get_hdri_tier(width: int, texels_per_pixel: float = HDRI_TEXELS_PER_PIXEL) -> str:
+    """
+    Pick the smallest HDRI resolution tier that is detailed enough for a render width.
+
+    Args:
+        width (int): The width of the render in pixels.
+        texels_per_pixel (float, optional): HDRI texels per rendered pixel. Defaults to HDRI_TEXELS_PER_PIXEL.
+
+    Returns:
+        str: The tier name, e.g. "2k".
+    """
+    for tier, tier_width in HDRI_TIERS.items():
+        if tier_width >= width * texels_per_pixel:
+            return tier
+    return list(HDRI_TIERS.keys())[-1]
+
+
+def get_hdri_tier_url(url: str, tier: str) -> Optional[str]:
+    """
+    Rewrite a Poly Haven HDRI url to another resolution tier.
+
+    Args:
+        url (str): The url of the HDRI, e.g. ".../hdr/8k/name_8k.hdr".
+        tier (str): The tier to rewrite the url to.
+
+    Returns:
+        Optional[str]: The rewritten url, or None if the url contains no tier.
+    """
+    if not _TIER_PATTERN.search(url):
+        return None
+    return _TIER_PATTERN.sub(tier, url)
+
 
-def get_hdri_path(hdri_path: str, combination: Dict) -> str:
+def get_hdri_path(hdri_path: str, combination: Dict, tier: Optional[str] = None) -> str:
     """
     Get the local file path for the background HDR image.
 
     Args:
         hdri_path (str): The base directory for storing background images.
         combination (Dict): The combination dictionary containing background
+        tier (Optional[str]): The resolution tier. Defaults to None, the resolution of the recorded url.
     Returns:
         str: The local file path for the background HDR image.
     """
     background = combination["background"]
     background_id = background["id"]
     background_from = background["from"]
-    hdri_path = f"{hdri_path}/{background_from}/{background_id}.hdr"
+    if tier is None:
+        hdri_path = f"{hdri_path}/{background_from}/{background_id}.hdr"
+    else:
+        hdri_path = f"{hdri_path}/{background_from}/{background_id}_{tier}.hdr"
 
     return hdri_path
 
 
-def get_background(hdri_path: str, combination: Dict) -> None:
+def downsample_hdri(source_path: str, target_path: str, width: int) -> None:
+    """
+    Write a downsampled copy of an equirectangular HDR image.
+
+    Args:
+        source_path (str): The path of the full resolution HDR image.
+        target_path (str): The path to write the downsampled image to.
+        width (int): The width of the downsampled image.
+
+    Returns:
+        None
+    """
+    image = bpy.data.images.load(source_path)
+    try:
+        if image.size[0] > width:
+            image.scale(width, max(1, width * image.size[1] // image.size[0]))
+        image.filepath_raw = target_path
+        image.file_format = "HDR"
+        image.save()
+    finally:
+        bpy.data.images.remove(image)
+
+
+def load_hdri_image(path: str) -> bpy.types.Image:
+    """
+    Load an HDR image, reusing the datablock if the file is already loaded or kept
+    in the datablock cache by an earlier job.
+
+    Args:
+        path (str): The path of the HDR image.
+
+    Returns:
+        bpy.types.Image: The shared image datablock.
+    """
+    datablock_cache = get_datablock_cache()
+    if datablock_cache is not None:
+        image = datablock_cache.get(("image", path))
+        if image is not None:
+            return image
+
+    image = bpy.data.images.load(path, check_existing=True)
+    if datablock_cache is not None:
+        datablock_cache.put(("image", path), image)
+    return image
+
+
+def get_background(hdri_path: str, combination: Dict, tier: Optional[str] = None) -> None:
     """
     Download the background HDR image if it doesn't exist locally.
 
     This function checks if the background HDR image specified in the combination dictionary
     exists locally. If it doesn't exist, it downloads the image from the provided URL and
-    saves it to the local file path.
+    saves it to the local file path. Concurrent processes download it only once.
+
+    With a tier, the url is rewritten to that resolution. If the tier cannot be downloaded,
+    the recorded resolution is downloaded and downsampled locally once.
 
     Args:
         hdri_path (str): The base directory for storing background images.
         combination (Dict): The combination dictionary containing background information.
+        tier (Optional[str]): The resolution tier. Defaults to None, the resolution of the recorded url.
 
     Returns:
         None
     """
-    hdri_path = get_hdri_path(hdri_path, combination)
+    base_path = hdri_path
+    hdri_path = get_hdri_path(base_path, combination, tier)
 
     background = combination["background"]
     background_url = background["url"]
 
-    # make sure each folder in the path exists
-    os.makedirs(os.path.dirname(hdri_path), exist_ok=True)
-
-    if not os.path.exists(hdri_path):
-        # logger.info(f"Downloading {background_url} to {hdri_path}")
-        response = requests.get(background_url)
-        with open(hdri_path, "wb") as file:
-            file.write(response.content)
-    # else:
-    #     logger.info(f"Background {hdri_path} already exists")
+    if tier is None:
+        use_cached(
+            hdri_path,
+            "backgrounds",
+            lambda: download_to_cache(background_url, hdri_path),
+        )
+        return
+
+    tier_url = get_hdri_tier_url(background_url, tier)
+    if tier_url is not None:
+        try:
+            use_cached(
+                hdri_path, "backgrounds", lambda: download_to_cache(tier_url, hdri_path)
+            )
+            return
+        except requests.RequestException as e:
+            logger.warning(f"Could not download {tier_url} ({e}), downsampling locally")
+
+    get_background(base_path, combination)
+    source_path = get_hdri_path(base_path, combination)
+    use_cached(
+        hdri_path,
+        "backgrounds",
+        lambda: fetch_cached(
+            hdri_path,
+            lambda tmp_path: downsample_hdri(source_path, tmp_path, HDRI_TIERS[tier]),
+        ),
+    )
 
 
-def set_background(hdri_path: str, combination: Dict) -> None:
+def set_background(hdri_path: str, combination: Dict, tier: Optional[str] = None) -> None:
     """
     Set the background HDR image of the scene.
 
@@ -70,12 +188,13 @@ def set_background(hdri_path: str, combination: Dict) -> None:
     Args:
         hdri_path (str): The base directory for storing background images.
         combination (Dict): The combination dictionary containing background information.
+        tier (Optional[str]): The resolution tier. Defaults to None, the resolution of the recorded url.
 
     Returns:
         None
     """
-    get_background(hdri_path, combination)
-    hdri_path = get_hdri_path(hdri_path, combination)
+    get_background(hdri_path, combination, tier)
+    hdri_path = get_hdri_path(hdri_path, combination, tier)
 
     # Check if the scene has a world, and create one if it doesn't
     if bpy.context.scene.world is None:
@@ -93,7 +212,7 @@ def set_background(hdri_path: str, combination: Dict) -> None:
     env_tex_node.location = (-300, 0)
 
     # Load the HDR image
-    env_tex_node.image = bpy.data.images.load(hdri_path)
+    env_tex_node.image = load_hdri_image(hdri_path)
 
     # Create the Background node
     background_node = tree.nodes.new(type="ShaderNodeBackground")
@@ -116,7 +235,7 @@ def set_background(hdri_path: str, combination: Dict) -> None:
 
 
 def create_photosphere(
-    hdri_path: str, combination: Dict, scale: float = 10
+    hdri_path: str, combination: Dict, scale: float = 10, tier: Optional[str] = None
 ) -> bpy.types.Object:
     """
     Create a photosphere object in the scene.
@@ -129,6 +248,8 @@ def create_photosphere(
     Args:
         hdri_path (str): The base directory for storing background images.
         combination (Dict): The combination dictionary containing background information.
+        scale (float, optional): The radius of the sphere. Defaults to 10.
+        tier (Optional[str]): The resolution tier. Defaults to None, the resolution of the recorded url.
 
     Returns:
         bpy.types.Object: The created photosphere object.
@@ -148,12 +269,15 @@ def create_photosphere(
     sphere = bpy.context.object
     sphere.name = "Photosphere"
     sphere.data.name = "PhotosphereMesh"
-    create_photosphere_material(hdri_path, combination, sphere)
+    create_photosphere_material(hdri_path, combination, sphere, tier)
     return sphere
 
 
 def create_photosphere_material(
-    hdri_path: str, combination: Dict, sphere: bpy.types.Object
+    hdri_path: str,
+    combination: Dict,
+    sphere: bpy.types.Object,
+    tier: Optional[str] = None,
 ) -> None:
     """
     Create a material for the photosphere object using the environment texture as emission.
@@ -166,6 +290,7 @@ def create_photosphere_material(
         hdri_path (str): The base directory for storing background images.
         combination (Dict): The combination dictionary containing background information.
         sphere (bpy.types.Object): The photosphere object to assign the material to.
+        tier (Optional[str]): The resolution tier. Defaults to None, the resolution of the recorded url.
 
     Returns:
         None
@@ -179,7 +304,8 @@ def create_photosphere_material(
     # Create and connect the nodes
     emission = nodes.new(type="ShaderNodeEmission")
     env_tex = nodes.new(type="ShaderNodeTexEnvironment")
-    env_tex.image = bpy.data.images.load(get_hdri_path(hdri_path, combination))
+    # Shares the image datablock with the world background
+    env_tex.image = load_hdri_image(get_hdri_path(hdri_path, combination, tier))
     mat.node_tree.links.new(env_tex.outputs["Color"], emission.inputs["Color"])
     output = nodes.new(type="ShaderNodeOutputMaterial")
     mat.node_tree.links.new(emission.outputs["Emission"], output.inputs["Surface"])
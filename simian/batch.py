@@ -13,6 +13,7 @@ from typing import Any, Dict, List, Optional
 from simian.prompts import generate_gemini, setup_gemini, parse_gemini_json, CAMERA_PROMPT, OBJECTS_JSON_PROMPT, OBJECTS_PROMPT, OBJECTS_JSON_IMPROVEMENT_PROMPT, CAMERA_JSON_IMPROVEMENT_PROMPT
 from .server import initialize_chroma_db, query_collection
 from .combiner import calculate_transformed_positions
+from .chunks import render_chunks
 
 console = Console()
 
@@ -59,7 +60,12 @@ def render_objects(
     end_frame: int = 65,
     images: bool = False,
     blend_file: Optional[str] = None,
-    animation_length: int = 100
+    animation_length: int = 100,
+    lod: bool = False,
+    texture_budget: bool = False,
+    fast_normalize: bool = False,
+    hdri_tier: Optional[str] = None,
+    chunks: int = 1,
 ) -> None:
     """
     Automates the rendering of objects using Blender based on predefined combinations.
@@ -81,6 +87,11 @@ def render_objects(
         images (bool): Generate images instead of videos.
         blend_file (Optional[str]): Path to the user-specified Blender file to use as the base scene.
         animation_length (int): Percentage animation length.
+        lod (bool): Decimate objects to a triangle budget based on their screen coverage.
+        texture_budget (bool): Downscale object textures based on the render resolution and their screen coverage.
+        fast_normalize (bool): Normalize imported objects with the data API instead of operators.
+        hdri_tier (Optional[str]): Background resolution tier, or "auto" to pick one from the render width.
+        chunks (int): Render each video as this many frame chunks in parallel processes and join them.
 
     Raises:
         NotImplementedError: If the operating system is not supported.
@@ -112,14 +123,34 @@ def render_objects(
 
     # Loop over each combination index to set up and run the rendering process.
     for i in range(start_index, end_index):
+        args = f"--width {width} --height {height} --hdri_path {hdri_path} --animation_length {animation_length}"
+
         if images:
-            args = f"--width {width} --height {height} --combination_index {i} --start_frame {start_frame} --end_frame {end_frame} --output_dir {target_directory} --hdri_path {hdri_path} --animation_length {animation_length} --images"
-        else:
-            args = f"--width {width} --height {height} --combination_index {i} --start_frame {start_frame} --end_frame {end_frame} --output_dir {target_directory} --hdri_path {hdri_path} --animation_length {animation_length}"
+            args += " --images"
 
         if blend_file:
             args += f" --blend {blend_file}"
 
+        if lod:
+            args += " --lod"
+
+        if texture_budget:
+            args += " --texture_budget"
+
+        if fast_normalize:
+            args += " --fast_normalize"
+
+        if hdri_tier:
+            args += f" --hdri_tier {hdri_tier}"
+
+        if chunks > 1 and not images:
+            try:
+                render_chunks(i, start_frame, end_frame, chunks, target_directory, args, render_timeout)
+            except (RuntimeError, FileNotFoundError, subprocess.CalledProcessError) as e:
+                console.print(f"Failed to render combination {i}: {e}", style="bold red")
+            continue
+
+        args += f" --combination_index {i} --start_frame {start_frame} --end_frame {end_frame} --output_dir {target_directory}"
         command = f"{sys.executable} -m simian.render -- {args}"
         subprocess.run(["bash", "-c", command], timeout=render_timeout, check=False)
 
@@ -205,6 +236,34 @@ def parse_args(args_list = None) -> argparse.Namespace:
         help="Percentage animation length. Defaults to 100%.",
         required=False
     )
+    parser.add_argument(
+        "--lod",
+        action="store_true",
+        help="Decimate objects to a triangle budget based on their screen coverage.",
+    )
+    parser.add_argument(
+        "--texture_budget",
+        action="store_true",
+        help="Downscale object textures based on the render resolution and their screen coverage.",
+    )
+    parser.add_argument(
+        "--fast_normalize",
+        action="store_true",
+        help="Normalize imported objects with the data API instead of operators.",
+    )
+    parser.add_argument(
+        "--hdri_tier",
+        type=str,
+        choices=["auto", "1k", "2k", "4k", "8k"],
+        default=None,
+        help="Background resolution tier, or auto to pick one from the render width.",
+    )
+    parser.add_argument(
+        "--chunks",
+        type=int,
+        default=1,
+        help="Render each video as this many frame chunks in parallel processes and join them. Defaults to 1.",
+    )
 
     if args_list is None:
         args = parser.parse_args()
@@ -405,7 +464,12 @@ def main():
                     end_frame=args.end_frame,
                     images=args.images,
                     blend_file=args.blend,
-                    animation_length=args.animation_length
+                    animation_length=args.animation_length,
+                    lod=args.lod,
+                    texture_budget=args.texture_budget,
+                    fast_normalize=args.fast_normalize,
+                    hdri_tier=args.hdri_tier,
+                    chunks=args.chunks,
                 )
             except SystemExit:
                 console.print("Invalid command. Please try again.", style="bold red")
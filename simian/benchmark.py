@@ -0,0 +1,165 @@
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Tuple
+
+import bpy
+
+from .asset_cache import download_to_cache
+from .object import import_object, normalize_object_scale
+from .scene import initialize_scene
+from .vendor import objaverse
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Objaverse object every node downloads and imports, so asset prep is comparable
+BENCHMARK_OBJECT_UID = "efccbdf2299e4b3d8ab767e879e60863"
+# Frames rendered by the benchmark scene
+BENCHMARK_FRAMES = 24
+# Resolution of the benchmark renders
+BENCHMARK_WIDTH = 640
+BENCHMARK_HEIGHT = 360
+
+
+def prepare_benchmark_object(work_dir: str) -> Tuple[Dict[str, Any], bpy.types.Object]:
+    """
+    Download the benchmark object into a fresh directory and import it, timing both.
+
+    The object is not taken from the asset cache, so every node measures a real download.
+    Without the object, e.g. when the download fails, a subdivided sphere stands in for it.
+
+    Args:
+        work_dir (str): Directory for the downloaded object.
+
+    Returns:
+        Tuple[Dict[str, Any], bpy.types.Object]: "download_seconds", "download_mb_per_second"
+        and "import_seconds", None for the steps that did not run, and the root object.
+    """
+    result = {"download_seconds": None, "download_mb_per_second": None, "import_seconds": None}
+    try:
+        object_path = objaverse.get_object_paths([BENCHMARK_OBJECT_UID])[BENCHMARK_OBJECT_UID]
+        local_path = os.path.join(work_dir, os.path.basename(object_path))
+
+        start = time.time()
+        download_to_cache(f"{objaverse.BASE_URL}/{object_path}", local_path)
+        download_seconds = time.time() - start
+        result["download_seconds"] = download_seconds
+        result["download_mb_per_second"] = (
+            os.path.getsize(local_path) / (1024 * 1024) / max(download_seconds, 1e-3)
+        )
+
+        start = time.time()
+        objects = import_object(local_path)
+        result["import_seconds"] = time.time() - start
+        root = next(obj for obj in objects if obj.parent is None)
+    except Exception as e:
+        logger.warning(f"Benchmark object unavailable, using a sphere: {e}")
+        bpy.ops.mesh.primitive_uv_sphere_add(segments=64, ring_count=32)
+        root = bpy.context.active_object
+        root.modifiers.new("Subdivision", "SUBSURF").levels = 2
+
+    normalize_object_scale(root, 2.0)
+    root.location = (0.0, 0.0, 1.0)
+    return result, root
+
+
+def build_benchmark_scene(work_dir: str, frames: int, width: int, height: int) -> Dict[str, Any]:
+    """
+    Build the standard benchmark scene: the benchmark object turning on a floor, lit by a
+    sun and filmed by a fixed camera.
+
+    Args:
+        work_dir (str): Directory for the downloaded object and the rendered frames.
+        frames (int): The number of frames.
+        width (int): The render width.
+        height (int): The render height.
+
+    Returns:
+        Dict[str, Any]: The asset prep timings, see `prepare_benchmark_object`.
+    """
+    initialize_scene()
+    scene = bpy.context.scene
+
+    bpy.ops.mesh.primitive_plane_add(size=20.0)
+    result, obj = prepare_benchmark_object(work_dir)
+
+    # one full turn over the benchmark so every frame differs
+    obj.rotation_euler = (0.0, 0.0, 0.0)
+    obj.keyframe_insert(data_path="rotation_euler", frame=1)
+    obj.rotation_euler = (0.0, 0.0, 2 * math.pi)
+    obj.keyframe_insert(data_path="rotation_euler", frame=frames)
+
+    bpy.ops.object.light_add(type="SUN", location=(4.0, -4.0, 8.0))
+    bpy.context.active_object.data.energy = 3.0
+
+    bpy.ops.object.camera_add(location=(0.0, -6.0, 2.5), rotation=(math.radians(80), 0.0, 0.0))
+    scene.camera = bpy.context.active_object
+
+    scene.frame_start = 1
+    scene.frame_end = frames
+    scene.render.resolution_x = width
+    scene.render.resolution_y = height
+    scene.render.resolution_percentage = 100
+    scene.render.image_settings.file_format = "PNG"
+    scene.render.filepath = os.path.join(work_dir, "frame_")
+    return result
+
+
+def run_benchmark(
+    frames: int = BENCHMARK_FRAMES,
+    width: int = BENCHMARK_WIDTH,
+    height: int = BENCHMARK_HEIGHT,
+) -> Dict[str, Any]:
+    """
+    Build and render the benchmark scene in this Blender process.
+
+    Args:
+        frames (int, optional): The number of frames. Defaults to BENCHMARK_FRAMES.
+        width (int, optional): The render width. Defaults to BENCHMARK_WIDTH.
+        height (int, optional): The render height. Defaults to BENCHMARK_HEIGHT.
+
+    Returns:
+        Dict[str, Any]: The rendered frames per second, render seconds, and the asset
+        prep timings of `prepare_benchmark_object`.
+    """
+    with tempfile.TemporaryDirectory(prefix="simian-benchmark-") as work_dir:
+        result = build_benchmark_scene(work_dir, frames, width, height)
+
+        start = time.time()
+        bpy.ops.render.render(animation=True)
+        render_seconds = time.time() - start
+
+    result["render_seconds"] = render_seconds
+    result["fps"] = frames / max(render_seconds, 1e-3)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="Path of the JSON file the benchmark results are written to.",
+    )
+    parser.add_argument("--frames", type=int, default=BENCHMARK_FRAMES, help="Frames to render.")
+    parser.add_argument("--width", type=int, default=BENCHMARK_WIDTH, help="Render width.")
+    parser.add_argument("--height", type=int, default=BENCHMARK_HEIGHT, help="Render height.")
+
+    if "--" in sys.argv:
+        argv = sys.argv[sys.argv.index("--") + 1 :]
+    else:
+        argv = []
+
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.frames, args.width, args.height)
+    with open(args.output, "w") as f:
+        json.dump(result, f)
+    logger.info(f"Benchmark: {result['fps']:.2f} frames per second")
@@ -0,0 +1,196 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import bpy
+import numpy as np
+from mathutils import Matrix
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Cached world bounds keyed by object pointer, stored as (cache key, (min, max))
+_bounds_cache: Dict[Tuple[int, bool], Tuple[tuple, Tuple[np.ndarray, np.ndarray]]] = {}
+
+
+def get_world_matrix(obj: bpy.types.Object) -> Matrix:
+    """
+    Compute the world matrix of an object from its own and its parents' transforms.
+
+    Unlike `obj.matrix_world`, this does not need a view layer update after a transform
+    was changed. Objects with constraints or a non-object parent type fall back to
+    `obj.matrix_world`, since their world matrix depends on evaluation.
+
+    Args:
+        obj (bpy.types.Object): The object.
+
+    Returns:
+        Matrix: The 4x4 world matrix of the object.
+    """
+    if obj.constraints or (obj.parent is not None and obj.parent_type != "OBJECT"):
+        return obj.matrix_world.copy()
+
+    matrix = obj.matrix_basis.copy()
+    if obj.parent is not None:
+        matrix = get_world_matrix(obj.parent) @ obj.matrix_parent_inverse @ matrix
+    return matrix
+
+
+def get_local_coordinates(obj: bpy.types.Object) -> np.ndarray:
+    """
+    Get the points that bound an object in its local space.
+
+    Meshes return their vertex coordinates, read in one call with `foreach_get`. Empties
+    return their origin and other object types the corners of their `bound_box`.
+
+    Args:
+        obj (bpy.types.Object): The object.
+
+    Returns:
+        np.ndarray: An (N, 3) array of local coordinates.
+    """
+    if obj.type == "MESH":
+        vertices = obj.data.vertices
+        coords = np.empty(len(vertices) * 3, dtype=np.float64)
+        vertices.foreach_get("co", coords)
+        return coords.reshape(-1, 3)
+    if obj.type == "EMPTY":
+        return np.zeros((1, 3), dtype=np.float64)
+    return np.array([tuple(corner) for corner in obj.bound_box], dtype=np.float64)
+
+
+def get_bounds_corners(bbox_min: np.ndarray, bbox_max: np.ndarray) -> np.ndarray:
+    """
+    Get the 8 corners of an axis aligned bounding box.
+
+    Args:
+        bbox_min (np.ndarray): The minimum corner.
+        bbox_max (np.ndarray): The maximum corner.
+
+    Returns:
+        np.ndarray: An (8, 3) array of corners.
+    """
+    return np.array(
+        [
+            [x, y, z]
+            for x in (bbox_min[0], bbox_max[0])
+            for y in (bbox_min[1], bbox_max[1])
+            for z in (bbox_min[2], bbox_max[2])
+        ],
+        dtype=np.float64,
+    )
+
+
+def transform_points(points: np.ndarray, matrix: Matrix) -> np.ndarray:
+    """
+    Transform an array of points by a 4x4 matrix.
+
+    Args:
+        points (np.ndarray): An (N, 3) array of points.
+        matrix (Matrix): The 4x4 matrix.
+
+    Returns:
+        np.ndarray: The transformed (N, 3) array.
+    """
+    matrix = np.array(matrix, dtype=np.float64)
+    return points @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def get_object_bounds(
+    obj: bpy.types.Object, tight: bool = True
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Get the world space axis aligned bounding box of a single object.
+
+    Tight bounds transform every vertex and are exact for rotated objects. Loose bounds
+    only transform the 8 corners of the local bounding box, which is faster but larger
+    than necessary when the object is rotated. Results are cached until the object's
+    transform, mesh or vertex count changes. Call `invalidate_bounds` after editing
+    vertex positions in place.
+
+    Args:
+        obj (bpy.types.Object): The object.
+        tight (bool, optional): Compute exact bounds from all vertices. Defaults to True.
+
+    Returns:
+        Optional[Tuple[np.ndarray, np.ndarray]]: The minimum and maximum corners, or None
+        if the object has no geometry.
+    """
+    matrix = get_world_matrix(obj)
+    data = obj.data
+    cache_key = (
+        tuple(value for row in matrix for value in row),
+        data.as_pointer() if data is not None else 0,
+        len(data.vertices) if obj.type == "MESH" else 0,
+    )
+    cached = _bounds_cache.get((obj.as_pointer(), tight))
+    if cached is not None and cached[0] == cache_key:
+        return cached[1]
+
+    points = get_local_coordinates(obj)
+    if len(points) == 0:
+        bounds = None
+    else:
+        if not tight:
+            points = get_bounds_corners(points.min(axis=0), points.max(axis=0))
+        points = transform_points(points, matrix)
+        bounds = (points.min(axis=0), points.max(axis=0))
+
+    _bounds_cache[(obj.as_pointer(), tight)] = (cache_key, bounds)
+    return bounds
+
+
+def get_objects_bounds(
+    objects: List[bpy.types.Object], tight: bool = True
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the world space axis aligned bounding box enclosing several objects.
+
+    Args:
+        objects (List[bpy.types.Object]): The objects.
+        tight (bool, optional): Compute exact bounds from all vertices. Defaults to True.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The minimum and maximum corners. Both are zero if
+        none of the objects has geometry.
+    """
+    bounds = [get_object_bounds(obj, tight) for obj in objects]
+    bounds = [bound for bound in bounds if bound is not None]
+    if not bounds:
+        return np.zeros(3), np.zeros(3)
+    bbox_min = np.min([bound[0] for bound in bounds], axis=0)
+    bbox_max = np.max([bound[1] for bound in bounds], axis=0)
+    return bbox_min, bbox_max
+
+
+def get_hierarchy_bounds(
+    obj: bpy.types.Object, tight: bool = True
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the world space axis aligned bounding box of an object and all its descendants.
+
+    Args:
+        obj (bpy.types.Object): The root object.
+        tight (bool, optional): Compute exact bounds from all vertices. Defaults to True.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The minimum and maximum corners.
+    """
+    return get_objects_bounds([obj] + list(obj.children_recursive), tight)
+
+
+def invalidate_bounds(obj: Optional[bpy.types.Object] = None) -> None:
+    """
+    Drop cached bounds of an object, or of all objects.
+
+    Args:
+        obj (Optional[bpy.types.Object]): The object to invalidate. Defaults to all objects.
+
+    Returns:
+        None
+    """
+    if obj is None:
+        _bounds_cache.clear()
+        return
+    pointer = obj.as_pointer()
+    for key in [key for key in _bounds_cache if key[0] == pointer]:
+        del _bounds_cache[key]
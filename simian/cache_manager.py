@@ -0,0 +1,323 @@
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from .asset_cache import get_cache_path
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Byte quota shared by all cache stores on the host, 0 disables eviction
+CACHE_QUOTA_BYTES = int(os.environ.get("SIMIAN_CACHE_QUOTA_BYTES", 0))
+LEDGER_PATH = os.environ.get(
+    "SIMIAN_CACHE_LEDGER", get_cache_path("cache_ledger.sqlite")
+)
+# Pins of workers that died without releasing them expire after this many seconds
+PIN_TTL = 6 * 3600
+
+_ledger_lock = threading.Lock()
+
+
+def open_cache_ledger(ledger_path: str) -> sqlite3.Connection:
+    """
+    Open the cache ledger database, creating it if it does not exist.
+
+    The ledger records the size and last access time of every cached file, the pins
+    that protect files from eviction and host-wide hit, miss and eviction counters.
+
+    Args:
+        ledger_path (str): Path to the SQLite file.
+
+    Returns:
+        sqlite3.Connection: The open connection.
+    """
+    ledger_dir = os.path.dirname(ledger_path)
+    if ledger_dir:
+        os.makedirs(ledger_dir, exist_ok=True)
+
+    conn = sqlite3.connect(ledger_path, timeout=60, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS entries ("
+        "path TEXT PRIMARY KEY, store TEXT, size INTEGER, last_access REAL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS pins ("
+        "path TEXT, pin_id TEXT, expires_at REAL, PRIMARY KEY (path, pin_id))"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)"
+    )
+    conn.commit()
+    return conn
+
+
+@functools.lru_cache(maxsize=None)
+def get_cache_ledger() -> sqlite3.Connection:
+    """
+    Open the host-wide cache ledger once per process.
+
+    Returns:
+        sqlite3.Connection: The open connection.
+    """
+    return open_cache_ledger(LEDGER_PATH)
+
+
+def _increment(conn: sqlite3.Connection, name: str, amount: int = 1) -> None:
+    """
+    Increment a ledger counter.
+
+    Args:
+        conn (sqlite3.Connection): Connection returned by `open_cache_ledger`.
+        name (str): The counter name.
+        amount (int, optional): The amount to add. Defaults to 1.
+
+    Returns:
+        None
+    """
+    conn.execute(
+        "INSERT INTO counters (name, value) VALUES (?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+        (name, amount),
+    )
+
+
+def record_cache_access(
+    conn: sqlite3.Connection, path: str, store: str, hit: bool
+) -> None:
+    """
+    Record that a cached file was used, updating its size and last access time.
+
+    Args:
+        conn (sqlite3.Connection): Connection returned by `open_cache_ledger`.
+        path (str): The cached file path.
+        store (str): The name of the store the file belongs to, e.g. "objaverse".
+        hit (bool): Whether the file was already cached.
+
+    Returns:
+        None
+    """
+    path = os.path.abspath(path)
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    with _ledger_lock:
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (path, store, size, last_access) "
+            "VALUES (?, ?, ?, ?)",
+            (path, store, size, time.time()),
+        )
+        _increment(conn, "hits" if hit else "misses")
+        conn.commit()
+
+
+def register_cache_store(conn: sqlite3.Connection, root: str, store: str) -> int:
+    """
+    Add files that were cached before the ledger existed.
+
+    Files already in the ledger keep their recorded access time, new ones use their
+    modification time.
+
+    Args:
+        conn (sqlite3.Connection): Connection returned by `open_cache_ledger`.
+        root (str): The root directory of the store.
+        store (str): The name of the store.
+
+    Returns:
+        int: The number of files added.
+    """
+    rows = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith((".tmp", ".lock")):
+                continue
+            path = os.path.abspath(os.path.join(dirpath, filename))
+            stat = os.stat(path)
+            rows.append((path, store, stat.st_size, stat.st_mtime))
+    with _ledger_lock:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO entries (path, store, size, last_access) "
+            "VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+        return conn.total_changes - before
+
+
+def pin_cache_paths(
+    conn: sqlite3.Connection, paths: List[str], pin_id: str, ttl: float = PIN_TTL
+) -> None:
+    """
+    Protect files from eviction until they are unpinned or the pin expires.
+
+    A pinned directory protects every file below it.
+
+    Args:
+        conn (sqlite3.Connection): Connection returned by `open_cache_ledger`.
+        paths (List[str]): The file or directory paths to pin.
+        pin_id (str): The owner of the pins, e.g. a job id.
+        ttl (float, optional): Seconds until the pins expire. Defaults to PIN_TTL.
+
+    Returns:
+        None
+    """
+    expires_at = time.time() + ttl
+    with _ledger_lock:
+        conn.executemany(
+            "INSERT OR REPLACE INTO pins (path, pin_id, expires_at) VALUES (?, ?, ?)",
+            [(os.path.abspath(path), pin_id, expires_at) for path in paths],
+        )
+        conn.commit()
+
+
+def unpin_cache_paths(conn: sqlite3.Connection, pin_id: str) -> None:
+    """
+    Release all pins of an owner.
+
+    Args:
+        conn (sqlite3.Connection): Connection returned by `open_cache_ledger`.
+        pin_id (str): The owner of the pins.
+
+    Returns:
+        None
+    """
+    with _ledger_lock:
+        conn.execute("DELETE FROM pins WHERE pin_id = ?", (pin_id,))
+        conn.commit()
+
+
+def evict_to_quota(conn: sqlite3.Connection, quota_bytes: int) -> List[str]:
+    """
+    Delete the least recently used unpinned files until the cache fits the quota.
+
+    Args:
+        conn (sqlite3.Connection): Connection returned by `open_cache_ledger`.
+        quota_bytes (int): The maximum total size of all stores in bytes.
+
+    Returns:
+        List[str]: The evicted paths.
+    """
+    evicted = []
+    with _ledger_lock:
+        conn.execute("DELETE FROM pins WHERE expires_at < ?", (time.time(),))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= quota_bytes:
+            conn.commit()
+            return evicted
+
+        pins = [row[0] for row in conn.execute("SELECT DISTINCT path FROM pins")]
+        candidates = conn.execute(
+            "SELECT path, size FROM entries ORDER BY last_access ASC"
+        ).fetchall()
+        evicted_bytes = 0
+        for path, size in candidates:
+            if total <= quota_bytes:
+                break
+            if any(path == pin or path.startswith(pin + os.sep) for pin in pins):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not evict {path}: {e}")
+                continue
+            conn.execute("DELETE FROM entries WHERE path = ?", (path,))
+            total -= size
+            evicted_bytes += size
+            evicted.append(path)
+
+        if evicted:
+            _increment(conn, "evictions", len(evicted))
+            _increment(conn, "evicted_bytes", evicted_bytes)
+            logger.info(f"Evicted {len(evicted)} cached files ({evicted_bytes} bytes)")
+        if total > quota_bytes:
+            logger.warning(
+                f"Cache is {total} bytes after eviction, above the quota of {quota_bytes} bytes"
+            )
+        conn.commit()
+    return evicted
+
+
+def get_cache_stats(conn: sqlite3.Connection) -> Dict[str, Any]:
+    """
+    Get the cache counters and current size.
+
+    Args:
+        conn (sqlite3.Connection): Connection returned by `open_cache_ledger`.
+
+    Returns:
+        Dict[str, Any]: Hits, misses, evictions, evicted bytes, total size and size per store.
+    """
+    stats = {"hits": 0, "misses": 0, "evictions": 0, "evicted_bytes": 0}
+    stats.update(dict(conn.execute("SELECT name, value FROM counters")))
+    stats["size_bytes"] = conn.execute(
+        "SELECT COALESCE(SUM(size), 0) FROM entries"
+    ).fetchone()[0]
+    stats["stores"] = dict(
+        conn.execute("SELECT store, SUM(size) FROM entries GROUP BY store")
+    )
+    return stats
+
+
+def use_cached(path: str, store: str, fetch: Callable[[], Any]) -> Any:
+    """
+    Fetch a file through the host-wide ledger and keep the cache within its quota.
+
+    Args:
+        path (str): The cached file path.
+        store (str): The name of the store the file belongs to.
+        fetch (Callable[[], Any]): Makes sure the file exists, e.g. by downloading it.
+
+    Returns:
+        Any: The return value of `fetch`.
+    """
+    hit = os.path.exists(path)
+    result = fetch()
+    conn = get_cache_ledger()
+    record_cache_access(conn, path, store, hit)
+    if not hit and CACHE_QUOTA_BYTES > 0:
+        evict_to_quota(conn, CACHE_QUOTA_BYTES)
+    return result
+
+
+def pin_assets(paths: List[str], pin_id: str) -> None:
+    """
+    Pin files in the host-wide ledger, see `pin_cache_paths`.
+
+    Args:
+        paths (List[str]): The file or directory paths to pin.
+        pin_id (str): The owner of the pins.
+
+    Returns:
+        None
+    """
+    pin_cache_paths(get_cache_ledger(), paths, pin_id)
+
+
+def unpin_assets(pin_id: str) -> None:
+    """
+    Release pins in the host-wide ledger, see `unpin_cache_paths`.
+
+    Args:
+        pin_id (str): The owner of the pins.
+
+    Returns:
+        None
+    """
+    unpin_cache_paths(get_cache_ledger(), pin_id)
+
+
+def get_host_cache_stats() -> Dict[str, Any]:
+    """
+    Get the counters of the host-wide ledger, see `get_cache_stats`.
+
+    Returns:
+        Dict[str, Any]: The cache statistics, including the configured quota.
+    """
+    stats = get_cache_stats(get_cache_ledger())
+    stats["quota_bytes"] = CACHE_QUOTA_BYTES
+    return stats
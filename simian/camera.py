@@ -7,6 +7,8 @@ from mathutils import Vector
 import numpy as np
 from scipy.spatial.transform import Rotation as R
 
+from .bounds import get_bounds_corners, get_objects_bounds
+
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
@@ -281,12 +283,8 @@ def position_camera(combination: dict, focus_object: bpy.types.Object) -> None:
     camera = bpy.context.scene.objects["Camera"]
 
     # Get the bounding box of the focus object in world space
-    bpy.context.view_layer.update()
-    
-    bbox = [
-        focus_object.matrix_world @ Vector(corner) for corner in focus_object.bound_box
-    ]
-    bbox_points = np.array([corner.to_tuple() for corner in bbox])
+    bbox_min, bbox_max = get_objects_bounds([focus_object])
+    bbox_points = get_bounds_corners(bbox_min, bbox_max)
 
     # Rotate points as per the desired view angle if any
     # Assuming we want to compute this based on some predefined rotation angles
@@ -315,14 +313,8 @@ def position_camera(combination: dict, focus_object: bpy.types.Object) -> None:
     else:
         camera.data.sensor_fit = "VERTICAL"
 
-    bbox = [
-        focus_object.matrix_world @ Vector(corner) for corner in focus_object.bound_box
-    ]
-    bbox_min = min(bbox, key=lambda v: v.z)
-    bbox_max = max(bbox, key=lambda v: v.z)
-
     # Calculate the height of the bounding box
-    bbox_height = bbox_max.z - bbox_min.z
+    bbox_height = bbox_max[2] - bbox_min[2]
 
     # Position the camera based on the computed distance
     camera.location = Vector((camera_distance, 0, 0))  # Adjust this as needed
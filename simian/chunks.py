@@ -0,0 +1,232 @@
+import argparse
+import logging
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+from typing import List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+FFMPEG_BINARY = os.environ.get("SIMIAN_FFMPEG", "ffmpeg")
+
+
+def split_frame_range(start_frame: int, end_frame: int, num_chunks: int) -> List[Tuple[int, int]]:
+    """
+    Split an inclusive frame range into contiguous chunks of nearly equal length.
+
+    Args:
+        start_frame (int): The first frame.
+        end_frame (int): The last frame, inclusive.
+        num_chunks (int): The number of chunks. Capped at the number of frames.
+
+    Returns:
+        List[Tuple[int, int]]: The first and last frame of every chunk, in order.
+    """
+    num_frames = end_frame - start_frame + 1
+    if num_frames <= 0:
+        raise ValueError(f"Empty frame range {start_frame}-{end_frame}")
+    num_chunks = max(1, min(num_chunks, num_frames))
+
+    chunk_size, remainder = divmod(num_frames, num_chunks)
+    chunks = []
+    chunk_start = start_frame
+    for i in range(num_chunks):
+        chunk_end = chunk_start + chunk_size - 1 + (1 if i < remainder else 0)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + 1
+    return chunks
+
+
+def get_chunk_path(output_dir: str, combination_index: int, frame_range: Tuple[int, int]) -> str:
+    """
+    Get the path of the video rendered for one frame chunk of a combination.
+
+    Args:
+        output_dir (str): Path to the directory where the renders are saved.
+        combination_index (int): Index of the combination.
+        frame_range (Tuple[int, int]): The first and last frame of the chunk.
+
+    Returns:
+        str: The chunk video path.
+    """
+    return os.path.join(
+        output_dir,
+        f"{combination_index}_chunk_{frame_range[0]:05d}_{frame_range[1]:05d}.mp4",
+    )
+
+
+def get_chunk_upload_name(
+    combination_index: int, frame_range: Tuple[int, int], upload_dest: str = "s3"
+) -> str:
+    """
+    Get the name a chunk video is uploaded under by a distributed worker.
+
+    Args:
+        combination_index (int): Index of the combination.
+        frame_range (Tuple[int, int]): The first and last frame of the chunk.
+        upload_dest (str): "hf", which keeps the local file name, or "s3". Defaults to "s3".
+
+    Returns:
+        str: The uploaded chunk name.
+    """
+    if upload_dest == "hf":
+        return os.path.basename(get_chunk_path("", combination_index, frame_range))
+    return f"{combination_index:05d}_chunk_{frame_range[0]:05d}_{frame_range[1]:05d}.mp4"
+
+
+def get_join_command(
+    combination_index: int, frame_ranges: List[Tuple[int, int]], upload_dest: str = "s3"
+) -> str:
+    """
+    Get the command that joins the downloaded chunk uploads of one combination.
+
+    Distributed workers upload every chunk on its own and nothing joins them there, so
+    the coordinator lists these commands once the job is done.
+
+    Args:
+        combination_index (int): Index of the combination.
+        frame_ranges (List[Tuple[int, int]]): The frame chunks of the video, in order.
+        upload_dest (str): "hf" or "s3", the destination the chunks were uploaded to. Defaults to "s3".
+
+    Returns:
+        str: The `simian.chunks` command, run from the directory of the downloaded chunks.
+    """
+    if upload_dest == "hf":
+        output_name = f"{combination_index}.mp4"
+    else:
+        output_name = f"{combination_index:05d}.mp4"
+    chunk_names = [
+        get_chunk_upload_name(combination_index, frame_range, upload_dest)
+        for frame_range in frame_ranges
+    ]
+    return f"python -m simian.chunks --output {output_name} {' '.join(chunk_names)}"
+
+
+def concat_chunks(chunk_paths: List[str], output_path: str) -> str:
+    """
+    Join chunk videos into one video without re-encoding.
+
+    The chunks must share codec and encoding settings, which holds for chunks rendered
+    from the same scene. Uses the ffmpeg concat demuxer with stream copy, so the frames
+    of the output are bit-identical to the frames of the chunks.
+
+    Args:
+        chunk_paths (List[str]): The chunk videos in playback order.
+        output_path (str): Path of the joined video.
+
+    Raises:
+        FileNotFoundError: If a chunk video is missing.
+        subprocess.CalledProcessError: If ffmpeg fails.
+
+    Returns:
+        str: The joined video path.
+    """
+    for chunk_path in chunk_paths:
+        if not os.path.exists(chunk_path):
+            raise FileNotFoundError(f"Missing chunk {chunk_path}")
+
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".txt", dir=os.path.dirname(os.path.abspath(output_path)), delete=False
+    ) as list_file:
+        for chunk_path in chunk_paths:
+            escaped = os.path.abspath(chunk_path).replace("'", "'\\''")
+            list_file.write(f"file '{escaped}'\n")
+
+    try:
+        subprocess.run(
+            [
+                FFMPEG_BINARY,
+                "-y",
+                "-loglevel", "error",
+                "-f", "concat",
+                "-safe", "0",
+                "-i", list_file.name,
+                "-c", "copy",
+                output_path,
+            ],
+            check=True,
+        )
+    finally:
+        os.remove(list_file.name)
+
+    logger.info(f"Joined {len(chunk_paths)} chunks into {output_path}")
+    return output_path
+
+
+def render_chunks(
+    combination_index: int,
+    start_frame: int,
+    end_frame: int,
+    num_chunks: int,
+    output_dir: str,
+    render_args: str,
+    render_timeout: Optional[int] = None,
+    keep_chunks: bool = False,
+) -> str:
+    """
+    Render one combination as several frame chunks in parallel processes and join them.
+
+    Every process builds the same scene from the combination, so the chunks line up
+    exactly, and renders only its own frames.
+
+    Args:
+        combination_index (int): Index of the combination.
+        start_frame (int): The first frame of the video.
+        end_frame (int): The last frame of the video.
+        num_chunks (int): The number of render processes.
+        output_dir (str): Path to the directory where the renders are saved.
+        render_args (str): Further arguments for `simian.render`, e.g. the combination and hdri path.
+        render_timeout (Optional[int]): Maximum time in seconds for each chunk. Defaults to None.
+        keep_chunks (bool): Keep the chunk videos after joining them. Defaults to False.
+
+    Raises:
+        RuntimeError: If a chunk fails to render.
+
+    Returns:
+        str: The path of the joined video.
+    """
+    frame_ranges = split_frame_range(start_frame, end_frame, num_chunks)
+
+    processes = []
+    for frame_range in frame_ranges:
+        args = f"--combination_index {combination_index} --output_dir {shlex.quote(output_dir)}"
+        args += f" --start_frame {start_frame} --end_frame {end_frame}"
+        args += f" --frame_range {frame_range[0]} {frame_range[1]} {render_args}"
+        command = f"{sys.executable} -m simian.render -- {args}"
+        processes.append(subprocess.Popen(["bash", "-c", command]))
+
+    failed = []
+    for frame_range, process in zip(frame_ranges, processes):
+        try:
+            if process.wait(timeout=render_timeout) != 0:
+                failed.append(frame_range)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            failed.append(frame_range)
+    if failed:
+        raise RuntimeError(f"Combination {combination_index} failed to render chunks {failed}")
+
+    chunk_paths = [
+        get_chunk_path(output_dir, combination_index, frame_range)
+        for frame_range in frame_ranges
+    ]
+    output_path = concat_chunks(
+        chunk_paths, os.path.join(output_dir, f"{combination_index}.mp4")
+    )
+    if not keep_chunks:
+        for chunk_path in chunk_paths:
+            os.remove(chunk_path)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Join chunk videos rendered with --frame_range.")
+    parser.add_argument("chunks", nargs="+", help="Chunk videos in playback order.")
+    parser.add_argument("--output", required=True, help="Path of the joined video.")
+    args = parser.parse_args()
+
+    concat_chunks(args.chunks, args.output)
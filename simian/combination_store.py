@@ -0,0 +1,326 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import boto3
+
+from .asset_cache import fetch_cached, get_cache_path, get_http_session
+from .combiner import generate_combination, get_config_hash
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Rows written per transaction when building a store
+_INSERT_CHUNK_SIZE = 10000
+
+
+def get_file_version(path: str) -> str:
+    """
+    Get the content version of a combinations file.
+
+    Args:
+        path (str): Path to the combinations JSON file.
+
+    Returns:
+        str: The sha256 of the file contents.
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def publish_combinations(
+    combinations_file: str, uri: str, job_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Publish a combinations file where workers can fetch it and describe it as a store spec.
+
+    Tasks only carry the spec and their index range, workers fetch the file once per job.
+
+    Args:
+        combinations_file (str): Path to the combinations JSON file.
+        uri (str): Where to publish the file, an "s3://bucket/key" url, an http(s) url
+            the file is already served from, or a path on a volume shared with the workers.
+        job_id (Optional[str]): The job the store belongs to. Defaults to the file version.
+
+    Returns:
+        Dict[str, Any]: The store spec with the job id, version, uri and count.
+    """
+    version = get_file_version(combinations_file)
+    with open(combinations_file, "r") as file:
+        count = len(json.load(file)["combinations"])
+
+    if uri.startswith("s3://"):
+        bucket, key = uri[len("s3://"):].split("/", 1)
+        boto3.client("s3").upload_file(combinations_file, bucket, key)
+    elif not uri.startswith(("http://", "https://")):
+        if os.path.abspath(uri) != os.path.abspath(combinations_file):
+            os.makedirs(os.path.dirname(os.path.abspath(uri)), exist_ok=True)
+            shutil.copyfile(combinations_file, uri)
+
+    logger.info(f"Published {count} combinations to {uri} (version {version[:12]})")
+    return {"job_id": job_id or version[:12], "version": version, "uri": uri, "count": count}
+
+
+def get_generated_spec(
+    seed: int, config: Dict[str, Any], count: int, job_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Describe combinations that workers generate themselves from a seed as a store spec.
+
+    Workers generate only the indices of their tasks, see `combiner.generate_combination`.
+
+    Args:
+        seed (int): Seed for the combination generator.
+        config (Dict[str, Any]): Generator settings, see `combiner.DEFAULT_GENERATOR_CONFIG`.
+        count (int): Number of combinations.
+        job_id (Optional[str]): The job the store belongs to. Defaults to the version.
+
+    Returns:
+        Dict[str, Any]: The store spec with the job id, version, seed, config hash, config and count.
+    """
+    config_hash = get_config_hash(config)
+    version = hashlib.sha256(f"{config_hash}:{seed}:{count}".encode()).hexdigest()
+    return {
+        "job_id": job_id or version[:12],
+        "version": version,
+        "seed": seed,
+        "config_hash": config_hash,
+        "config": config,
+        "count": count,
+    }
+
+
+def write_store(path: str, combinations: Iterable[Tuple[int, Dict[str, Any]]]) -> int:
+    """
+    Write combinations to a store file that can be read one index at a time.
+
+    Args:
+        path (str): Path of the SQLite file to write.
+        combinations (Iterable[Tuple[int, Dict[str, Any]]]): Combination indices and combinations.
+
+    Returns:
+        int: The number of combinations written.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(
+            "CREATE TABLE combinations (idx INTEGER PRIMARY KEY, combination TEXT)"
+        )
+        count = 0
+        rows = []
+        for index, combination in combinations:
+            rows.append((index, json.dumps(combination)))
+            if len(rows) >= _INSERT_CHUNK_SIZE:
+                conn.executemany("INSERT INTO combinations VALUES (?, ?)", rows)
+                count += len(rows)
+                rows = []
+        conn.executemany("INSERT INTO combinations VALUES (?, ?)", rows)
+        count += len(rows)
+        conn.commit()
+    finally:
+        conn.close()
+    return count
+
+
+def _fetch_source(uri: str, path: str) -> None:
+    """
+    Copy a published combinations file to a local path.
+
+    Args:
+        uri (str): An "s3://bucket/key" url, an http(s) url or a local path.
+        path (str): The local path to write.
+
+    Returns:
+        None
+    """
+    if uri.startswith("s3://"):
+        bucket, key = uri[len("s3://"):].split("/", 1)
+        boto3.client("s3").download_file(bucket, key, path)
+    elif uri.startswith(("http://", "https://")):
+        response = get_http_session().get(uri, stream=True, timeout=60)
+        try:
+            response.raise_for_status()
+            with open(path, "wb") as file:
+                for chunk in response.iter_content(1024 * 1024):
+                    file.write(chunk)
+        finally:
+            response.close()
+    else:
+        shutil.copyfile(uri, path)
+
+
+def _build_store(spec: Dict[str, Any], path: str) -> None:
+    """
+    Build the local store file of a spec.
+
+    Args:
+        spec (Dict[str, Any]): Spec returned by `publish_combinations`.
+        path (str): Path of the SQLite file to write.
+
+    Raises:
+        ValueError: If the fetched file does not match the spec's version.
+
+    Returns:
+        None
+    """
+    source_path = f"{path}.json"
+    try:
+        _fetch_source(spec["uri"], source_path)
+        version = get_file_version(source_path)
+        if version != spec["version"]:
+            raise ValueError(
+                f"{spec['uri']} has version {version}, expected {spec['version']}"
+            )
+        with open(source_path, "r") as file:
+            data = json.load(file)
+    finally:
+        if os.path.exists(source_path):
+            os.remove(source_path)
+
+    count = write_store(path, enumerate(data["combinations"]))
+    logger.info(f"Built combination store {spec['version'][:12]} with {count} combinations")
+
+
+def load_combination_store(spec: Dict[str, Any]) -> str:
+    """
+    Make sure the store of a spec is available on this host.
+
+    The store is fetched once per host and version, concurrent workers wait for the
+    first one instead of fetching it again.
+
+    Args:
+        spec (Dict[str, Any]): Spec returned by `publish_combinations`.
+
+    Returns:
+        str: Path of the local store file.
+    """
+    path = get_cache_path("combinations", f"{spec['version']}.sqlite")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return fetch_cached(path, lambda tmp_path: _build_store(spec, tmp_path))
+
+
+@functools.lru_cache(maxsize=None)
+def _open_store(store_path: str) -> sqlite3.Connection:
+    """
+    Open a store file read-only, once per process.
+
+    Args:
+        store_path (str): Path of the local store file.
+
+    Returns:
+        sqlite3.Connection: The open connection.
+    """
+    return sqlite3.connect(
+        f"file:{store_path}?mode=ro", uri=True, check_same_thread=False
+    )
+
+
+def get_stored_combination(store_path: str, index: int) -> Dict[str, Any]:
+    """
+    Read one combination from a store file.
+
+    Args:
+        store_path (str): Path of the local store file.
+        index (int): Index of the combination.
+
+    Raises:
+        IndexError: If the store has no combination with this index.
+
+    Returns:
+        Dict[str, Any]: The combination.
+    """
+    row = _open_store(store_path).execute(
+        "SELECT combination FROM combinations WHERE idx = ?", (index,)
+    ).fetchone()
+    if row is None:
+        raise IndexError(f"No combination {index} in {store_path}")
+    return json.loads(row[0])
+
+
+def get_stored_combinations(
+    store_path: str, start_index: int, end_index: int
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Read a range of combinations from a store file.
+
+    Args:
+        store_path (str): Path of the local store file.
+        start_index (int): The first index.
+        end_index (int): The index after the last one.
+
+    Returns:
+        List[Tuple[int, Dict[str, Any]]]: Combination indices and combinations, in order.
+    """
+    rows = _open_store(store_path).execute(
+        "SELECT idx, combination FROM combinations WHERE idx >= ? AND idx < ? ORDER BY idx",
+        (start_index, end_index),
+    )
+    return [(index, json.loads(combination)) for index, combination in rows]
+
+
+def resolve_combinations(
+    spec: Dict[str, Any], start_index: int, end_index: int
+) -> Tuple[Optional[str], List[Tuple[int, Dict[str, Any]]]]:
+    """
+    Get the combinations of a task from its job's store spec.
+
+    Published combinations are read from the local store file, generated ones are
+    generated on demand for just these indices.
+
+    Args:
+        spec (Dict[str, Any]): Spec returned by `publish_combinations` or `get_generated_spec`.
+        start_index (int): The first index.
+        end_index (int): The index after the last one.
+
+    Raises:
+        ValueError: If a generated spec's config does not match its config hash.
+
+    Returns:
+        Tuple[Optional[str], List[Tuple[int, Dict[str, Any]]]]: The local store file, or
+        None for generated combinations, and the combination indices and combinations.
+    """
+    if "seed" in spec:
+        return resolve_combination_indices(spec, range(start_index, end_index))
+
+    store_path = load_combination_store(spec)
+    return store_path, get_stored_combinations(store_path, start_index, end_index)
+
+
+def resolve_combination_indices(
+    spec: Dict[str, Any], indices: Iterable[int]
+) -> Tuple[Optional[str], List[Tuple[int, Dict[str, Any]]]]:
+    """
+    Get the combinations of a task with arbitrary indices from its job's store spec.
+
+    Args:
+        spec (Dict[str, Any]): Spec returned by `publish_combinations` or `get_generated_spec`.
+        indices (Iterable[int]): The combination indices, in the order to render them.
+
+    Raises:
+        ValueError: If a generated spec's config does not match its config hash.
+        IndexError: If a published store has no combination with one of the indices.
+
+    Returns:
+        Tuple[Optional[str], List[Tuple[int, Dict[str, Any]]]]: The local store file, or
+        None for generated combinations, and the combination indices and combinations.
+    """
+    if "seed" in spec:
+        if get_config_hash(spec["config"]) != spec["config_hash"]:
+            raise ValueError(f"Generator config does not match hash {spec['config_hash']}")
+        combinations = [
+            (index, generate_combination(index, spec["seed"], spec["config"]))
+            for index in indices
+            if index < spec["count"]
+        ]
+        return None, combinations
+
+    store_path = load_combination_store(spec)
+    return store_path, [(index, get_stored_combination(store_path, index)) for index in indices]
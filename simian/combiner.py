@@ -1,3 +1,5 @@
+import functools
+import hashlib
 import logging
 import json
 import math
@@ -10,6 +12,7 @@ from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn
 
 from .transform import determine_relationships, adjust_positions
+from .asset_index import filter_asset_uids, get_asset_weights, load_asset_index
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
@@ -117,6 +120,34 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Randomly apply movement, object stacking, and camera follow effects"
     )
+    parser.add_argument(
+        "--per_index_seed",
+        action="store_true",
+        help="Seed every combination on its own, matching combinations generated by workers with generate_combination",
+    )
+    parser.add_argument(
+        "--asset_index_path",
+        type=str,
+        default=None,
+        help="Path to the asset index built by simian.asset_index, used to filter and weight objects",
+    )
+    parser.add_argument(
+        "--max_faces",
+        type=int,
+        default=None,
+        help="Skip objects with more faces than this (requires --asset_index_path)",
+    )
+    parser.add_argument(
+        "--max_import_time",
+        type=float,
+        default=None,
+        help="Skip objects that take longer than this many seconds to import (requires --asset_index_path)",
+    )
+    parser.add_argument(
+        "--weight_by_cost",
+        action="store_true",
+        help="Sample cheap objects more often based on their import time (requires --asset_index_path)",
+    )
     return parser.parse_args()
 
 
@@ -961,6 +992,172 @@ def generate_object_list(objects):
     return ", ".join([obj["description"] for obj in objects])
 
 
+def build_combination(
+    index: int,
+    camera_data: Dict[str, Any],
+    dataset_names: List[str],
+    dataset_weights: List[int],
+    object_data: Dict[str, Any],
+    dataset_dict: Dict[str, Any],
+    captions_data: Dict[str, Any],
+    background_dict: Dict[str, Any],
+    background_names: List[str],
+    background_weights: List[int],
+    texture_data: Dict[str, Any],
+    movement: bool = False,
+    max_speed: float = 0.5,
+    ontop_data: bool = False,
+    camera_follow: bool = False,
+    random_flag: bool = False,
+    object_weights: Optional[List[float]] = None,
+    max_number_of_objects: int = 5,
+) -> Dict[str, Any]:
+    """
+    Build one combination, drawing from the current state of the random module.
+
+    The arguments after index are the generator inputs returned by `load_generator_inputs`.
+
+    Args:
+        index (int): Index of the combination.
+
+    Returns:
+        Dict[str, Any]: The combination.
+    """
+    combination = {"index": index}
+
+    if random_flag:
+        movement = random.choice([True, False])
+        ontop = random.choice([True, False])
+        camera_follow = random.choice([True, False])
+        max_speed = random.uniform(0.1, 0.5)
+
+    # Generate objects
+    combination["objects_caption"] = "Object caption:"
+    objects = generate_objects(
+        object_data,
+        dataset_names,
+        dataset_weights,
+        dataset_dict,
+        captions_data,
+        ontop_data,
+        object_weights,
+        max_number_of_objects,
+    )
+    combination["objects"] = objects
+    object_list = generate_object_list(objects)
+    object_list_intro = object_data["object_list_intro"]
+    intro = random.choice(object_list_intro)
+    combination["objects_caption"] = intro.replace("<object_list>", object_list)
+
+    # Generate background
+    combination["background_caption"] = "Scene background:"
+    background = generate_background(
+        background_dict, background_names, background_weights
+    )
+    combination["background"] = background
+    combination["background_caption"] += f" The landscape is {background['name']}."
+
+    # Calculate transformed positions
+    adjusted_objects = adjust_positions(objects, random.randint(0, 360))
+    for obj, adjusted_obj in zip(objects, adjusted_objects):
+        obj["transformed_position"] = adjusted_obj["transformed_position"]
+
+    # Generate orientation and framing
+    combination["orientation_caption"] = "Camera orientation:"
+    orientation = generate_orientation(camera_data, objects, background)
+    framing = generate_framing(camera_data)
+    combination["orientation"] = orientation
+
+    combination["framing_caption"] = "Camera framing:"
+    combination["framing"] = framing
+
+    # Generate animation
+    combination["animation_caption"] = "Camera animation:"
+    animation = generate_animation(camera_data)
+    combination["animation"] = animation
+
+    # Generate stage
+    combination["stage_caption"] = "Scene stage:"
+    stage = generate_stage(texture_data)
+    combination["stage"] = stage
+
+    # Generate postprocessing
+    combination["postprocessing_caption"] = "Post-processing effects:"
+    postprocessing = generate_postprocessing(camera_data)
+    combination["postprocessing"] = postprocessing
+
+    # Add movement to objects
+    if movement:
+        objects = add_movement_to_objects(objects, movement, max_speed)
+    else:
+        combination["no_movement"] = True
+
+    # Add camera follow
+    if camera_follow:
+        objects = add_camera_follow(objects, camera_follow)
+
+    # Generate captions
+    caption_parts = []
+
+    # Object captions
+    object_name_descriptions = generate_object_name_description_captions(
+        combination, object_data
+    )
+    caption_parts.append(object_name_descriptions)
+
+    # Relationship captions
+    scene_relationship_description = generate_relationship_captions(combination)
+    scene_relationship_description_str = " ".join(scene_relationship_description)
+    caption_parts.append(scene_relationship_description_str)
+    combination["objects_caption"] += scene_relationship_description_str
+    # Ontop captions
+    ontop_captions = generate_ontop_captions(combination, ontop_data, object_data)
+    caption_parts.extend(ontop_captions)
+    combination["objects_caption"] += " " + " ".join(ontop_captions)
+    # Camera follow captions
+    camerafollow_captions = generate_camerafollow_captions(combination, camera_data)
+    caption_parts.extend(camerafollow_captions)
+    combination["animation_caption"] += " " + " ".join(camerafollow_captions)
+    # Movement captions
+    movement_captions = generate_movement_captions(combination, object_data)
+    caption_parts.extend(movement_captions)
+    combination["objects_caption"] += " " + " ".join(movement_captions)
+
+    # Orientation caption
+    orientation_text = generate_orientation_caption(camera_data, combination)
+    caption_parts.append(orientation_text)
+    combination["orientation_caption"] += " " + orientation_text
+
+    # Framing caption
+    framing_caption = generate_framing_caption(camera_data, combination)
+    caption_parts.append(framing_caption)
+    combination["framing_caption"] += " " + framing_caption
+    # FOV caption
+    fov_caption = generate_fov_caption(combination)
+    caption_parts.append(fov_caption)
+    combination["framing_caption"] += " " + fov_caption
+
+    # Postprocessing caption
+    postprocessing_caption = generate_postprocessing_caption(combination, camera_data)
+    caption_parts.append(postprocessing_caption)
+    combination["postprocessing_caption"] += " " + postprocessing_caption
+
+    # Stage captions
+    stage_captions = generate_stage_captions(combination)
+    caption_parts.extend(stage_captions)
+    combination["stage_caption"] += " " + " ".join(stage_captions)
+
+    # Animation captions
+    animation_captions = generate_animation_captions(combination, camera_data)
+    caption_parts.extend(animation_captions)
+    combination["animation_caption"] += " " + " ".join(animation_captions)
+
+    # Generate overall caption
+    combination["caption"] = " ".join(caption_parts).strip()
+
+    return combination
+
+
 def generate_combinations(
     camera_data: Dict[str, Any],
     count: int,
@@ -979,6 +1176,9 @@ def generate_combinations(
     ontop_data: bool = False,
     camera_follow: bool = False,
     random_flag: bool = False,
+    object_weights: Optional[List[float]] = None,
+    max_number_of_objects: int = 5,
+    per_index_seed: bool = False,
 ) -> Dict[str, Any]:
     if seed is None:
         seed = -1
@@ -987,140 +1187,47 @@ def generate_combinations(
     combinations = []
 
     for i in range(count):
-        combination = {"index": i}
-
-        if random_flag:
-            movement = random.choice([True, False])
-            ontop = random.choice([True, False])
-            camera_follow = random.choice([True, False])
-            max_speed = random.uniform(0.1, 0.5)
-
-        # Generate objects
-        combination["objects_caption"] = "Object caption:"
-        objects = generate_objects(
-            object_data, dataset_names, dataset_weights, dataset_dict, captions_data, ontop_data
+        if per_index_seed:
+            # Seed every combination on its own, so it can be generated without the ones before it
+            random.seed(get_index_seed(seed, i))
+        combination = build_combination(
+            i,
+            camera_data,
+            dataset_names,
+            dataset_weights,
+            object_data,
+            dataset_dict,
+            captions_data,
+            background_dict,
+            background_names,
+            background_weights,
+            texture_data,
+            movement,
+            max_speed,
+            ontop_data,
+            camera_follow,
+            random_flag,
+            object_weights,
+            max_number_of_objects,
         )
-        combination["objects"] = objects
-        object_list = generate_object_list(objects)
-        object_list_intro = object_data["object_list_intro"]
-        intro = random.choice(object_list_intro)
-        combination["objects_caption"] = intro.replace("<object_list>", object_list)
-
-        # Generate background
-        combination["background_caption"] = "Scene background:"
-        background = generate_background(
-            background_dict, background_names, background_weights
-        )
-        combination["background"] = background
-        combination["background_caption"] += f" The landscape is {background['name']}."
-
-        # Calculate transformed positions
-        adjusted_objects = adjust_positions(objects, random.randint(0, 360))
-        for obj, adjusted_obj in zip(objects, adjusted_objects):
-            obj["transformed_position"] = adjusted_obj["transformed_position"]
-
-        # Generate orientation and framing
-        combination["orientation_caption"] = "Camera orientation:"
-        orientation = generate_orientation(camera_data, objects, background)
-        framing = generate_framing(camera_data)
-        combination["orientation"] = orientation
-
-        combination["framing_caption"] = "Camera framing:"
-        combination["framing"] = framing
-
-        # Generate animation
-        combination["animation_caption"] = "Camera animation:"
-        animation = generate_animation(camera_data)
-        combination["animation"] = animation
-
-        # Generate stage
-        combination["stage_caption"] = "Scene stage:"
-        stage = generate_stage(texture_data)
-        combination["stage"] = stage
-
-        # Generate postprocessing
-        combination["postprocessing_caption"] = "Post-processing effects:"
-        postprocessing = generate_postprocessing(camera_data)
-        combination["postprocessing"] = postprocessing
-
-        # Add movement to objects
-        if movement:
-            objects = add_movement_to_objects(objects, movement, max_speed)
-        else:
-            combination["no_movement"] = True
-
-        # Add camera follow
-        if camera_follow:
-            objects = add_camera_follow(objects, camera_follow)
-
-        # Generate captions
-        caption_parts = []
-
-        # Object captions
-        object_name_descriptions = generate_object_name_description_captions(
-            combination, object_data
-        )
-        caption_parts.append(object_name_descriptions)
-
-        # Relationship captions
-        scene_relationship_description = generate_relationship_captions(combination)
-        scene_relationship_description_str = " ".join(scene_relationship_description)
-        caption_parts.append(scene_relationship_description_str)
-        combination["objects_caption"] += scene_relationship_description_str
-        # Ontop captions
-        ontop_captions = generate_ontop_captions(combination, ontop_data, object_data)
-        caption_parts.extend(ontop_captions)
-        combination["objects_caption"] += " " + " ".join(ontop_captions)
-        # Camera follow captions
-        camerafollow_captions = generate_camerafollow_captions(combination, camera_data)
-        caption_parts.extend(camerafollow_captions)
-        combination["animation_caption"] += " " + " ".join(camerafollow_captions)
-        # Movement captions
-        movement_captions = generate_movement_captions(combination, object_data)
-        caption_parts.extend(movement_captions)
-        combination["objects_caption"] += " " + " ".join(movement_captions)
-
-        # Orientation caption
-        orientation_text = generate_orientation_caption(camera_data, combination)
-        caption_parts.append(orientation_text)
-        combination["orientation_caption"] += " " + orientation_text
-
-        # Framing caption
-        framing_caption = generate_framing_caption(camera_data, combination)
-        caption_parts.append(framing_caption)
-        combination["framing_caption"] += " " + framing_caption
-        # FOV caption
-        fov_caption = generate_fov_caption(combination)
-        caption_parts.append(fov_caption)
-        combination["framing_caption"] += " " + fov_caption
-
-        # Postprocessing caption
-        postprocessing_caption = generate_postprocessing_caption(combination, camera_data)
-        caption_parts.append(postprocessing_caption)
-        combination["postprocessing_caption"] += " " + postprocessing_caption
-
-        # Stage captions
-        stage_captions = generate_stage_captions(combination)
-        caption_parts.extend(stage_captions)
-        combination["stage_caption"] += " " + " ".join(stage_captions)
-
-        # Animation captions
-        animation_captions = generate_animation_captions(combination, camera_data)
-        caption_parts.extend(animation_captions)
-        combination["animation_caption"] += " " + " ".join(animation_captions)
-
-        # Generate overall caption
-        combination["caption"] = " ".join(caption_parts).strip()
-
         combinations.append(combination)
 
     data = {"seed": seed, "count": count, "combinations": combinations}
+    if per_index_seed:
+        data["per_index_seed"] = True
 
     return data
 
 
 def generate_objects(
-    object_data, dataset_names, dataset_weights, dataset_dict, captions_data, ontop_data
+    object_data,
+    dataset_names,
+    dataset_weights,
+    dataset_dict,
+    captions_data,
+    ontop_data,
+    object_weights=None,
+    max_number_of_objects: int = 5,
 ) -> List[Dict[str, Any]]:
     """
     Generate a list of random objects.
@@ -1132,6 +1239,8 @@ def generate_objects(
         dataset_dict (Dict[str, Any]): Dataset dictionary.
         captions_data (Dict[str, Any]): Captions data.
         ontop_data (str): Flag indicating whether to allow objects on top of each other.
+        object_weights (Optional[List[float]]): Sampling weight of each uid in the dataset. Defaults to None.
+        max_number_of_objects (int): Maximum number of objects to select. Defaults to 5.
 
     Returns:
         List[Dict[str, Any]]: List of generated objects.
@@ -1142,7 +1251,6 @@ def generate_objects(
         raise KeyError(f"Dataset '{chosen_dataset}' not found in dataset_dict")
 
     # Randomly generate max_number_of_objects
-    max_number_of_objects = parse_args().max_number_of_objects
     number_of_objects = random.randint(1, max_number_of_objects)
 
     object_scales = object_data["scales"]
@@ -1170,7 +1278,12 @@ def generate_objects(
     objects = []
     positions_taken = set()
     for i in range(number_of_objects):
-        object_uid = random.choice(dataset_dict[chosen_dataset])
+        if object_weights is not None:
+            object_uid = random.choices(
+                dataset_dict[chosen_dataset], weights=object_weights
+            )[0]
+        else:
+            object_uid = random.choice(dataset_dict[chosen_dataset])
         object_description = captions_data[object_uid]
         object_description = captions_data[object_uid].rstrip('.')  # Remove trailing period
         
@@ -1210,6 +1323,145 @@ def generate_objects(
     return objects
 
 
+
+# Generator settings used when generating combinations outside of the command line,
+# named like the command line arguments
+DEFAULT_GENERATOR_CONFIG = {
+    "max_number_of_objects": 5,
+    "camera_file_path": "data/camera_data.json",
+    "object_data_path": "data/object_data.json",
+    "texture_data_path": "datasets/texture_data.json",
+    "datasets_path": "data/datasets.json",
+    "cap3d_captions_path": "datasets/cap3d_captions.json",
+    "simdata_path": "datasets",
+    "movement": False,
+    "ontop": False,
+    "camera_follow": False,
+    "random": False,
+    "asset_index_path": None,
+    "max_faces": None,
+    "max_import_time": None,
+    "weight_by_cost": False,
+}
+
+
+def load_generator_inputs(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Load the data files a generator config points to.
+
+    Args:
+        config (Dict[str, Any]): Generator settings, see DEFAULT_GENERATOR_CONFIG. Missing keys use the defaults.
+
+    Returns:
+        Dict[str, Any]: Keyword arguments for `generate_combinations`, except count and seed.
+    """
+    config = {**DEFAULT_GENERATOR_CONFIG, **config}
+
+    captions_data = read_json_file(config["cap3d_captions_path"])
+    dataset_dict = {"cap3d": list(captions_data.keys())}
+
+    object_weights = None
+    if config["asset_index_path"] is not None:
+        asset_index = load_asset_index(config["asset_index_path"])
+        dataset_dict["cap3d"] = filter_asset_uids(
+            dataset_dict["cap3d"],
+            asset_index,
+            max_faces=config["max_faces"],
+            max_import_time=config["max_import_time"],
+        )
+        if config["weight_by_cost"]:
+            object_weights = get_asset_weights(dataset_dict["cap3d"], asset_index)
+
+    background_dict = {}
+    for bg in read_json_file(config["datasets_path"])["backgrounds"]:
+        bg_path = os.path.join(config["simdata_path"], bg + ".json")
+        if os.path.exists(bg_path):
+            background_dict[bg] = read_json_file(bg_path)
+    background_names = list(background_dict.keys())
+
+    return {
+        "camera_data": read_json_file(config["camera_file_path"]),
+        "dataset_names": ["cap3d"],
+        "dataset_weights": [1],
+        "object_data": read_json_file(config["object_data_path"]),
+        "dataset_dict": dataset_dict,
+        "captions_data": captions_data,
+        "background_dict": background_dict,
+        "background_names": background_names,
+        "background_weights": [len(background_dict[name]) for name in background_names],
+        "texture_data": read_json_file(config["texture_data_path"]),
+        "movement": config["movement"],
+        "max_speed": 1.0,
+        "ontop_data": config["ontop"],
+        "camera_follow": config["camera_follow"],
+        "random_flag": config["random"],
+        "object_weights": object_weights,
+        "max_number_of_objects": config["max_number_of_objects"],
+    }
+
+
+def get_config_hash(config: Dict[str, Any]) -> str:
+    """
+    Get a stable hash of a generator config, with missing keys set to their defaults.
+
+    Args:
+        config (Dict[str, Any]): Generator settings, see DEFAULT_GENERATOR_CONFIG.
+
+    Returns:
+        str: The hex digest identifying the config.
+    """
+    config = {**DEFAULT_GENERATOR_CONFIG, **config}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def get_index_seed(seed: int, index: int) -> int:
+    """
+    Derive the seed of one combination from the seed of the dataset.
+
+    Args:
+        seed (int): Seed of the dataset.
+        index (int): Index of the combination.
+
+    Returns:
+        int: The seed of the combination.
+    """
+    digest = hashlib.sha256(f"{seed}:{index}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+@functools.lru_cache(maxsize=4)
+def _get_generator_inputs(config_json: str) -> Dict[str, Any]:
+    """
+    Load the generator inputs of a config once per process.
+
+    Args:
+        config_json (str): The config, serialized with sorted keys.
+
+    Returns:
+        Dict[str, Any]: The generator inputs, see `load_generator_inputs`.
+    """
+    return load_generator_inputs(json.loads(config_json))
+
+
+def generate_combination(index: int, seed: int, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Generate combination `index` of a dataset without generating the ones before it.
+
+    Matches combination `index` of the command line with the same settings and
+    `--seed seed --per_index_seed`. The data files of the config are loaded once per process.
+
+    Args:
+        index (int): Index of the combination.
+        seed (int): Seed of the dataset.
+        config (Dict[str, Any]): Generator settings, see DEFAULT_GENERATOR_CONFIG.
+
+    Returns:
+        Dict[str, Any]: The combination.
+    """
+    inputs = _get_generator_inputs(json.dumps(config, sort_keys=True))
+    random.seed(get_index_seed(seed, index))
+    return build_combination(index, **inputs)
+
 if __name__ == "__main__":
     console = Console()
     logging.basicConfig(level=logging.INFO, format='%(message)s')
@@ -1235,6 +1487,19 @@ if __name__ == "__main__":
     cap3d_data = read_json_file(cap3d_data_path)
     dataset_dict = {"cap3d": list(cap3d_data.keys())}
 
+    # Filter and weight objects by the properties recorded in the asset index
+    object_weights = None
+    if args.asset_index_path is not None:
+        asset_index = load_asset_index(args.asset_index_path)
+        dataset_dict["cap3d"] = filter_asset_uids(
+            dataset_dict["cap3d"],
+            asset_index,
+            max_faces=args.max_faces,
+            max_import_time=args.max_import_time,
+        )
+        if args.weight_by_cost:
+            object_weights = get_asset_weights(dataset_dict["cap3d"], asset_index)
+
     tasks = [
         ("Loading object data", args.object_data_path),
         ("Loading stage data", args.stage_data_path),
@@ -1297,7 +1562,10 @@ if __name__ == "__main__":
         speed,
         ontop_data,
         camera_follow,
-        random_flag
+        random_flag,
+        object_weights,
+        args.max_number_of_objects,
+        args.per_index_seed,
     )
 
     # Write to JSON file
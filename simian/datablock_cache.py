@@ -0,0 +1,174 @@
+import logging
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+import bpy
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# bpy.data collections the cache can hold datablocks of, keyed by datablock type
+DATABLOCK_COLLECTIONS = {
+    bpy.types.Image: "images",
+    bpy.types.Material: "materials",
+    bpy.types.Mesh: "meshes",
+}
+
+_datablock_cache = None
+
+
+def estimate_datablock_size(datablock: bpy.types.ID) -> int:
+    """
+    Estimate how much memory a datablock holds once loaded.
+
+    Images count their decoded pixels, meshes their geometry and materials the images
+    they use.
+
+    Args:
+        datablock (bpy.types.ID): The image, material or mesh.
+
+    Returns:
+        int: The estimated size in bytes.
+    """
+    if isinstance(datablock, bpy.types.Image):
+        width, height = datablock.size
+        bytes_per_channel = 4 if datablock.is_float else 1
+        return width * height * max(datablock.channels, 1) * bytes_per_channel
+    if isinstance(datablock, bpy.types.Mesh):
+        return (
+            len(datablock.vertices) * 64
+            + len(datablock.loops) * 32
+            + len(datablock.polygons) * 32
+        )
+    if isinstance(datablock, bpy.types.Material) and datablock.node_tree:
+        return sum(
+            estimate_datablock_size(node.image)
+            for node in datablock.node_tree.nodes
+            if node.type == "TEX_IMAGE" and node.image is not None
+        )
+    return 0
+
+
+class DatablockCache:
+    """
+    A least recently used cache of images, materials and meshes inside a render process.
+
+    Cached datablocks get a fake user, so they survive `reset_scene` between jobs while
+    everything else is purged. When the estimated size of the cache exceeds the budget,
+    the least recently used datablocks lose their fake user and are purged.
+    """
+
+    def __init__(self, budget_bytes: int):
+        """
+        Args:
+            budget_bytes (int): The memory budget of the cache in bytes.
+        """
+        self.budget_bytes = budget_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[str, str, int]]" = OrderedDict()
+
+    @property
+    def size_bytes(self) -> int:
+        """
+        The estimated size of all cached datablocks in bytes.
+        """
+        return sum(size for _, _, size in self._entries.values())
+
+    def get(self, key: Hashable) -> Optional[bpy.types.ID]:
+        """
+        Get a cached datablock and mark it as recently used.
+
+        Args:
+            key (Hashable): The cache key.
+
+        Returns:
+            Optional[bpy.types.ID]: The datablock, or None if it is not cached.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            collection, name, _ = entry
+            datablock = getattr(bpy.data, collection).get(name)
+            if datablock is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return datablock
+            # The datablock was removed behind the cache's back
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, datablock: bpy.types.ID) -> bpy.types.ID:
+        """
+        Keep a datablock resident between jobs.
+
+        Args:
+            key (Hashable): The cache key.
+            datablock (bpy.types.ID): The image, material or mesh.
+
+        Returns:
+            bpy.types.ID: The datablock.
+        """
+        collection = next(
+            name
+            for kind, name in DATABLOCK_COLLECTIONS.items()
+            if isinstance(datablock, kind)
+        )
+        datablock.use_fake_user = True
+        self._entries[key] = (
+            collection,
+            datablock.name,
+            estimate_datablock_size(datablock),
+        )
+        self._entries.move_to_end(key)
+        return datablock
+
+    def trim(self) -> int:
+        """
+        Release the least recently used datablocks until the cache fits its budget.
+
+        Released datablocks are purged together with any other orphan data.
+
+        Returns:
+            int: The number of released datablocks.
+        """
+        released = 0
+        total = self.size_bytes
+        while total > self.budget_bytes and self._entries:
+            _, (collection, name, size) = self._entries.popitem(last=False)
+            datablock = getattr(bpy.data, collection).get(name)
+            if datablock is not None:
+                datablock.use_fake_user = False
+            total -= size
+            released += 1
+        if released:
+            bpy.data.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
+            logger.info(f"Released {released} cached datablocks, {total} bytes resident")
+        return released
+
+
+def enable_datablock_cache(budget_bytes: int) -> DatablockCache:
+    """
+    Enable the datablock cache of this render process.
+
+    Args:
+        budget_bytes (int): The memory budget of the cache in bytes.
+
+    Returns:
+        DatablockCache: The process-wide cache.
+    """
+    global _datablock_cache
+    if _datablock_cache is None:
+        _datablock_cache = DatablockCache(budget_bytes)
+    _datablock_cache.budget_bytes = budget_bytes
+    return _datablock_cache
+
+
+def get_datablock_cache() -> Optional[DatablockCache]:
+    """
+    Get the datablock cache of this render process.
+
+    Returns:
+        Optional[DatablockCache]: The cache, or None if it is not enabled.
+    """
+    return _datablock_cache
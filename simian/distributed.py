@@ -1,18 +1,119 @@
 import argparse
+import collections
+import itertools
 import json
 import logging
 import os
+import threading
 import time
+import uuid
+from concurrent.futures import Future
 from tqdm import tqdm
-from typing import Dict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from celery import group
+from celery.result import AsyncResult
+from celery.utils.nodenames import worker_direct
+from kombu import Queue
 
 from distributask.distributask import Distributask
 
+from .autoscaler import Autoscaler, VastProvider
+from .chunks import get_join_command, split_frame_range
+from .combination_store import get_generated_spec, publish_combinations
+from .ledger import get_failure_ledger, get_output_key, get_rendered_outputs
+from .locality import LocalityRouter, get_combination_assets, order_by_assets
+from .offers import OfferSelector, get_offer_type
+from .progress import ProgressTracker, clear_progress
+from .scheduler import AdaptiveScheduler, get_task_key
 from .worker import run_job
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
+# Tasks sent as one group over a single broker connection
+SUBMIT_CHUNK_SIZE = 1000
+
+
+def submit_tasks(
+    distributask: Distributask,
+    func_name: str,
+    task_args: Iterable[Dict[str, Any]],
+    chunk_size: int = SUBMIT_CHUNK_SIZE,
+    results: Optional[List[AsyncResult]] = None,
+    queue: Optional[Queue] = None,
+) -> List[AsyncResult]:
+    """
+    Submit many calls of a registered function in chunks.
+
+    Every chunk is sent as a celery group through one producer, which keeps its
+    broker connection open for the whole submission instead of acquiring one per task.
+    Task arguments are consumed lazily, so a generator can describe millions of tasks.
+
+    Args:
+        distributask (Distributask): The distributask instance.
+        func_name (str): The name of the registered function.
+        task_args (Iterable[Dict[str, Any]]): The arguments of every call.
+        chunk_size (int, optional): Tasks per group. Defaults to SUBMIT_CHUNK_SIZE.
+        results (Optional[List[AsyncResult]], optional): List to append the results to as
+            chunks are sent. Defaults to a new list.
+        queue (Optional[Queue], optional): Queue to send the tasks to, e.g. a worker's
+            direct queue. Defaults to None, the shared queue.
+
+    Returns:
+        List[AsyncResult]: The results of the submitted tasks.
+    """
+    if results is None:
+        results = []
+    task = distributask.call_function_task
+    task_args = iter(task_args)
+    with distributask.app.producer_or_acquire() as producer:
+        while True:
+            chunk = list(itertools.islice(task_args, chunk_size))
+            if not chunk:
+                break
+            signatures = [task.s(func_name, json.dumps(args)) for args in chunk]
+            options = {"queue": queue} if queue is not None else {}
+            group_result = group(signatures).apply_async(producer=producer, **options)
+            results.extend(group_result.results)
+            logger.info(f"Submitted {len(results)} tasks")
+    return results
+
+
+def start_submission(
+    distributask: Distributask,
+    func_name: str,
+    task_args: Iterable[Dict[str, Any]],
+    chunk_size: int = SUBMIT_CHUNK_SIZE,
+) -> Tuple[Future, List[AsyncResult]]:
+    """
+    Submit tasks on a background thread, see `submit_tasks`.
+
+    Args:
+        distributask (Distributask): The distributask instance.
+        func_name (str): The name of the registered function.
+        task_args (Iterable[Dict[str, Any]]): The arguments of every call.
+        chunk_size (int, optional): Tasks per group. Defaults to SUBMIT_CHUNK_SIZE.
+
+    Returns:
+        Tuple[Future, List[AsyncResult]]: A future that is done once the submission has
+        finished, and raises its error if it failed, and the list results are appended to.
+    """
+    results = []
+    future = Future()
+
+    def submit() -> None:
+        """Submit the tasks and hand the outcome to the future."""
+        try:
+            future.set_result(submit_tasks(distributask, func_name, task_args, chunk_size, results))
+        except BaseException as e:
+            future.set_exception(e)
+
+    thread = threading.Thread(target=submit, name="simian-submit", daemon=True)
+    thread.start()
+    return future, results
+
+
 if __name__ == "__main__":
 
     def get_env_vars(path: str = ".env") -> Dict[str, str]:
@@ -59,9 +160,20 @@ if __name__ == "__main__":
             "render_batch_size": args.render_batch_size
             or int(env_vars.get("RENDER_BATCH_SIZE", 1)),
             "inactivity_check_interval": args.inactivity_check or int(env_vars.get("INACTVITY_INTERVAL", 600)),
-            "upload_destination": args.upload_dest or env_vars.get("UPLOAD_DEST", "s3")
+            "upload_destination": args.upload_dest or env_vars.get("UPLOAD_DEST", "s3"),
+            "chunks": args.chunks or int(env_vars.get("CHUNKS", 1)),
+            "combination_store": args.combination_store or env_vars.get("COMBINATION_STORE", ""),
+            "generator_config": args.generator_config or env_vars.get("GENERATOR_CONFIG", ""),
+            "seed": args.seed if args.seed is not None else int(env_vars.get("SEED", 0)),
+            "adaptive": args.adaptive or env_vars.get("ADAPTIVE", "") == "1",
+            "target_minutes": args.target_minutes or float(env_vars.get("TARGET_MINUTES", 0)),
         }
 
+        # Workers generate the combinations themselves when a generator config is given
+        if settings["generator_config"]:
+            settings["combinations"] = []
+            return settings
+
         # Load combinations from file
         with open(settings["combinations_file"], "r") as f:
             combinations = json.load(f)
@@ -106,7 +218,10 @@ if __name__ == "__main__":
             "broker_pool_limit": settings["broker_pool_limit"],
             "render_batch_size": settings["render_batch_size"],
             "inactivity_check_interval": settings["inactivity_check_interval"],
-            "upload_destination": settings["upload_destination"]
+            "upload_destination": settings["upload_destination"],
+            "chunks": settings["chunks"],
+            "adaptive": settings["adaptive"],
+            "target_minutes": settings["target_minutes"],
         }
 
         instance_env = {
@@ -144,102 +259,319 @@ if __name__ == "__main__":
         docker_image = "antbaez/simian-worker:latest"
         module_name = "simian.worker"
 
+        distributask.register_function(run_job)
+
+        # Workers report completed tasks of this job to Redis, see simian.progress
+        job_id = uuid.uuid4().hex[:12]
+        clear_progress(distributask.get_redis_connection(), job_id)
+
+        # Publish the combinations once so tasks only carry indices
+        combination_store = None
+        if settings["generator_config"]:
+            with open(settings["generator_config"], "r") as f:
+                generator_config = json.load(f)
+            combination_store = get_generated_spec(
+                settings["seed"], generator_config, settings["end_index"]
+            )
+        elif settings["combination_store"]:
+            combination_store = publish_combinations(
+                settings["combinations_file"], settings["combination_store"]
+            )
+
+        # Batch combinations that share assets, unless workers generate the combinations
+        job_order = None
+        if job_config["combinations"]:
+            start_index = job_config["start_index"]
+            job_combinations = job_config["combinations"][start_index:job_config["end_index"]]
+            job_order = [start_index + i for i in order_by_assets(job_combinations)]
+
+        def get_task_combinations(start: int, end: int) -> Dict[str, Any]:
+            """Get the run_job arguments selecting positions start to end of the job."""
+            if job_order is not None:
+                indices = job_order[start - job_config["start_index"]:end - job_config["start_index"]]
+                return {
+                    "combination_indeces": indices,
+                    "combinations": (
+                        [] if combination_store is not None
+                        else [job_config["combinations"][i] for i in indices]
+                    ),
+                    "combination_store": combination_store,
+                }
+            if combination_store is not None:
+                return {
+                    "combination_indeces": [],
+                    "combinations": [],
+                    "combination_store": combination_store,
+                    "index_range": [start, end],
+                }
+            return {
+                "combination_indeces": list(range(start, end)),
+                "combinations": job_config["combinations"][start:end],
+            }
+
+        render_args = {
+            "width": job_config["width"],
+            "height": job_config["height"],
+            "output_dir": job_config["output_dir"],
+            "hdri_path": job_config["hdri_path"],
+            "upload_dest": job_config["upload_destination"],
+            "start_frame": job_config["start_frame"],
+            "end_frame": job_config["end_frame"],
+            "job_id": job_id,
+        }
+
+        def iter_task_args() -> Iterator[Dict[str, Any]]:
+            """Yield the run_job arguments of every task of the job."""
+            if job_config["chunks"] > 1:
+                # Split every video into frame chunks rendered by separate tasks
+                frame_ranges = split_frame_range(
+                    job_config["start_frame"], job_config["end_frame"], job_config["chunks"]
+                )
+                for combination_index in range(job_config["start_index"], job_config["end_index"]):
+                    for frame_range in frame_ranges:
+                        task_key = get_task_key(combination_index, combination_index + 1)
+                        yield {
+                            **get_task_combinations(combination_index, combination_index + 1),
+                            **render_args,
+                            "frame_range": list(frame_range),
+                            "task_key": f"{task_key}:{frame_range[0]}-{frame_range[1]}",
+                        }
+                return
+
+            # Submit tasks to queue in batches
+            batch_size = job_config["render_batch_size"]
+            for combination_index in range(
+                job_config["start_index"],
+                job_config["end_index"],
+                batch_size,
+            ):
+                end_index = min(combination_index + batch_size, job_config["end_index"])
+                yield {
+                    **get_task_combinations(combination_index, end_index),
+                    **render_args,
+                    # a redelivered task is skipped once it was finished
+                    "task_key": get_task_key(combination_index, end_index),
+                }
+
+        def get_scheduled_args(scheduled: List[Tuple[str, int, int]]) -> List[Dict[str, Any]]:
+            """Get the run_job arguments of tasks handed out by the scheduler."""
+            return [
+                {**get_task_combinations(start, end), **render_args, "task_key": task_key}
+                for task_key, start, end in scheduled
+            ]
+
+        def submit_scheduled(scheduled: List[Tuple[str, int, int]]) -> None:
+            """Submit scheduled tasks, routed to the nodes caching their assets."""
+            routes: Dict[Optional[str], List[Tuple[str, int, int]]] = {}
+            for task_key, start, end in scheduled:
+                hostname = None
+                if job_order is not None:
+                    task_indices = job_order[
+                        start - job_config["start_index"]:end - job_config["start_index"]
+                    ]
+                    assets = set().union(
+                        *(get_combination_assets(job_config["combinations"][i]) for i in task_indices)
+                    )
+                    hostname = router.route(task_key, assets)
+                routes.setdefault(hostname, []).append((task_key, start, end))
+            for hostname, routed in routes.items():
+                submit_tasks(
+                    distributask,
+                    "run_job",
+                    get_scheduled_args(routed),
+                    results=tasks,
+                    queue=worker_direct(hostname) if hostname else None,
+                )
+
+        def submit_stranded(task_keys: List[str]) -> None:
+            """Send routed tasks that did not start on their node to the shared queue."""
+            stranded = [
+                (key, scheduler.tasks[key]["start_index"], scheduler.tasks[key]["end_index"])
+                for key in task_keys
+                if scheduler.tasks[key]["status"] == "pending"
+            ]
+            if stranded:
+                print(f"Sending {len(stranded)} stranded tasks to the shared queue")
+                submit_tasks(distributask, "run_job", get_scheduled_args(stranded), results=tasks)
+
+        # Size batches from measured render times instead of a fixed batch size
+        scheduler = None
+        router = LocalityRouter(distributask.get_redis_connection())
+        if job_config["adaptive"] and job_config["chunks"] <= 1:
+            scheduler = AdaptiveScheduler(
+                job_config["start_index"],
+                job_config["end_index"],
+                max_nodes,
+                initial_batch_size=job_config["render_batch_size"],
+            )
+            task_args = get_scheduled_args(scheduler.next_tasks())
+        else:
+            task_args = iter_task_args()
+
+        # Queue the tasks while the nodes start, workers take them as soon as they connect
+        submission, tasks = start_submission(distributask, "run_job", task_args)
+
         # Rent and set up vastai nodes with docker image
         print("Searching for nodes...")
         num_nodes_avail = len(distributask.search_offers(max_price))
         print("Total nodes available: ", num_nodes_avail)
 
-        rented_nodes = distributask.rent_nodes(
-            max_price, max_nodes, docker_image, module_name, env_settings=instance_env
+        # Rent the offer types that rendered the most per dollar in earlier jobs
+        selector = OfferSelector()
+        provider = VastProvider(
+            distributask,
+            max_price,
+            docker_image,
+            module_name,
+            env_settings=instance_env,
+            selector=selector,
         )
+        rented_nodes = provider.rent(max_nodes)
 
         print("Total nodes rented: ", len(rented_nodes))
+        for offer_type, count in sorted(
+            collections.Counter(get_offer_type(node["offer"]) for node in rented_nodes).items()
+        ):
+            print(f"  {offer_type}: {count}")
 
-        distributask.register_function(run_job)
+        # Scale the nodes with the work left, from worker heartbeats and the queue depth
+        autoscaler = Autoscaler(
+            provider,
+            distributask.get_redis_connection(),
+            max_nodes,
+            target_seconds=job_config["target_minutes"] * 60 if job_config["target_minutes"] else None,
+        )
+        autoscaler.add_nodes(rented_nodes)
+        if scheduler is not None:
+            scheduler.num_nodes = max(1, len(rented_nodes))
 
         while True:
             user_input = input("press r when workers are ready: ")
             if user_input == "r":
                 break
 
-        tasks = []
-
-        batch_size = job_config["render_batch_size"]
-        # Submit tasks to queue in batches
-        for combination_index in range(
-            job_config["start_index"],
-            job_config["end_index"],
-            batch_size,
-        ):
-            task = distributask.execute_function(
-                "run_job",
-                {
-                    "combination_indeces": [
-                        index
-                        for index in range(
-                            combination_index,
-                            min(combination_index + batch_size, settings["end_index"]),
-                        )
-                    ],
-                    "combinations": [
-                        job_config["combinations"][index]
-                        for index in range(
-                            combination_index,
-                            min(combination_index + batch_size, settings["end_index"]),
-                        )
-                    ],
-                    "width": job_config["width"],
-                    "height": job_config["height"],
-                    "output_dir": job_config["output_dir"],
-                    "hdri_path": job_config["hdri_path"],
-                    "upload_dest": job_config["upload_destination"],
-                    "start_frame": job_config["start_frame"],
-                    "end_frame": job_config["end_frame"]
-                },
-            )
-            tasks.append(task)
+        try:
+            # a failed submission raises here instead of monitoring a partial job
+            submission.result()
+        except Exception:
+            autoscaler.shutdown()
+            raise
 
         # distributask.monitor_tasks(tasks, show_time_left=False)
 
-        print("Tasks sent. Starting monitoring")
-        inactivity_log = {node["instance_id"]: 0 for node in rented_nodes}
+        print(f"{len(tasks)} tasks sent for job {job_id}. Starting monitoring")
 
+        tracker = ProgressTracker(distributask.get_redis_connection(), job_id, len(tasks))
+        if scheduler is not None:
+            # the number of tasks depends on the render times, so count combinations
+            total, unit, is_finished = scheduler.total, "combination", scheduler.is_finished
+        else:
+            total, unit, is_finished = len(tasks), "task", tracker.is_finished
         start_time = time.time()
-        with tqdm(total=len(tasks), unit="task") as pbar:
-            while not all(task.ready() for task in tasks):
+        # nodes the autoscaler found dead since the last check of routed tasks
+        dead_nodes = []
+        with tqdm(total=total, unit=unit) as pbar:
+            while not is_finished():
 
-                current_tasks = sum([task.ready() for task in tasks])
-                pbar.update(current_tasks - pbar.n)
+                # waits up to a second for completions, cost does not grow with the job
+                events = tracker.update(block=1.0)
+                if scheduler is not None:
+                    for event in events:
+                        scheduler.handle_event(event)
+                        router.handle_event(event)
+                    scheduled = scheduler.next_tasks()
+                    if scheduled:
+                        submit_scheduled(scheduled)
+                    # routed tasks stuck in the queue of a dead or busy node
+                    stranded = router.get_stranded(dead_nodes)
+                    dead_nodes = []
+                    if stranded:
+                        submit_stranded(stranded)
+                    pbar.update(scheduler.completed - pbar.n)
+                    pbar.set_postfix_str(
+                        tracker.summary(scheduler.total - scheduler.completed)
+                    )
+                else:
+                    pbar.update(tracker.completed - pbar.n)
+                    pbar.set_postfix_str(tracker.summary())
 
-                time.sleep(1)
                 current_time = time.time()
-                # check if node is inactive at set interval
+                # rent or terminate nodes at set interval
                 if current_time - start_time > settings["inactivity_check_interval"]:
-                    start_time = time.time()
-                    for node in rented_nodes:
-                        # get log with api call
-                        log_response = distributask.get_node_log(node)
-                        if log_response:
-                            # if "Task completed" in two consecutive logs, terminate node
-                            try:
-                                last_msg = log_response.text.splitlines()[-3:]
-                                if (
-                                    any("Task completed" in msg for msg in last_msg)
-                                    and inactivity_log[node["instance_id"]] == 0
-                                ):
-                                    inactivity_log[node["instance_id"]] = 1
-                                elif (
-                                    any("Task completed" in msg for msg in last_msg)
-                                    and inactivity_log[node["instance_id"]] == 1
-                                ):
-                                    distributask.terminate_nodes([node])
-                                    print("node terminated")
-                                else:
-                                    inactivity_log[node["instance_id"]] == 0
-                            except:
-                                pass
+                    start_time = current_time
+                    if scheduler is not None:
+                        remaining = scheduler.total - scheduler.completed
+                        scheduler.num_nodes = max(1, len(autoscaler.nodes))
+                    else:
+                        batch_size = job_config["render_batch_size"] if job_config["chunks"] <= 1 else 1
+                        remaining = (tracker.total - tracker.completed) * batch_size
+                    throughput = tracker.get_node_throughput()
+                    node_rate = sum(throughput.values()) / len(throughput) / 60 if throughput else None
+                    try:
+                        changes = autoscaler.step(remaining, node_rate)
+                        if scheduler is not None:
+                            # tasks running on dead nodes are lost, submit them again
+                            dead_nodes = [str(node["instance_id"]) for node in changes["dead"]]
+                            scheduler.handle_dead_nodes(dead_nodes)
+                        if changes["rented"] or changes["terminated"]:
+                            print(
+                                f"{len(changes['rented'])} nodes rented, "
+                                f"{len(changes['terminated'])} terminated, {len(autoscaler.nodes)} running"
+                            )
+                    except Exception:
+                        logger.exception("Autoscaling failed")
 
         print("All tasks have been completed!")
+        if scheduler is not None:
+            print(
+                f"{len(scheduler.tasks)} tasks, {scheduler.speculated} re-executed stragglers, "
+                f"{scheduler.recovered} re-executed from dead nodes, "
+                f"{router.routed} routed to warm nodes, {scheduler.failed} combinations failed"
+            )
+        elif tracker.failed:
+            print(f"{tracker.failed} tasks failed")
+        for node, count in sorted(tracker.node_tasks.items()):
+            print(f"{node}: {count} tasks")
+
+        # Combinations that kept failing were skipped, list them by error class
+        ledger = get_failure_ledger(distributask.get_redis_connection(), job_id)
+        quarantined = {key: entry for key, entry in ledger.items() if entry["quarantined"]}
+        if quarantined:
+            print(f"{len(quarantined)} combinations quarantined:")
+            for error, count in collections.Counter(
+                entry.get("error", "unknown") for entry in quarantined.values()
+            ).most_common():
+                print(f"  {error}: {count}")
+            ledger_path = f"failures_{job_id}.json"
+            with open(ledger_path, "w") as f:
+                json.dump(ledger, f, indent=2)
+            print(f"Failure ledger written to {ledger_path}")
+
+        if job_config["chunks"] > 1:
+            # Workers upload every chunk on its own, the videos are joined after download
+            rendered_outputs = get_rendered_outputs(distributask.get_redis_connection(), job_id)
+            frame_ranges = split_frame_range(
+                job_config["start_frame"], job_config["end_frame"], job_config["chunks"]
+            )
+            join_commands = [
+                get_join_command(combination_index, frame_ranges, job_config["upload_destination"])
+                for combination_index in range(job_config["start_index"], job_config["end_index"])
+                if all(
+                    get_output_key(combination_index, frame_range) in rendered_outputs
+                    for frame_range in frame_ranges
+                )
+            ]
+            join_path = f"join_chunks_{job_id}.sh"
+            with open(join_path, "w") as f:
+                f.write("".join(f"{command}\n" for command in join_commands))
+            print(
+                f"{len(join_commands)} of {job_config['end_index'] - job_config['start_index']} "
+                f"videos have all chunks uploaded, join them after downloading with {join_path}"
+            )
+        autoscaler.shutdown()
+        for offer_type, stats in sorted(selector.stats.items()):
+            if "renders_per_dollar" in stats:
+                print(f"{offer_type}: {stats['renders_per_dollar']:.1f} renders per dollar")
 
     parser = argparse.ArgumentParser(description="Simian CLI")
     parser.add_argument("--start_index", type=int, help="Starting index for rendering")
@@ -275,6 +607,17 @@ if __name__ == "__main__":
     )
     parser.add_argument("--upload_dest", type=int, help="The desired destination of uploads at task completion"
     )
+    parser.add_argument("--chunks", type=int, help="Split every video into this many frame chunks rendered by separate tasks"
+    )
+    parser.add_argument("--combination_store", help="Publish the combinations to this s3:// url, http(s) url or shared path, so tasks only carry index ranges"
+    )
+    parser.add_argument("--generator_config", help="JSON file with combiner settings, workers generate the combinations from it and --seed instead of reading a combinations file"
+    )
+    parser.add_argument("--seed", type=int, help="Seed of the generated combinations (with --generator_config)")
+    parser.add_argument("--target_minutes", type=float, help="Rent nodes, up to --max_nodes, so the rest of the job takes about this long"
+    )
+    parser.add_argument("--adaptive", action="store_true", help="Size batches from measured render times and re-execute stragglers, --render_batch_size sets the first batches"
+    )
     args = parser.parse_args()
 
     start_new_job(args)
@@ -0,0 +1,288 @@
+import json
+import logging
+import os
+import signal
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from redis import Redis
+
+from .progress import PROGRESS_TTL, get_node_name
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Seconds a render of one combination may take before it is killed
+RENDER_TIMEOUT = float(os.environ.get("SIMIAN_RENDER_TIMEOUT", 1800))
+# Attempts at a combination within one task when its error may be transient
+MAX_ATTEMPTS = 2
+# Seconds to wait before the next attempt, doubled after every attempt
+RETRY_DELAY = 10.0
+# Failed tasks after which a combination with transient errors is quarantined
+QUARANTINE_AFTER = 2
+# Characters of render output kept with a failure
+ERROR_TAIL = 2000
+# Output fragments identifying each class of error of a render that exited, checked in order
+ERROR_PATTERNS = [
+    ("memory", ("MemoryError", "out of memory", "Out of memory", "std::bad_alloc")),
+    (
+        "download",
+        (
+            "ConnectionError",
+            "ReadTimeout",
+            "ConnectTimeout",
+            "HTTPError",
+            "Max retries exceeded",
+            "Temporary failure in name resolution",
+        ),
+    ),
+    # raised by `simian.object.load_object`
+    ("asset", ("Failed to import",)),
+]
+# Errors worth another attempt, the others are a property of the combination itself
+RETRYABLE_ERRORS = {"timeout", "memory", "download", "crash"}
+
+
+def _decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def get_ledger_keys(job_id: str) -> Tuple[str, str, str, str]:
+    """
+    Get the Redis keys of the failure ledger and rendered outputs of a job.
+
+    Args:
+        job_id (str): The job id.
+
+    Returns:
+        Tuple[str, str, str, str]: The keys of the failure counter hash, the last error
+        hash, the quarantined set and the rendered set, all keyed by output key.
+    """
+    prefix = f"simian:ledger:{job_id}"
+    return f"{prefix}:failures", f"{prefix}:errors", f"{prefix}:quarantine", f"{prefix}:rendered"
+
+
+def get_output_key(combination_index: int, frame_range: Optional[List[int]] = None) -> str:
+    """
+    Get the key of one rendered output, the same for every task and copy that renders it.
+
+    Args:
+        combination_index (int): The combination index.
+        frame_range (Optional[List[int]], optional): The frame chunk. Defaults to None, the whole video.
+
+    Returns:
+        str: The output key.
+    """
+    if frame_range:
+        return f"{combination_index}:{frame_range[0]}-{frame_range[1]}"
+    return str(combination_index)
+
+
+def classify_error(returncode: Optional[int], output: str) -> str:
+    """
+    Classify why a render failed.
+
+    Args:
+        returncode (Optional[int]): The exit code of the render process, None if it timed out.
+        output (str): The end of its output.
+
+    Returns:
+        str: "timeout", "memory", "download", "asset", "crash" for processes killed by a
+        signal, or "render" for any other error.
+    """
+    if returncode is None:
+        return "timeout"
+    # the kernel kills processes that run out of memory
+    if returncode in (-signal.SIGKILL, 128 + signal.SIGKILL):
+        return "memory"
+    # the output of a crashed process says nothing about why it crashed
+    if returncode < 0:
+        return "crash"
+    for error, patterns in ERROR_PATTERNS:
+        if any(pattern in output for pattern in patterns):
+            return error
+    return "render"
+
+
+def run_render(
+    command: List[str],
+    timeout: float = RENDER_TIMEOUT,
+    max_attempts: int = MAX_ATTEMPTS,
+    retry_delay: float = RETRY_DELAY,
+) -> Optional[Dict[str, Any]]:
+    """
+    Run the render of one combination, with a timeout and retries of transient errors.
+
+    Args:
+        command (List[str]): The render command.
+        timeout (float, optional): Seconds before an attempt is killed. Defaults to RENDER_TIMEOUT.
+        max_attempts (int, optional): Attempts when the error may be transient. Defaults to MAX_ATTEMPTS.
+        retry_delay (float, optional): Seconds before the second attempt, doubled after each. Defaults to RETRY_DELAY.
+
+    Returns:
+        Optional[Dict[str, Any]]: None once the render succeeded, else the "error" class of
+        `classify_error`, the end of the output as "message" and the "attempts" made.
+    """
+    for attempt in range(1, max_attempts + 1):
+        with tempfile.TemporaryFile() as log:
+            try:
+                returncode = subprocess.run(
+                    command, stdout=log, stderr=subprocess.STDOUT, timeout=timeout
+                ).returncode
+            except subprocess.TimeoutExpired:
+                returncode = None
+            if returncode == 0:
+                return None
+            size = log.seek(0, os.SEEK_END)
+            log.seek(max(0, size - ERROR_TAIL))
+            output = log.read().decode(errors="replace")
+
+        error = classify_error(returncode, output)
+        logger.warning(
+            f"Render failed with a {error} error, attempt {attempt} of {max_attempts}:\n{output}"
+        )
+        if error not in RETRYABLE_ERRORS or attempt == max_attempts:
+            return {"error": error, "message": output, "attempts": attempt}
+        time.sleep(retry_delay * 2 ** (attempt - 1))
+
+
+def get_output_status(redis_client: Redis, job_id: str, output_key: str) -> Optional[str]:
+    """
+    Check whether an output was rendered or quarantined by an earlier task.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        job_id (str): The job id.
+        output_key (str): The output key of `get_output_key`.
+
+    Returns:
+        Optional[str]: "rendered", "quarantined", or None if it still needs rendering.
+    """
+    _, _, quarantine_key, rendered_key = get_ledger_keys(job_id)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.sismember(rendered_key, output_key)
+    pipe.sismember(quarantine_key, output_key)
+    rendered, quarantined = pipe.execute()
+    if rendered:
+        return "rendered"
+    if quarantined:
+        return "quarantined"
+    return None
+
+
+def mark_rendered(redis_client: Redis, job_id: str, output_key: str) -> None:
+    """
+    Record that an output was rendered and uploaded, so retried and re-executed tasks
+    skip it instead of rendering it again.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        job_id (str): The job id.
+        output_key (str): The output key of `get_output_key`.
+
+    Returns:
+        None
+    """
+    rendered_key = get_ledger_keys(job_id)[3]
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.sadd(rendered_key, output_key)
+    pipe.expire(rendered_key, PROGRESS_TTL)
+    pipe.execute()
+
+
+def get_rendered_outputs(redis_client: Redis, job_id: str) -> Set[str]:
+    """
+    Get the outputs of a job that were rendered and uploaded.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        job_id (str): The job id.
+
+    Returns:
+        Set[str]: The output keys of `get_output_key`.
+    """
+    rendered_key = get_ledger_keys(job_id)[3]
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.smembers(rendered_key)
+    (rendered,) = pipe.execute()
+    return {_decode(key) for key in rendered}
+
+
+def record_failure(
+    redis_client: Redis,
+    job_id: str,
+    output_key: str,
+    failure: Dict[str, Any],
+    node: Optional[str] = None,
+    quarantine_after: int = QUARANTINE_AFTER,
+) -> bool:
+    """
+    Add a failed combination to the job's failure ledger, and quarantine it if it keeps failing.
+
+    Errors that are not transient quarantine the combination at once, transient ones
+    after failing `quarantine_after` tasks.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        job_id (str): The job id.
+        output_key (str): The output key of `get_output_key`.
+        failure (Dict[str, Any]): The failure returned by `run_render`.
+        node (Optional[str], optional): The node name. Defaults to `get_node_name()`.
+        quarantine_after (int, optional): Failed tasks before transient errors quarantine. Defaults to QUARANTINE_AFTER.
+
+    Returns:
+        bool: True if the combination is now quarantined.
+    """
+    failures_key, errors_key, quarantine_key, _ = get_ledger_keys(job_id)
+    error = {
+        "error": failure["error"],
+        "message": failure["message"][-ERROR_TAIL:],
+        "node": node or get_node_name(),
+        "timestamp": time.time(),
+    }
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hincrby(failures_key, output_key, 1)
+    pipe.hset(errors_key, output_key, json.dumps(error))
+    failures = pipe.execute()[0]
+
+    quarantined = failure["error"] not in RETRYABLE_ERRORS or failures >= quarantine_after
+    pipe = redis_client.pipeline(transaction=False)
+    if quarantined:
+        pipe.sadd(quarantine_key, output_key)
+    for key in (failures_key, errors_key, quarantine_key):
+        pipe.expire(key, PROGRESS_TTL)
+    pipe.execute()
+    return quarantined
+
+
+def get_failure_ledger(redis_client: Redis, job_id: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Get every failed combination of a job.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        job_id (str): The job id.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: By output key, the number of "failures", whether it is
+        "quarantined", and the "error" class, "message" and "node" of the last failure.
+    """
+    failures_key, errors_key, quarantine_key, _ = get_ledger_keys(job_id)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hgetall(failures_key)
+    pipe.hgetall(errors_key)
+    pipe.smembers(quarantine_key)
+    failures, errors, quarantined = pipe.execute()
+    quarantined = {_decode(key) for key in quarantined}
+
+    ledger = {}
+    for key, count in failures.items():
+        key = _decode(key)
+        ledger[key] = {"failures": int(count), "quarantined": key in quarantined}
+    for key, error in errors.items():
+        ledger.setdefault(_decode(key), {"failures": 0, "quarantined": False}).update(
+            json.loads(error)
+        )
+    return ledger
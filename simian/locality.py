@@ -0,0 +1,314 @@
+import json
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from redis import Redis
+
+from .progress import get_node_name
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Hash of node name to its celery hostname and when it last finished a task
+NODES_KEY = "simian:nodes"
+# Nodes that did not finish a task for this many seconds get no routed tasks
+NODE_TIMEOUT = 900.0
+# Routed tasks that did not start within this many seconds go to the shared queue
+ROUTED_START_TIMEOUT = 900.0
+# Seconds the cached asset set of a node is kept after its last update
+NODE_ASSETS_TTL = 24 * 3600
+# How much a cached asset of each kind saves, roughly by download size
+ASSET_WEIGHTS = {"hdri": 4.0, "material": 2.0, "object": 1.0}
+
+
+def get_node_assets_key(node: str) -> str:
+    """
+    Get the Redis key of the set of assets a node has cached.
+
+    Args:
+        node (str): The node name.
+
+    Returns:
+        str: The key.
+    """
+    return f"simian:assets:{node}"
+
+
+def get_combination_assets(combination: Dict[str, Any]) -> Set[str]:
+    """
+    Get host-independent keys of the assets a combination downloads.
+
+    Args:
+        combination (Dict[str, Any]): The combination dictionary.
+
+    Returns:
+        Set[str]: Keys like "hdri:<background id>", "material:<stage material name>"
+        and "object:<uid>".
+    """
+    assets = {f"object:{obj['uid']}" for obj in combination.get("objects", [])}
+    if "background" in combination:
+        assets.add(f"hdri:{combination['background']['id']}")
+    material_name = combination.get("stage", {}).get("material", {}).get("name")
+    if material_name:
+        assets.add(f"material:{material_name}")
+    return assets
+
+
+def get_asset_signature(combination: Dict[str, Any]) -> Tuple[str, str, Tuple[str, ...]]:
+    """
+    Get a sort key that puts combinations sharing their largest assets next to each other.
+
+    Args:
+        combination (Dict[str, Any]): The combination dictionary.
+
+    Returns:
+        Tuple[str, str, Tuple[str, ...]]: The background id, stage material and object uids.
+    """
+    return (
+        str(combination.get("background", {}).get("id", "")),
+        combination.get("stage", {}).get("material", {}).get("name", ""),
+        tuple(sorted(obj["uid"] for obj in combination.get("objects", []))),
+    )
+
+
+def order_by_assets(combinations: List[Dict[str, Any]]) -> List[int]:
+    """
+    Order combinations so that consecutive ones share backgrounds, stage materials and objects.
+
+    Args:
+        combinations (List[Dict[str, Any]]): The combinations.
+
+    Returns:
+        List[int]: Positions into `combinations` in the new order.
+    """
+    return sorted(
+        range(len(combinations)), key=lambda i: get_asset_signature(combinations[i])
+    )
+
+
+def publish_node_assets(
+    redis_client: Redis,
+    assets: Iterable[str],
+    hostname: Optional[str],
+    node: Optional[str] = None,
+) -> None:
+    """
+    Publish which assets this node has cached and how to send tasks to it.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        assets (Iterable[str]): Keys from `get_combination_assets` of assets now cached.
+        hostname (Optional[str]): The celery hostname of the worker, for its direct queue.
+            Without it the node's assets are published but tasks cannot be routed to it.
+        node (Optional[str], optional): The node name. Defaults to `get_node_name()`.
+
+    Returns:
+        None
+    """
+    node = node or get_node_name()
+    assets_key = get_node_assets_key(node)
+    assets = list(assets)
+    pipe = redis_client.pipeline(transaction=False)
+    if assets:
+        pipe.sadd(assets_key, *assets)
+        pipe.expire(assets_key, NODE_ASSETS_TTL)
+    if hostname:
+        pipe.hset(NODES_KEY, node, json.dumps({"hostname": hostname, "last_seen": time.time()}))
+    pipe.execute()
+
+
+def get_node_assets(redis_client: Redis) -> Dict[str, Dict[str, Any]]:
+    """
+    Get the routable nodes and the assets they have cached.
+
+    Args:
+        redis_client (Redis): The Redis client.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The celery hostname, last seen time and asset keys by node name.
+    """
+    nodes = {}
+    for node, info in redis_client.hgetall(NODES_KEY).items():
+        node = node.decode() if isinstance(node, bytes) else node
+        nodes[node] = json.loads(info)
+
+    pipe = redis_client.pipeline(transaction=False)
+    for node in nodes:
+        pipe.smembers(get_node_assets_key(node))
+    for node, assets in zip(nodes, pipe.execute()):
+        nodes[node]["assets"] = {
+            asset.decode() if isinstance(asset, bytes) else asset for asset in assets
+        }
+    return nodes
+
+
+def score_assets(assets: Set[str], cached: Set[str]) -> float:
+    """
+    Score how much of a task's downloads a node has cached.
+
+    Args:
+        assets (Set[str]): Asset keys the task needs.
+        cached (Set[str]): Asset keys the node has cached.
+
+    Returns:
+        float: The weighted number of cached assets.
+    """
+    return sum(ASSET_WEIGHTS.get(asset.split(":", 1)[0], 1.0) for asset in assets & cached)
+
+
+class LocalityRouter:
+    """
+    Routes tasks to the worker node that already caches most of their assets.
+
+    Nodes publish their cached assets after every task with `publish_node_assets`. Each
+    node gets at most `max_routed` routed tasks that have not finished yet, so a warm
+    node cannot collect the whole job. Tasks without a good node go to the shared queue.
+    Routed tasks that do not start, because their node died or is stuck, are handed back
+    by `get_stranded` for the shared queue.
+    """
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        max_routed: int = 2,
+        refresh_interval: float = 30.0,
+        node_timeout: float = NODE_TIMEOUT,
+        start_timeout: float = ROUTED_START_TIMEOUT,
+    ):
+        """
+        Args:
+            redis_client (Redis): The Redis client.
+            max_routed (int, optional): Unfinished routed tasks per node. Defaults to 2.
+            refresh_interval (float, optional): Seconds between reads of the published node assets. Defaults to 30.
+            node_timeout (float, optional): Seconds after which a silent node gets no routed tasks. Defaults to NODE_TIMEOUT.
+            start_timeout (float, optional): Seconds a routed task may wait for its node before it is stranded. Defaults to ROUTED_START_TIMEOUT.
+        """
+        self.redis_client = redis_client
+        self.max_routed = max_routed
+        self.refresh_interval = refresh_interval
+        self.node_timeout = node_timeout
+        self.start_timeout = start_timeout
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.routed = 0
+        # task key to the node it was routed to, when and whether it started, until it finishes
+        self._routes: Dict[str, Dict[str, Any]] = {}
+        self._load: Dict[str, int] = {}
+        # nodes that stopped sending heartbeats, their published assets may not have expired
+        self._dead: Set[str] = set()
+        self._refreshed_at = 0.0
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Read the published node assets if the last read is older than the refresh interval.
+
+        Args:
+            force (bool, optional): Read them regardless of the interval. Defaults to False.
+
+        Returns:
+            None
+        """
+        if not force and time.time() - self._refreshed_at < self.refresh_interval:
+            return
+        try:
+            self.nodes = get_node_assets(self.redis_client)
+        except Exception:
+            logger.exception("Failed to read node assets")
+        self._refreshed_at = time.time()
+
+    def route(self, task_key: str, assets: Set[str]) -> Optional[str]:
+        """
+        Pick the node for a task.
+
+        Args:
+            task_key (str): The task key.
+            assets (Set[str]): Asset keys the task needs.
+
+        Returns:
+            Optional[str]: The celery hostname of the node, or None for the shared queue.
+        """
+        self.refresh()
+        now = time.time()
+        best_node, best_score = None, 0.0
+        for node, info in self.nodes.items():
+            if now - info["last_seen"] > self.node_timeout or node in self._dead:
+                continue
+            if self._load.get(node, 0) >= self.max_routed:
+                continue
+            score = score_assets(assets, info["assets"])
+            if score > best_score or (
+                score == best_score
+                and best_node is not None
+                and self._load.get(node, 0) < self._load.get(best_node, 0)
+            ):
+                best_node, best_score = node, score
+        if best_node is None or best_score <= 0:
+            return None
+
+        self._routes[task_key] = {"node": best_node, "submitted_at": now, "started": False}
+        self._load[best_node] = self._load.get(best_node, 0) + 1
+        self.routed += 1
+        return self.nodes[best_node]["hostname"]
+
+    def handle_event(self, event: Dict[str, Any]) -> None:
+        """
+        Free a routed slot when a task finishes, see `ProgressTracker.update`.
+
+        Args:
+            event (Dict[str, Any]): A completion event.
+
+        Returns:
+            None
+        """
+        route = self._routes.get(event.get("task"))
+        if route is None:
+            return
+        if event["status"] == "started":
+            route["started"] = True
+        elif event["status"] in ("done", "failed"):
+            self._release(event["task"])
+
+    def _release(self, task_key: str) -> None:
+        """
+        Forget the route of a task and free its node's slot.
+
+        Args:
+            task_key (str): The task key.
+
+        Returns:
+            None
+        """
+        route = self._routes.pop(task_key)
+        self._load[route["node"]] -= 1
+
+    def get_stranded(self, dead_nodes: Iterable[str] = (), now: Optional[float] = None) -> List[str]:
+        """
+        Take back the routed tasks that did not start, because their node is dead or
+        `start_timeout` has passed.
+
+        The caller sends them to the shared queue. A copy still waiting in the node's queue
+        is skipped by the worker once the task is done, see `is_task_claimed`.
+
+        Args:
+            dead_nodes (Iterable[str], optional): Names of nodes that stopped sending heartbeats. Defaults to none.
+            now (Optional[float], optional): The current time. Defaults to time.time().
+
+        Returns:
+            List[str]: The task keys.
+        """
+        now = time.time() if now is None else now
+        dead = set(dead_nodes)
+        self._dead |= dead
+
+        stranded = []
+        for task_key, route in list(self._routes.items()):
+            if route["node"] in dead:
+                self._release(task_key)
+                # started tasks are lost with the node, the scheduler submits them again
+                if not route["started"]:
+                    stranded.append(task_key)
+            elif not route["started"] and now - route["submitted_at"] > self.start_timeout:
+                logger.info(f"Task {task_key} did not start on {route['node']}, unrouting it")
+                self._release(task_key)
+                stranded.append(task_key)
+        return stranded
@@ -0,0 +1,502 @@
+import logging
+import os
+import re
+from typing import Dict, List, Optional
+
+import bpy
+import numpy as np
+from bpy_extras.object_utils import world_to_camera_view
+from mathutils import Vector
+
+from .vendor import objaverse
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+PREPROCESSED_PATH = os.path.join(objaverse.BASE_PATH, "preprocessed")
+
+
+def get_preprocessed_dir(uid: str) -> str:
+    """
+    Get the directory where preprocessed variants of an object are cached.
+
+    Args:
+        uid (str): The uid of the object.
+
+    Returns:
+        str: The cache directory of the object.
+    """
+    return os.path.join(PREPROCESSED_PATH, uid)
+
+
+def get_sample_frames(scene: bpy.types.Scene, samples: int = 5) -> List[int]:
+    """
+    Get evenly spaced frames of the scene's frame range to sample the animation at.
+
+    Args:
+        scene (bpy.types.Scene): The scene.
+        samples (int, optional): Maximum number of frames. Defaults to 5.
+
+    Returns:
+        List[int]: The frames, including the first and last frame.
+    """
+    start, end = scene.frame_start, scene.frame_end
+    if end <= start or samples < 2:
+        return [start]
+    step = (end - start) / (samples - 1)
+    return sorted({int(round(start + i * step)) for i in range(samples)})
+
+
+def estimate_screen_coverage(
+    objects: List[bpy.types.Object], frames: List[int]
+) -> Dict[str, float]:
+    """
+    Estimate the largest size in pixels each object reaches on screen over the given frames.
+
+    The size is the larger side of the object's projected bounding box. Objects that reach
+    behind the camera are treated as covering the whole frame.
+
+    Args:
+        objects (List[bpy.types.Object]): The objects to measure.
+        frames (List[int]): The frames to sample.
+
+    Returns:
+        Dict[str, float]: A dictionary mapping the object name to its maximum coverage in pixels.
+    """
+    scene = bpy.context.scene
+    camera = scene.camera
+    resolution_x = scene.render.resolution_x * scene.render.resolution_percentage / 100
+    resolution_y = scene.render.resolution_y * scene.render.resolution_percentage / 100
+    full_frame = max(resolution_x, resolution_y)
+
+    coverage = {obj.name: 0.0 for obj in objects}
+    current_frame = scene.frame_current
+    for frame in frames:
+        scene.frame_set(frame)
+        for obj in objects:
+            corners = [
+                world_to_camera_view(scene, camera, obj.matrix_world @ Vector(corner))
+                for corner in obj.bound_box
+            ]
+            if any(corner.z <= 0 for corner in corners):
+                coverage[obj.name] = full_frame
+                continue
+            width = (max(c.x for c in corners) - min(c.x for c in corners)) * resolution_x
+            height = (max(c.y for c in corners) - min(c.y for c in corners)) * resolution_y
+            size = min(max(width, height), full_frame)
+            coverage[obj.name] = max(coverage[obj.name], size)
+    scene.frame_set(current_frame)
+
+    return coverage
+
+
+def get_triangle_budget(
+    coverage: float, faces_per_pixel: float = 0.5, min_faces: int = 512
+) -> int:
+    """
+    Get the triangle budget for an object from its screen coverage.
+
+    The budget is rounded down to a power of two so that decimated variants can be
+    reused across scenes with similar framing.
+
+    Args:
+        coverage (float): Maximum size of the object on screen in pixels.
+        faces_per_pixel (float, optional): Faces allowed per covered pixel. Defaults to 0.5.
+        min_faces (int, optional): Lower bound of the budget. Defaults to 512.
+
+    Returns:
+        int: The maximum number of faces.
+    """
+    budget = max(min_faces, int(faces_per_pixel * coverage * coverage))
+    return 1 << (budget.bit_length() - 1)
+
+
+def get_lod_path(uid: str, budget: int, scale_factor: float) -> str:
+    """
+    Get the cache path of a decimated variant of an object.
+
+    Args:
+        uid (str): The uid of the object.
+        budget (int): The triangle budget of the variant.
+        scale_factor (float): The scale factor the object was normalized with.
+
+    Returns:
+        str: Path to the .blend file holding the decimated mesh.
+    """
+    return os.path.join(get_preprocessed_dir(uid), f"lod_{budget}_{scale_factor}.blend")
+
+
+def load_cached_lod(obj: bpy.types.Object, lod_path: str) -> bool:
+    """
+    Replace the mesh of an object with a cached decimated variant.
+
+    The cached mesh is stored without materials, the materials of the current mesh are kept.
+
+    Args:
+        obj (bpy.types.Object): The object to update.
+        lod_path (str): Path to the cached variant.
+
+    Returns:
+        bool: True if the variant was loaded, False if there is no cached variant.
+    """
+    if not os.path.exists(lod_path):
+        return False
+
+    with bpy.data.libraries.load(lod_path, link=False) as (data_from, data_to):
+        data_to.meshes = data_from.meshes[:1]
+    if not data_to.meshes:
+        return False
+
+    mesh = data_to.meshes[0]
+    for material in obj.data.materials:
+        mesh.materials.append(material)
+    replace_mesh(obj, mesh)
+    return True
+
+
+def replace_mesh(obj: bpy.types.Object, mesh: bpy.types.Mesh) -> None:
+    """
+    Give an object another mesh and remove its previous mesh once nothing uses it.
+
+    Args:
+        obj (bpy.types.Object): The object to update.
+        mesh (bpy.types.Mesh): The new mesh.
+
+    Returns:
+        None
+    """
+    original_mesh = obj.data
+    obj.data = mesh
+    if original_mesh.users == 0:
+        bpy.data.meshes.remove(original_mesh)
+
+
+def decimate_object(obj: bpy.types.Object, budget: int) -> None:
+    """
+    Decimate the mesh of an object to fit a triangle budget.
+
+    The Decimate modifier is evaluated through the depsgraph and the result replaces the
+    object's mesh, so no operator or mode switch is needed.
+
+    Args:
+        obj (bpy.types.Object): The mesh object to decimate.
+        budget (int): The maximum number of faces.
+
+    Returns:
+        None
+    """
+    face_count = len(obj.data.polygons)
+    if face_count <= budget:
+        return
+
+    modifier = obj.modifiers.new(name="LOD", type="DECIMATE")
+    modifier.decimate_type = "COLLAPSE"
+    modifier.ratio = budget / face_count
+    modifier.use_collapse_triangulate = True
+
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    evaluated = obj.evaluated_get(depsgraph)
+    mesh = bpy.data.meshes.new_from_object(evaluated)
+
+    obj.modifiers.remove(modifier)
+    replace_mesh(obj, mesh)
+
+
+def save_lod(obj: bpy.types.Object, lod_path: str) -> None:
+    """
+    Save the mesh of an object as a cached decimated variant, without its materials.
+
+    Args:
+        obj (bpy.types.Object): The decimated object.
+        lod_path (str): Path to write the variant to.
+
+    Returns:
+        None
+    """
+    os.makedirs(os.path.dirname(lod_path), exist_ok=True)
+    mesh = obj.data.copy()
+    mesh.materials.clear()
+    tmp_path = f"{lod_path}.{os.getpid()}.tmp"
+    bpy.data.libraries.write(tmp_path, {mesh}, fake_user=True)
+    os.replace(tmp_path, lod_path)
+    bpy.data.meshes.remove(mesh)
+
+
+def get_scene_coverage(
+    all_objects: List[Dict[bpy.types.Object, Dict]]
+) -> Dict[str, float]:
+    """
+    Estimate the maximum screen coverage of the scene objects over the animation.
+
+    Must be called after the camera, the animation and the render resolution are set up.
+
+    Args:
+        all_objects (List[Dict[bpy.types.Object, Dict]]): The objects and their combination data.
+
+    Returns:
+        Dict[str, float]: A dictionary mapping the object name to its maximum coverage in pixels.
+    """
+    objects = [list(obj_dict.keys())[0] for obj_dict in all_objects]
+    return estimate_screen_coverage(objects, get_sample_frames(bpy.context.scene))
+
+
+def apply_lod(
+    all_objects: List[Dict[bpy.types.Object, Dict]],
+    coverage: Optional[Dict[str, float]] = None,
+    faces_per_pixel: float = 0.5,
+    min_faces: int = 512,
+) -> None:
+    """
+    Decimate every object in the scene to a triangle budget derived from its screen coverage.
+
+    Must be called after the camera, the animation and the render resolution are set up.
+    Decimated variants are cached per uid, budget and scale factor. Instances of a uid with
+    the same budget share one decimated mesh, like the linked duplicates they were.
+
+    Args:
+        all_objects (List[Dict[bpy.types.Object, Dict]]): The objects and their combination data.
+        coverage (Optional[Dict[str, float]], optional): Coverage from `get_scene_coverage`. Computed if not given.
+        faces_per_pixel (float, optional): Faces allowed per covered pixel. Defaults to 0.5.
+        min_faces (int, optional): Lower bound of the budget. Defaults to 512.
+
+    Returns:
+        None
+    """
+    if coverage is None:
+        coverage = get_scene_coverage(all_objects)
+
+    # decimated mesh of every uid, budget and scale factor in this scene
+    lod_meshes = {}
+    for obj_dict in all_objects:
+        obj = list(obj_dict.keys())[0]
+        object_data = obj_dict[obj]
+        if obj.type != "MESH":
+            continue
+
+        budget = get_triangle_budget(coverage[obj.name], faces_per_pixel, min_faces)
+        face_count = len(obj.data.polygons)
+        if face_count <= budget:
+            continue
+
+        # Linked duplicates share a mesh normalized for another factor
+        scale_factor = obj.data.get(
+            "simian_scale_factor", object_data["scale"]["factor"]
+        )
+        lod_key = (object_data["uid"], budget, scale_factor)
+        if lod_key in lod_meshes:
+            replace_mesh(obj, lod_meshes[lod_key])
+            continue
+
+        lod_path = get_lod_path(object_data["uid"], budget, scale_factor)
+        if load_cached_lod(obj, lod_path):
+            logger.info(f"Loaded cached LOD of {obj.name} with budget {budget}")
+        else:
+            decimate_object(obj, budget)
+            save_lod(obj, lod_path)
+            logger.info(
+                f"Decimated {obj.name} from {face_count} to {len(obj.data.polygons)} faces"
+            )
+        lod_meshes[lod_key] = obj.data
+
+
+def get_texture_budget(
+    coverage: float,
+    max_size: int,
+    texels_per_pixel: float = 2.0,
+    min_size: int = 128,
+) -> int:
+    """
+    Get the maximum texture size for an object from its screen coverage.
+
+    Args:
+        coverage (float): Maximum size of the object on screen in pixels.
+        max_size (int): Upper bound of the texture size, usually the render resolution.
+        texels_per_pixel (float, optional): Texels allowed per covered pixel. Defaults to 2.0.
+        min_size (int, optional): Lower bound of the texture size. Defaults to 128.
+
+    Returns:
+        int: The texture size, a power of two.
+    """
+    size = max(min_size, int(coverage * texels_per_pixel))
+    size = min(size, max_size)
+    # round up to the next power of two
+    return 1 << (max(size, 1) - 1).bit_length()
+
+
+def get_object_images(obj: bpy.types.Object) -> List[bpy.types.ShaderNodeTexImage]:
+    """
+    Get the image texture nodes of all materials of an object.
+
+    Args:
+        obj (bpy.types.Object): The object.
+
+    Returns:
+        List[bpy.types.ShaderNodeTexImage]: The image texture nodes that have an image.
+    """
+    nodes = []
+    for slot in obj.material_slots:
+        material = slot.material
+        if material is None or not material.use_nodes:
+            continue
+        for node in material.node_tree.nodes:
+            if node.type == "TEX_IMAGE" and node.image is not None:
+                nodes.append(node)
+    return nodes
+
+
+def get_texture_cache_path(uid: str, image: bpy.types.Image, size: int) -> str:
+    """
+    Get the cache path of a downscaled texture of an object.
+
+    Args:
+        uid (str): The uid of the object.
+        image (bpy.types.Image): The original image.
+        size (int): The maximum side length of the downscaled image.
+
+    Returns:
+        str: Path to the downscaled image.
+    """
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", image.name)
+    extension = "exr" if image.is_float else "png"
+    return os.path.join(
+        get_preprocessed_dir(uid), "textures", f"{name}_{size}.{extension}"
+    )
+
+
+def downscale_image(
+    image: bpy.types.Image, size: int, cache_path: str
+) -> bpy.types.Image:
+    """
+    Downscale an image so its longer side is at most `size` and cache it on disk.
+
+    If the downscaled image is already cached it is loaded instead.
+
+    Args:
+        image (bpy.types.Image): The original image.
+        size (int): The maximum side length.
+        cache_path (str): Path of the cached downscaled image.
+
+    Returns:
+        bpy.types.Image: The downscaled image.
+    """
+    if os.path.exists(cache_path):
+        scaled = bpy.data.images.load(cache_path, check_existing=True)
+        scaled.colorspace_settings.name = image.colorspace_settings.name
+        return scaled
+
+    width, height = image.size
+    factor = size / max(width, height)
+    new_width = max(1, int(width * factor))
+    new_height = max(1, int(height * factor))
+
+    resized = image.copy()
+    resized.scale(new_width, new_height)
+    pixels = np.empty(new_width * new_height * 4, dtype=np.float32)
+    resized.pixels.foreach_get(pixels)
+    bpy.data.images.remove(resized)
+
+    scaled = bpy.data.images.new(
+        f"{image.name}_{size}",
+        new_width,
+        new_height,
+        alpha=True,
+        float_buffer=image.is_float,
+    )
+    scaled.colorspace_settings.name = image.colorspace_settings.name
+    scaled.alpha_mode = image.alpha_mode
+    scaled.pixels.foreach_set(pixels)
+
+    # write to a temporary file first so other processes never read a partial image
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    scaled.filepath_raw = tmp_path
+    scaled.file_format = "OPEN_EXR" if image.is_float else "PNG"
+    scaled.save()
+    os.replace(tmp_path, cache_path)
+    scaled.filepath_raw = cache_path
+
+    return scaled
+
+
+def apply_texture_budget(
+    all_objects: List[Dict[bpy.types.Object, Dict]],
+    coverage: Optional[Dict[str, float]] = None,
+    texels_per_pixel: float = 2.0,
+    min_size: int = 128,
+) -> None:
+    """
+    Downscale the textures of every object to a size derived from its screen coverage.
+
+    The upper bound is the larger side of the render resolution. Downscaled images are
+    cached per uid next to the other preprocessed variants. When objects share an image,
+    the largest budget among them is used.
+
+    The downscaled images go into copies of the materials, assigned to the objects'
+    material slots. The original materials, which the datablock cache may keep for later
+    scenes with other framing, keep their full resolution images.
+
+    Args:
+        all_objects (List[Dict[bpy.types.Object, Dict]]): The objects and their combination data.
+        coverage (Optional[Dict[str, float]], optional): Coverage from `get_scene_coverage`. Computed if not given.
+        texels_per_pixel (float, optional): Texels allowed per covered pixel. Defaults to 2.0.
+        min_size (int, optional): Lower bound of the texture size. Defaults to 128.
+
+    Returns:
+        None
+    """
+    if coverage is None:
+        coverage = get_scene_coverage(all_objects)
+
+    render = bpy.context.scene.render
+    max_size = max(render.resolution_x, render.resolution_y)
+
+    # collect the largest budget and the owner uid of every image
+    budgets = {}
+    for obj_dict in all_objects:
+        obj = list(obj_dict.keys())[0]
+        uid = obj_dict[obj]["uid"]
+        budget = get_texture_budget(
+            coverage.get(obj.name, max_size), max_size, texels_per_pixel, min_size
+        )
+        for node in get_object_images(obj):
+            image = node.image
+            if image.name not in budgets or budgets[image.name][0] < budget:
+                budgets[image.name] = (budget, uid)
+
+    scaled_images = {}
+    for image_name, (budget, uid) in budgets.items():
+        image = bpy.data.images[image_name]
+        if max(image.size) <= budget:
+            continue
+
+        cache_path = get_texture_cache_path(uid, image, budget)
+        scaled_images[image_name] = downscale_image(image, budget, cache_path)
+        logger.info(
+            f"Downscaled {image_name} from {tuple(image.size)} to {tuple(scaled_images[image_name].size)}"
+        )
+
+    # one copy per material in this scene, purged with the scene
+    material_copies = {}
+    for obj_dict in all_objects:
+        obj = list(obj_dict.keys())[0]
+        for slot in obj.material_slots:
+            material = slot.material
+            if material is None or not material.use_nodes:
+                continue
+            if material.name not in material_copies:
+                if not any(
+                    node.type == "TEX_IMAGE"
+                    and node.image is not None
+                    and node.image.name in scaled_images
+                    for node in material.node_tree.nodes
+                ):
+                    continue
+                material_copy = material.copy()
+                for node in material_copy.node_tree.nodes:
+                    if node.type == "TEX_IMAGE" and node.image is not None:
+                        node.image = scaled_images.get(node.image.name, node.image)
+                material_copies[material.name] = material_copy
+
+            # an object slot leaves the material of the shared, possibly cached, mesh alone
+            slot.link = "OBJECT"
+            slot.material = material_copies[material.name]
@@ -1,7 +1,11 @@
 import logging
 from typing import List, Optional, Callable, Dict
+import bmesh
 import bpy
-from mathutils import Vector
+import numpy as np
+from mathutils import Matrix, Vector
+
+from .bounds import get_object_bounds, get_hierarchy_bounds, invalidate_bounds
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
@@ -48,23 +52,43 @@ def load_object(object_path: str) -> None:
 
     Raises:
         ValueError: If the file extension is not supported.
+        RuntimeError: If the importer fails.
 
     Returns:
         None
     """
+    # the render worker classifies errors starting with "Failed to import" as bad assets
     file_extension = object_path.split(".")[-1].lower()
-    if file_extension is None:
-        raise ValueError(f"Unsupported file type: {object_path}")
+    if file_extension not in IMPORT_FUNCTIONS:
+        raise ValueError(f"Failed to import {object_path}: unsupported file type")
 
     # load from existing import functions
     import_function = IMPORT_FUNCTIONS[file_extension]
 
-    if file_extension == "blend":
-        import_function(directory=object_path, link=False)
-    elif file_extension in {"glb", "gltf"}:
-        import_function(filepath=object_path, merge_vertices=True)
-    else:
-        import_function(filepath=object_path)
+    try:
+        if file_extension == "blend":
+            import_function(directory=object_path, link=False)
+        elif file_extension in {"glb", "gltf"}:
+            import_function(filepath=object_path, merge_vertices=True)
+        else:
+            import_function(filepath=object_path)
+    except RuntimeError as e:
+        raise RuntimeError(f"Failed to import {object_path}: {e}") from e
+
+
+def import_object(object_path: str) -> List[bpy.types.Object]:
+    """
+    Loads a model into the scene and returns only the objects it created.
+
+    Args:
+        object_path (str): Path to the model file.
+
+    Returns:
+        List[bpy.types.Object]: The newly imported objects.
+    """
+    existing = set(bpy.data.objects)
+    load_object(object_path)
+    return [obj for obj in bpy.data.objects if obj not in existing]
 
 
 def delete_invisible_objects() -> None:
@@ -94,60 +118,19 @@ def delete_invisible_objects() -> None:
         bpy.data.collections.remove(col)
 
 
-def get_hierarchy_bbox(obj) -> tuple[float, float]:
+def get_hierarchy_bbox(obj, tight: bool = True) -> tuple[float, float]:
     """
     Calculate the bounding box of an object and its children.
 
     Args:
         obj (bpy.types.Object): The root object.
+        tight (bool, optional): Use exact vertex bounds instead of the 8 corner boxes. Defaults to True.
 
     Returns:
         tuple: A tuple containing the minimum and maximum coordinates of the bounding box.
     """
-    # Ensure the object's matrix_world is updated
-    bpy.context.view_layer.update()
-
-    # Initialize min and max coordinates with extremely large and small values
-    min_coord = [float("inf"), float("inf"), float("inf")]
-    max_coord = [-float("inf"), -float("inf"), -float("inf")]
-
-    # Function to update min and max coordinates
-    def update_bounds(obj: bpy.types.Object) -> None:
-        """
-        Update the minimum and maximum coordinates based on the object's bounding box.
-
-        Args:
-            obj (bpy.types.Object): The object whose bounding box is to be updated.
-
-        Returns:
-            None
-        """
-        # Update the object's bounding box based on its world matrix
-        bbox_corners = [obj.matrix_world @ Vector(corner) for corner in obj.bound_box]
-        for corner in bbox_corners:
-            for i in range(3):
-                min_coord[i] = min(min_coord[i], corner[i])
-                max_coord[i] = max(max_coord[i], corner[i])
-
-    # Recursive function to process each object
-    def process_object(obj: bpy.types.Object) -> None:
-        """
-        Recursively process each object and update bounding box coordinates.
-
-        Args:
-            obj (bpy.types.Object): The object to be processed.
-
-        Returns:
-            None
-        """
-        update_bounds(obj)
-        for child in obj.children:
-            process_object(child)
-
-    # Start processing from the root object
-    process_object(obj)
-
-    return min_coord, max_coord
+    min_coord, max_coord = get_hierarchy_bounds(obj, tight)
+    return min_coord.tolist(), max_coord.tolist()
 
 
 def remove_small_geometry(
@@ -227,6 +210,7 @@ def normalize_object_scale(
     # make sure object is active and apply the scale
     bpy.context.view_layer.objects.active = obj
     bpy.ops.object.transform_apply(location=False, rotation=False, scale=True)
+    invalidate_bounds(obj)
     return obj
 
 
@@ -296,12 +280,12 @@ def remove_blendshapes_from_hierarchy(obj: bpy.types.Object) -> None:
     bpy.ops.object.select_all(action="DESELECT")
 
 
-def apply_and_remove_armatures():
+def apply_and_remove_armatures(objects: Optional[List[bpy.types.Object]] = None):
     """
     Apply armature modifiers to meshes and remove armature objects.
 
     Args:
-        None
+        objects (Optional[List[bpy.types.Object]]): The objects to process. Defaults to all objects.
 
     Returns:
         None
@@ -311,8 +295,11 @@ def apply_and_remove_armatures():
     bpy.ops.object.mode_set(mode="OBJECT")
     bpy.ops.object.select_all(action="DESELECT")
 
+    if objects is None:
+        objects = bpy.data.objects
+
     # Iterate over all objects in the scene
-    for obj in bpy.data.objects:
+    for obj in objects:
         # Check if the object is a mesh with an armature modifier
         if obj.type == "MESH":
             for modifier in obj.modifiers:
@@ -456,6 +443,121 @@ def join_objects_in_hierarchy(obj: bpy.types.Object) -> None:
         logger.info("No meshes found to set as active.")
 
 
+def normalize_object_data_api(
+    objects: List[bpy.types.Object], scale_factor: float = 1.0
+) -> bpy.types.Object:
+    """
+    Normalize a newly imported hierarchy into a single mesh object using only the data API.
+
+    This is an alternative to the operator based pipeline (`apply_and_remove_armatures`,
+    `apply_all_modifiers`, `join_objects_in_hierarchy`, `optimize_meshes_in_hierarchy`,
+    `unparent_keep_transform`, `set_pivot_to_bottom` and `normalize_object_scale`). It only
+    touches the given objects and does not depend on the selection, the active object or
+    the object mode.
+
+    Modifiers, including armatures, are applied by copying the depsgraph-evaluated mesh of
+    every object with shape keys reset to their basis. The meshes are baked into world space,
+    joined and welded with bmesh, moved so the origin sits at the bottom center and scaled
+    to the same size `normalize_object_scale` produces for `scale_factor`. The imported
+    objects are removed afterwards.
+
+    Args:
+        objects (List[bpy.types.Object]): The objects returned by `import_object`.
+        scale_factor (float, optional): The scale factor of the object. Defaults to 1.0.
+
+    Returns:
+        bpy.types.Object: The new mesh object, or None if the hierarchy has no meshes.
+    """
+    mesh_objects = [obj for obj in objects if obj.type == "MESH"]
+    if not mesh_objects:
+        logger.info("No meshes found to normalize.")
+        return None
+
+    # Evaluate shape keys at their basis, like removing them would
+    for obj in mesh_objects:
+        if obj.data.shape_keys:
+            for key_block in obj.data.shape_keys.key_blocks:
+                key_block.value = 0.0
+
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+
+    bm = bmesh.new()
+    materials = []
+    for obj in mesh_objects:
+        evaluated = obj.evaluated_get(depsgraph)
+        mesh = bpy.data.meshes.new_from_object(
+            evaluated, preserve_all_data_layers=True, depsgraph=depsgraph
+        )
+        mesh.transform(evaluated.matrix_world)
+
+        # Remap the material indices into the joined material list
+        material_lookup = []
+        for material in mesh.materials:
+            if material not in materials:
+                materials.append(material)
+            material_lookup.append(materials.index(material))
+        if material_lookup and len(mesh.polygons) > 0:
+            material_indices = np.empty(len(mesh.polygons), dtype=np.int32)
+            mesh.polygons.foreach_get("material_index", material_indices)
+            material_indices = np.array(material_lookup, dtype=np.int32)[
+                np.clip(material_indices, 0, len(material_lookup) - 1)
+            ]
+            mesh.polygons.foreach_set("material_index", material_indices)
+
+        face_count = len(bm.faces)
+        bm.from_mesh(mesh)
+        # Negative scales mirror the geometry, flip the faces back
+        if evaluated.matrix_world.determinant() < 0:
+            bm.faces.ensure_lookup_table()
+            new_faces = [bm.faces[i] for i in range(face_count, len(bm.faces))]
+            bmesh.ops.reverse_faces(bm, faces=new_faces)
+        bpy.data.meshes.remove(mesh)
+
+    bmesh.ops.remove_doubles(bm, verts=bm.verts, dist=0.0001)
+
+    joined_mesh = bpy.data.meshes.new(mesh_objects[0].data.name)
+    bm.to_mesh(joined_mesh)
+    bm.free()
+    for material in materials:
+        joined_mesh.materials.append(material)
+        if material is not None and material.blend_method == "BLEND":
+            material.blend_method = "HASHED"
+
+    # Move the origin to the bottom center of the mesh
+    coords = np.empty(len(joined_mesh.vertices) * 3, dtype=np.float64)
+    joined_mesh.vertices.foreach_get("co", coords)
+    coords = coords.reshape(-1, 3)
+    bbox_min = coords.min(axis=0)
+    bbox_max = coords.max(axis=0)
+    bottom_center = Vector(
+        ((bbox_min[0] + bbox_max[0]) / 2, (bbox_min[1] + bbox_max[1]) / 2, bbox_min[2])
+    )
+    terrain_height = get_terrain_height(Vector(bbox_min))
+
+    # Same size as setting obj.scale to scale_factor and calling normalize_object_scale
+    max_dimension = max(bbox_max - bbox_min) * scale_factor
+    scale = 1.0 / max_dimension if max_dimension > 0 else 1.0
+    joined_mesh.transform(Matrix.Scale(scale, 4) @ Matrix.Translation(-bottom_center))
+    joined_mesh.update()
+
+    collection = (
+        mesh_objects[0].users_collection[0]
+        if mesh_objects[0].users_collection
+        else bpy.context.scene.collection
+    )
+    normalized = bpy.data.objects.new(mesh_objects[0].name, joined_mesh)
+    collection.objects.link(normalized)
+    normalized.location = (bottom_center.x, bottom_center.y, terrain_height)
+
+    # Remove the imported objects and the data only they used
+    old_data = [obj.data for obj in objects if obj.data is not None]
+    for obj in objects:
+        bpy.data.objects.remove(obj, do_unlink=True)
+    bpy.data.batch_remove([data for data in old_data if data.users == 0])
+
+    return normalized
+
+
 def get_terrain_height(location: Vector) -> float:
     """
     Get the height of the terrain at a specific location.
@@ -506,18 +608,11 @@ def set_pivot_to_bottom(obj: bpy.types.Object) -> None:
     Returns:
         None
     """
-    # Update the view layer to ensure the latest changes are considered
-    bpy.context.view_layer.update()
-
     # Calculate the center of mass
     center_of_mass = obj.location
 
     # Calculate the bounding box bottom
-    bbox_min = [obj.matrix_world @ Vector(corner) for corner in obj.bound_box][0]
-    for corner in obj.bound_box:
-        world_corner = obj.matrix_world @ Vector(corner)
-        if world_corner.z < bbox_min.z:
-            bbox_min = world_corner
+    bbox_min = Vector(get_object_bounds(obj)[0])
 
     # Set origin to the center of mass
     bpy.ops.object.origin_set(type="ORIGIN_CENTER_OF_MASS", center="BOUNDS")
@@ -534,6 +629,7 @@ def set_pivot_to_bottom(obj: bpy.types.Object) -> None:
 
     # Apply transformations
     bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+    invalidate_bounds(obj)
     # logger.info(f"Applied transformation to the object: {obj.location}")
  
 
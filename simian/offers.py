@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Set SIMIAN_BENCHMARK=0 to start workers without running the benchmark scene
+BENCHMARK_ON_STARTUP = os.environ.get("SIMIAN_BENCHMARK", "1") == "1"
+# Seconds the benchmark may take before the worker starts without it
+BENCHMARK_TIMEOUT = 600
+# File the coordinator keeps the measured value of every offer type in, across jobs
+OFFER_STATS_PATH = os.environ.get(
+    "SIMIAN_OFFER_STATS", os.path.join(os.path.expanduser("~"), ".simian", "offer_stats.json")
+)
+# Weight of a new measurement in the running average of an offer type
+STATS_WEIGHT = 0.3
+# A node benchmarking below this fraction of its offer type's average is dropped
+UNDERPERFORM_FRACTION = 0.5
+# Benchmarks of an offer type needed before its nodes can be dropped
+MIN_BENCHMARKS = 2
+
+
+def get_offer_type(offer: Dict[str, Any]) -> str:
+    """
+    Get the type of a Vast.ai offer, machines of one type are expected to render alike.
+
+    Args:
+        offer (Dict[str, Any]): The offer, as returned by `search_offers`.
+
+    Returns:
+        str: The number of GPUs and GPU model, e.g. "1x RTX 4090".
+    """
+    return f"{offer.get('num_gpus', 1)}x {offer.get('gpu_name', 'unknown')}"
+
+
+def run_benchmark_process(timeout: float = BENCHMARK_TIMEOUT) -> Optional[Dict[str, Any]]:
+    """
+    Run the benchmark scene of `simian.benchmark` in a separate Blender process.
+
+    Args:
+        timeout (float, optional): Seconds before the benchmark is abandoned. Defaults to BENCHMARK_TIMEOUT.
+
+    Returns:
+        Optional[Dict[str, Any]]: The frames per second and asset prep timings, None if the benchmark failed.
+    """
+    with tempfile.TemporaryDirectory(prefix="simian-benchmark-") as tmp_dir:
+        output = os.path.join(tmp_dir, "benchmark.json")
+        try:
+            subprocess.run(
+                [sys.executable, "-m", "simian.benchmark", "--", "--output", output],
+                check=True,
+                timeout=timeout,
+            )
+            with open(output, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Benchmark failed: {e}")
+            return None
+
+
+class OfferSelector:
+    """
+    Learns which Vast.ai offer types render the most per dollar and ranks offers by it.
+
+    Two measurements are kept per offer type, as running averages saved across jobs:
+
+    - "renders_per_dollar", the combinations a node rendered divided by what it cost
+      from rental to termination, recorded by the autoscaler when it terminates a node.
+    - "fps", the frames per second of the benchmark scene every worker renders on startup.
+
+    Offers are ranked by renders per dollar, or by benchmark frames per second per dollar
+    before any type has renders, and by price without either. Unmeasured types rank with
+    the median offer, so they are still tried and measured.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = OFFER_STATS_PATH,
+        weight: float = STATS_WEIGHT,
+        underperform_fraction: float = UNDERPERFORM_FRACTION,
+        min_benchmarks: int = MIN_BENCHMARKS,
+    ):
+        """
+        Args:
+            path (Optional[str], optional): JSON file the measurements are loaded from and saved to. Defaults to OFFER_STATS_PATH, None keeps them in memory.
+            weight (float, optional): Weight of a new measurement in the running averages. Defaults to STATS_WEIGHT.
+            underperform_fraction (float, optional): Fraction of the expected benchmark below which a node is dropped. Defaults to UNDERPERFORM_FRACTION.
+            min_benchmarks (int, optional): Benchmarks of a type needed before its nodes can be dropped. Defaults to MIN_BENCHMARKS.
+        """
+        self.path = path
+        self.weight = weight
+        self.underperform_fraction = underperform_fraction
+        self.min_benchmarks = min_benchmarks
+        self.stats: Dict[str, Dict[str, float]] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.stats = json.load(f)
+            except Exception:
+                logger.exception(f"Failed to read offer stats from {path}")
+
+    def save(self) -> None:
+        """
+        Write the measurements to the stats file.
+
+        Returns:
+            None
+        """
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.stats, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _update(self, offer: Dict[str, Any], field: str, value: float) -> None:
+        """
+        Add a measurement to the running average of an offer type.
+
+        Args:
+            offer (Dict[str, Any]): The offer the node was rented from.
+            field (str): "renders_per_dollar" or "fps".
+            value (float): The measurement.
+
+        Returns:
+            None
+        """
+        stats = self.stats.setdefault(get_offer_type(offer), {})
+        samples = stats.get(f"{field}_samples", 0)
+        if samples == 0:
+            stats[field] = value
+        else:
+            stats[field] += self.weight * (value - stats[field])
+        stats[f"{field}_samples"] = samples + 1
+
+    def record_renders(self, offer: Dict[str, Any], combinations: int, dollars: float) -> None:
+        """
+        Record what a node rendered over its rental.
+
+        Args:
+            offer (Dict[str, Any]): The offer the node was rented from.
+            combinations (int): The combinations it rendered.
+            dollars (float): What it cost from rental to termination.
+
+        Returns:
+            None
+        """
+        if dollars > 0:
+            self._update(offer, "renders_per_dollar", combinations / dollars)
+
+    def get_expected_fps(self, offer: Dict[str, Any]) -> Optional[float]:
+        """
+        Get the benchmark frames per second a node of an offer type usually reaches.
+
+        Args:
+            offer (Dict[str, Any]): The offer.
+
+        Returns:
+            Optional[float]: The average, None with fewer than `min_benchmarks` benchmarks.
+        """
+        stats = self.stats.get(get_offer_type(offer), {})
+        if stats.get("fps_samples", 0) < self.min_benchmarks:
+            return None
+        return stats["fps"]
+
+    def record_benchmark(self, offer: Dict[str, Any], fps: float) -> bool:
+        """
+        Record the benchmark of a new node and check it against its offer type.
+
+        Args:
+            offer (Dict[str, Any]): The offer the node was rented from.
+            fps (float): The benchmark frames per second of the node.
+
+        Returns:
+            bool: True if the node performs far below the nodes of its type and should be dropped.
+        """
+        expected = self.get_expected_fps(offer)
+        if expected is not None and fps < self.underperform_fraction * expected:
+            # a faulty machine says little about its type, its cost counts in renders per dollar
+            return True
+        self._update(offer, "fps", fps)
+        return False
+
+    def get_score(self, offer: Dict[str, Any], use_renders: bool) -> Optional[float]:
+        """
+        Get the measured value of an offer's type.
+
+        Args:
+            offer (Dict[str, Any]): The offer.
+            use_renders (bool): Score by renders per dollar, else by benchmark frames per
+                second per dollar of the offer's price.
+
+        Returns:
+            Optional[float]: The score, None if the type was never measured.
+        """
+        stats = self.stats.get(get_offer_type(offer), {})
+        if use_renders:
+            return stats.get("renders_per_dollar")
+        if "fps" not in stats:
+            return None
+        return stats["fps"] / max(offer["dph_total"], 1e-6)
+
+    def rank_offers(self, offers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Order offers from the best expected value to the worst.
+
+        Args:
+            offers (List[Dict[str, Any]]): Offers with "dph_total", the price per hour.
+
+        Returns:
+            List[Dict[str, Any]]: The offers, best first. Ties go to the cheaper offer.
+        """
+        use_renders = any("renders_per_dollar" in stats for stats in self.stats.values())
+        scores = [self.get_score(offer, use_renders) for offer in offers]
+        known = [score for score in scores if score is not None]
+        # unmeasured types rank with the typical offer, so they get tried and measured
+        prior = statistics.median(known) if known else 0.0
+        ranked = sorted(
+            zip(scores, offers),
+            key=lambda item: (-(prior if item[0] is None else item[0]), item[1]["dph_total"]),
+        )
+        return [offer for _, offer in ranked]
@@ -0,0 +1,217 @@
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+import bpy
+
+from .datablock_cache import enable_datablock_cache
+from .render import build_scene, render_built_scene
+from .scene import initialize_scene
+from .vendor import objaverse
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Built scenes waiting for the renderer, beyond the one it is rendering
+PIPELINE_QUEUE_SIZE = 1
+# Seconds between checks that both stages are still alive
+POLL_INTERVAL = 1.0
+
+
+def save_built_scene(filepath: str) -> None:
+    """
+    Save the current scene to a file that loads quickly in another process.
+
+    The file is written uncompressed and only contains datablocks the scene uses.
+    Datablocks that are only kept alive by a fake user, such as unused entries of the
+    datablock cache, are left out and keep their fake user afterwards.
+
+    Args:
+        filepath (str): Path of the .blend file to write.
+
+    Returns:
+        None
+    """
+    unused = [
+        datablock
+        for collection in (bpy.data.images, bpy.data.materials, bpy.data.meshes)
+        for datablock in collection
+        if datablock.use_fake_user and datablock.users == 1
+    ]
+    for datablock in unused:
+        datablock.use_fake_user = False
+    try:
+        bpy.ops.wm.save_as_mainfile(
+            filepath=filepath, compress=False, copy=True, relative_remap=False
+        )
+    finally:
+        for datablock in unused:
+            datablock.use_fake_user = True
+
+
+def _build_stage(
+    combinations: List[Tuple[int, Dict[str, Any]]],
+    build_dir: str,
+    build_queue: multiprocessing.Queue,
+    build_options: Dict[str, Any],
+    datablock_budget: int,
+) -> None:
+    """
+    Build every combination and hand the saved scene files to the render stage.
+
+    Runs in its own Blender process. Blocks when the queue is full, so at most
+    PIPELINE_QUEUE_SIZE scenes are built ahead of the renderer.
+
+    Args:
+        combinations (List[Tuple[int, Dict[str, Any]]]): Combination indices and combinations.
+        build_dir (str): Directory for the built scene files.
+        build_queue (multiprocessing.Queue): Queue of (combination index, scene file) pairs.
+        build_options (Dict[str, Any]): Keyword arguments passed to `build_scene`.
+        datablock_budget (int): Memory budget in bytes of the datablock cache.
+
+    Returns:
+        None
+    """
+    enable_datablock_cache(datablock_budget)
+    initialize_scene()
+    try:
+        for combination_index, combination in combinations:
+            try:
+                objaverse.load_objects([obj["uid"] for obj in combination["objects"]])
+                built = build_scene(
+                    context=bpy.context,
+                    combination_file=None,
+                    combination_index=combination_index,
+                    combination=json.dumps(combination),
+                    persistent=True,
+                    **build_options,
+                )
+                if not built:
+                    continue
+                scene_path = os.path.join(build_dir, f"{combination_index}.blend")
+                save_built_scene(scene_path)
+            except Exception:
+                logger.exception(f"Failed to build combination {combination_index}")
+                continue
+            build_queue.put((combination_index, scene_path))
+    finally:
+        build_queue.put(None)
+
+
+def _render_stage(
+    build_queue: multiprocessing.Queue, result_queue: multiprocessing.Queue
+) -> None:
+    """
+    Render built scene files until the build stage is done.
+
+    Runs in its own Blender process. Each scene file is deleted once it is rendered.
+
+    Args:
+        build_queue (multiprocessing.Queue): Queue of (combination index, scene file) pairs.
+        result_queue (multiprocessing.Queue): Receives the index of every rendered combination.
+
+    Returns:
+        None
+    """
+    while True:
+        item = build_queue.get()
+        if item is None:
+            break
+        combination_index, scene_path = item
+        try:
+            bpy.ops.wm.open_mainfile(filepath=scene_path)
+            render_built_scene(bpy.context)
+            result_queue.put(combination_index)
+        except Exception:
+            logger.exception(f"Failed to render combination {combination_index}")
+        finally:
+            if os.path.exists(scene_path):
+                os.remove(scene_path)
+
+
+def run_pipeline(
+    combinations: List[Tuple[int, Dict[str, Any]]],
+    output_dir: str,
+    build_dir: Optional[str] = None,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    datablock_budget: int = 4096 * 1024 * 1024,
+    **build_options: Any,
+) -> List[int]:
+    """
+    Render combinations with scene building and rendering overlapped in two Blender processes.
+
+    One process builds the scene of the next combination and saves it to a file while
+    the other renders the previous one, so the CPU-bound build and the GPU-bound render
+    run at the same time. The stages are connected by a bounded queue.
+
+    Args:
+        combinations (List[Tuple[int, Dict[str, Any]]]): Combination indices and combinations.
+        output_dir (str): Path to the directory where the renders will be saved.
+        build_dir (Optional[str]): Directory for the built scene files. Defaults to a temporary directory.
+        queue_size (int): Number of scenes built ahead of the renderer. Defaults to PIPELINE_QUEUE_SIZE.
+        datablock_budget (int): Memory budget in bytes of the builder's datablock cache. Defaults to 4 GB.
+        **build_options (Any): Further keyword arguments passed to `build_scene`, e.g. start_frame or hdri_path.
+
+    Returns:
+        List[int]: The indices of the rendered combinations.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    owns_build_dir = build_dir is None
+    if owns_build_dir:
+        build_dir = tempfile.mkdtemp(prefix="simian_build_")
+    else:
+        os.makedirs(build_dir, exist_ok=True)
+
+    # Blender cannot be forked safely, so each stage starts a fresh interpreter
+    context = multiprocessing.get_context("spawn")
+    build_queue = context.Queue(maxsize=queue_size)
+    result_queue = context.Queue()
+    build_options["output_dir"] = output_dir
+
+    builder = context.Process(
+        target=_build_stage,
+        args=(combinations, build_dir, build_queue, build_options, datablock_budget),
+        name="simian-builder",
+    )
+    renderer = context.Process(
+        target=_render_stage, args=(build_queue, result_queue), name="simian-renderer"
+    )
+    builder.start()
+    renderer.start()
+
+    rendered = []
+    builder_failed = False
+    try:
+        while renderer.is_alive():
+            if not builder_failed and builder.exitcode not in (None, 0):
+                # The builder died without telling the renderer it is done
+                logger.error(f"Build stage exited with code {builder.exitcode}")
+                builder_failed = True
+                build_queue.put(None)
+            try:
+                rendered.append(result_queue.get(timeout=POLL_INTERVAL))
+            except queue.Empty:
+                continue
+        if renderer.exitcode != 0:
+            logger.error(f"Render stage exited with code {renderer.exitcode}")
+            builder.terminate()
+        builder.join()
+        while True:
+            try:
+                rendered.append(result_queue.get_nowait())
+            except queue.Empty:
+                break
+    finally:
+        for process in (builder, renderer):
+            if process.is_alive():
+                process.terminate()
+        if owns_build_dir:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    logger.info(f"Pipeline rendered {len(rendered)} of {len(combinations)} combinations")
+    return sorted(rendered)
@@ -0,0 +1,438 @@
+import collections
+import functools
+import logging
+import os
+import socket
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from redis import Redis
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Events kept in a job's completion stream, older ones are trimmed
+PROGRESS_STREAM_MAXLEN = 100000
+# Events read from the stream per call
+PROGRESS_READ_COUNT = 1000
+# Seconds of recent completions used for throughput and ETA
+THROUGHPUT_WINDOW = 300.0
+# Seconds the progress keys of a job are kept after its last completion
+PROGRESS_TTL = 7 * 24 * 3600
+
+
+def get_progress_keys(job_id: str) -> Tuple[str, str]:
+    """
+    Get the Redis keys holding the progress of a job.
+
+    Args:
+        job_id (str): The job id.
+
+    Returns:
+        Tuple[str, str]: The key of the counter hash and the key of the completion stream.
+    """
+    return f"simian:progress:{job_id}:counts", f"simian:progress:{job_id}:events"
+
+
+def get_node_name() -> str:
+    """
+    Get the name this worker reports its completions under.
+
+    Returns:
+        str: The Vast.ai container id if set, the hostname otherwise.
+    """
+    return os.environ.get("CONTAINER_ID") or socket.gethostname()
+
+
+@functools.lru_cache(maxsize=None)
+def get_redis_client() -> Redis:
+    """
+    Get the Redis client of this worker process, connected with the REDIS_* variables the
+    worker's broker uses.
+
+    Returns:
+        Redis: The client.
+    """
+    return Redis(
+        host=os.environ.get("REDIS_HOST", "localhost"),
+        port=int(os.environ.get("REDIS_PORT", 6379)),
+        username=os.environ.get("REDIS_USER") or None,
+        password=os.environ.get("REDIS_PASSWORD") or None,
+    )
+
+
+# Claims the task for the first finished copy and counts it, all or nothing
+_CLAIM_AND_COUNT_SCRIPT = """
+if redis.call('HSETNX', KEYS[3], ARGV[1], ARGV[3]) == 0 then
+    return 0
+end
+redis.call('HINCRBY', KEYS[1], 'done', 1)
+redis.call('HINCRBY', KEYS[1], 'combinations', ARGV[2])
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[5], '*',
+    'node', ARGV[3], 'status', 'done', 'combinations', ARGV[2],
+    'seconds', ARGV[4], 'task', ARGV[1])
+for i = 1, 3 do
+    redis.call('EXPIRE', KEYS[i], ARGV[6])
+end
+return 1
+"""
+
+
+def get_claims_key(job_id: str) -> str:
+    """
+    Get the Redis key of the hash mapping the finished tasks of a job to their node.
+
+    Args:
+        job_id (str): The job id.
+
+    Returns:
+        str: The key.
+    """
+    return f"simian:progress:{job_id}:claims"
+
+
+def report_start(
+    redis_client: Redis,
+    job_id: str,
+    task_key: str,
+    combinations: int,
+    node: Optional[str] = None,
+) -> None:
+    """
+    Publish that a task of a job started rendering to the job's completion stream.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        job_id (str): The job id.
+        task_key (str): The task, the same for every copy of a re-executed task.
+        combinations (int): The number of combinations of the task.
+        node (Optional[str], optional): The worker node. Defaults to `get_node_name()`.
+
+    Returns:
+        None
+    """
+    _, events_key = get_progress_keys(job_id)
+    redis_client.xadd(
+        events_key,
+        {
+            "node": node or get_node_name(),
+            "status": "started",
+            "combinations": combinations,
+            "seconds": 0,
+            "task": task_key,
+        },
+        maxlen=PROGRESS_STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+def is_task_claimed(redis_client: Redis, job_id: str, task_key: str) -> bool:
+    """
+    Check whether a copy of a task already finished it.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        job_id (str): The job id.
+        task_key (str): The task.
+
+    Returns:
+        bool: True if the task is done.
+    """
+    return bool(redis_client.hexists(get_claims_key(job_id), task_key))
+
+
+def report_completion(
+    redis_client: Redis,
+    job_id: str,
+    combinations: int,
+    seconds: float,
+    failed: bool = False,
+    node: Optional[str] = None,
+    task_key: Optional[str] = None,
+) -> bool:
+    """
+    Count a finished task of a job and publish it to the job's completion stream.
+
+    Both updates are sent in one round trip. With a task key, only the first copy of the
+    task to finish successfully is counted, later copies are dropped.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        job_id (str): The job id.
+        combinations (int): The number of combinations the task rendered.
+        seconds (float): How long the task took.
+        failed (bool, optional): Whether the task failed. Defaults to False.
+        node (Optional[str], optional): The worker node. Defaults to `get_node_name()`.
+        task_key (Optional[str], optional): The task, the same for every copy of a
+            re-executed task. Defaults to None.
+
+    Returns:
+        bool: False if another copy of the task finished it first.
+    """
+    counts_key, events_key = get_progress_keys(job_id)
+    node = node or get_node_name()
+    if task_key is not None and not failed:
+        return bool(
+            redis_client.eval(
+                _CLAIM_AND_COUNT_SCRIPT,
+                3,
+                counts_key,
+                events_key,
+                get_claims_key(job_id),
+                task_key,
+                combinations,
+                node,
+                round(seconds, 3),
+                PROGRESS_STREAM_MAXLEN,
+                PROGRESS_TTL,
+            )
+        )
+
+    status = "failed" if failed else "done"
+    event = {
+        "node": node,
+        "status": status,
+        "combinations": combinations,
+        "seconds": round(seconds, 3),
+    }
+    if task_key is not None:
+        event["task"] = task_key
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hincrby(counts_key, status, 1)
+    pipe.hincrby(counts_key, "combinations", 0 if failed else combinations)
+    pipe.xadd(events_key, event, maxlen=PROGRESS_STREAM_MAXLEN, approximate=True)
+    pipe.expire(counts_key, PROGRESS_TTL)
+    pipe.expire(events_key, PROGRESS_TTL)
+    pipe.execute()
+    return True
+
+
+def clear_progress(redis_client: Redis, job_id: str) -> None:
+    """
+    Delete the progress keys of a job.
+
+    Args:
+        redis_client (Redis): The Redis client.
+        job_id (str): The job id.
+
+    Returns:
+        None
+    """
+    redis_client.delete(*get_progress_keys(job_id), get_claims_key(job_id))
+
+
+def _decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class ProgressTracker:
+    """
+    Follows the progress of a job from the completions its workers publish.
+
+    Each `update` reads the job's counters and the completion events since the previous
+    call, so its cost does not depend on the number of tasks in the job.
+    """
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        job_id: str,
+        total: int,
+        window: float = THROUGHPUT_WINDOW,
+    ):
+        """
+        Args:
+            redis_client (Redis): The Redis client.
+            job_id (str): The job id.
+            total (int): The number of tasks in the job.
+            window (float, optional): Seconds of recent completions used for throughput and ETA. Defaults to THROUGHPUT_WINDOW.
+        """
+        self.redis_client = redis_client
+        self.job_id = job_id
+        self.total = total
+        self.window = window
+        self.done = 0
+        self.failed = 0
+        self.combinations = 0
+        # completions per node since the job started
+        self.node_tasks: Dict[str, int] = collections.Counter()
+        self.node_last_seen: Dict[str, float] = {}
+        self._counts_key, self._events_key = get_progress_keys(job_id)
+        self._last_event_id = "0-0"
+        # (timestamp, node, combinations) of completions within the window
+        self._recent: Deque[Tuple[float, str, int]] = collections.deque()
+        # when the earliest reported task started
+        self._started: Optional[float] = None
+
+    @property
+    def completed(self) -> int:
+        """
+        The number of finished tasks, failed ones included.
+        """
+        return self.done + self.failed
+
+    def is_finished(self) -> bool:
+        """
+        Whether every task of the job has finished.
+
+        Returns:
+            bool: True once all tasks are done or failed.
+        """
+        return self.completed >= self.total
+
+    def record(
+        self, timestamp: float, node: str, status: str, combinations: int, seconds: float = 0.0
+    ) -> None:
+        """
+        Add one completion event to the throughput statistics.
+
+        Args:
+            timestamp (float): When the task finished, in seconds.
+            node (str): The worker node.
+            status (str): "started", "done" or "failed". Starts are not counted.
+            combinations (int): The number of combinations of the task.
+            seconds (float, optional): How long the task took. Defaults to 0.
+
+        Returns:
+            None
+        """
+        if status == "started":
+            return
+        started = timestamp - seconds
+        if self._started is None or started < self._started:
+            self._started = started
+        self.node_tasks[node] += 1
+        self.node_last_seen[node] = max(timestamp, self.node_last_seen.get(node, 0.0))
+        if status == "done":
+            self._recent.append((timestamp, node, combinations))
+        self._trim(timestamp)
+
+    def _trim(self, now: float) -> None:
+        while self._recent and self._recent[0][0] < now - self.window:
+            self._recent.popleft()
+
+    def update(self, block: float = 1.0) -> List[Dict[str, Any]]:
+        """
+        Read the job's counters and the completion events published since the last call.
+
+        Args:
+            block (float, optional): Seconds to wait for new events. Defaults to 1.0.
+
+        Returns:
+            List[Dict[str, Any]]: The new events, with their node, status, combinations,
+            seconds, task key if any, and the time they were published.
+        """
+        response = self.redis_client.xread(
+            {self._events_key: self._last_event_id},
+            count=PROGRESS_READ_COUNT,
+            block=int(block * 1000) if block > 0 else None,
+        )
+        events = []
+        for _, entries in response or []:
+            for event_id, fields in entries:
+                self._last_event_id = _decode(event_id)
+                fields = {_decode(key): _decode(value) for key, value in fields.items()}
+                event = {
+                    # stream ids start with the Redis server time in milliseconds
+                    "timestamp": int(self._last_event_id.split("-")[0]) / 1000,
+                    "node": fields.get("node", "unknown"),
+                    "status": fields.get("status", "done"),
+                    "combinations": int(fields.get("combinations", 0)),
+                    "seconds": float(fields.get("seconds", 0.0)),
+                    "task": fields.get("task"),
+                }
+                self.record(
+                    event["timestamp"],
+                    event["node"],
+                    event["status"],
+                    event["combinations"],
+                    event["seconds"],
+                )
+                events.append(event)
+
+        counts = self.redis_client.hgetall(self._counts_key)
+        counts = {_decode(key): int(value) for key, value in counts.items()}
+        self.done = counts.get("done", 0)
+        self.failed = counts.get("failed", 0)
+        self.combinations = counts.get("combinations", 0)
+        if self._recent:
+            self._trim(max(self._recent[-1][0], time.time()))
+        return events
+
+    def _get_span(self) -> float:
+        """
+        Get the seconds the recent completions are spread over.
+
+        Returns:
+            float: The window, or less while the job is younger than the window.
+        """
+        if not self._recent:
+            return self.window
+        return max(min(self.window, self._recent[-1][0] - self._started), 1.0)
+
+    def get_node_throughput(self) -> Dict[str, float]:
+        """
+        Get the rate at which every node rendered combinations within the window.
+
+        Returns:
+            Dict[str, float]: Combinations per minute by node.
+        """
+        span = self._get_span()
+        rates = collections.Counter()
+        for _, node, combinations in self._recent:
+            rates[node] += combinations
+        return {node: count * 60 / span for node, count in rates.items()}
+
+    def get_task_rate(self) -> float:
+        """
+        Get the rate at which tasks finished within the window.
+
+        Returns:
+            float: Tasks per second, 0 before the first completion.
+        """
+        if not self._recent:
+            return 0.0
+        return len(self._recent) / self._get_span()
+
+    def get_eta(self, remaining_combinations: Optional[int] = None) -> Optional[float]:
+        """
+        Estimate the seconds until every task has finished at the recent rate.
+
+        Args:
+            remaining_combinations (Optional[int], optional): Combinations left, for jobs
+                whose number of tasks is not known up front. Defaults to None, the
+                estimate uses the remaining tasks.
+
+        Returns:
+            Optional[float]: The estimate, or None while the rate is unknown.
+        """
+        if remaining_combinations is not None:
+            if remaining_combinations <= 0:
+                return 0.0
+            rate = sum(self.get_node_throughput().values()) / 60
+            return remaining_combinations / rate if rate > 0 else None
+
+        if self.is_finished():
+            return 0.0
+        rate = self.get_task_rate()
+        if rate <= 0:
+            return None
+        return (self.total - self.completed) / rate
+
+    def summary(self, remaining_combinations: Optional[int] = None) -> str:
+        """
+        Describe the progress in one line for a progress bar.
+
+        Args:
+            remaining_combinations (Optional[int], optional): Combinations left, see `get_eta`. Defaults to None.
+
+        Returns:
+            str: Failed tasks, active nodes, combinations per minute and the ETA.
+        """
+        throughput = self.get_node_throughput()
+        eta = self.get_eta(remaining_combinations)
+        eta_text = "?" if eta is None else time.strftime("%H:%M:%S", time.gmtime(eta))
+        return (
+            f"failed={self.failed} nodes={len(throughput)} "
+            f"rate={sum(throughput.values()):.1f}/min eta={eta_text}"
+        )
@@ -6,6 +6,7 @@ import ssl
 import sys
 import bpy
 import random
+from typing import List, Optional, Tuple
 from rich.console import Console
 
 console = Console()
@@ -29,17 +30,23 @@ from .object import (
     apply_all_modifiers,
     apply_and_remove_armatures,
     get_meshes_in_hierarchy,
+    import_object,
     join_objects_in_hierarchy,
     load_object,
     lock_all_objects,
+    normalize_object_data_api,
     normalize_object_scale,
     optimize_meshes_in_hierarchy,
     set_pivot_to_bottom,
     unlock_objects,
     unparent_keep_transform,
 )
-from .background import create_photosphere, set_background
-from .scene import apply_stage_material, create_stage, initialize_scene
+from .chunks import get_chunk_path
+from .combination_store import get_stored_combination, get_stored_combinations
+from .background import create_photosphere, get_hdri_tier, set_background
+from .lod import apply_lod, apply_texture_budget, get_scene_coverage
+from .scene import apply_stage_material, create_stage, initialize_scene, reset_scene
+from .datablock_cache import enable_datablock_cache, get_datablock_cache
 from .vendor import objaverse
 
 
@@ -58,6 +65,23 @@ def read_combination(combination_file: str, index: int = 0) -> dict:
         data = json.load(file)
         combinations_data = data["combinations"]
         return combinations_data[index]
+
+
+def read_combinations(combination_file: str, start_index: int, end_index: int) -> List[Tuple[int, dict]]:
+    """
+    Reads a range of combinations from a JSON file, parsing the file once.
+
+    Args:
+        combination_file (str): Path to the JSON file containing camera combinations.
+        start_index (int): Index of the first combination.
+        end_index (int): Index after the last combination.
+
+    Returns:
+        List[Tuple[int, dict]]: Combination indices and combinations, in order.
+    """
+    with open(combination_file, "r") as file:
+        combinations_data = json.load(file)["combinations"]
+    return [(index, combinations_data[index]) for index in range(start_index, end_index)]
     
 
 def load_user_blend_file(user_blend_file):
@@ -101,7 +125,90 @@ def select_focus_object(all_objects):
     return list(all_objects[0].keys())[0] if all_objects else None
 
 
-def render_scene(
+def load_combination_objects(
+    combination: dict, context: bpy.types.Context, fast_normalize: bool = False
+) -> list:
+    """
+    Loads and normalizes the objects of a combination into the scene.
+
+    Every uid is imported once. Repeated uids become linked duplicates of its first object,
+    sharing mesh and materials, and scaled relative to it.
+
+    Args:
+        combination (dict): The combination dictionary.
+        context (bpy.types.Context): Blender context.
+        fast_normalize (bool): Normalize imported objects with the data API instead of operators. Defaults to False.
+
+    Returns:
+        list: One dictionary per object, mapping the Blender object to its object data.
+    """
+    all_objects = []
+    datablock_cache = get_datablock_cache()
+    # The first object of every uid in this scene and its scale factor
+    instance_sources = {}
+
+    for object_data in combination["objects"]:
+        uid = object_data["uid"]
+        scale_factor = object_data["scale"]["factor"]
+
+        # Repeated uids become linked duplicates sharing mesh and materials
+        if uid in instance_sources:
+            source, source_factor = instance_sources[uid]
+            obj = source.copy()
+            for collection in source.users_collection:
+                collection.objects.link(obj)
+            # The shared mesh is normalized for the source's factor
+            obj.scale = [source_factor / scale_factor for _ in range(3)]
+            all_objects.append({obj: object_data})
+            continue
+
+        # Reuse the normalized mesh of an object an earlier job of this process loaded
+        mesh_key = ("mesh", uid, scale_factor, fast_normalize)
+        mesh = datablock_cache.get(mesh_key) if datablock_cache else None
+        if mesh is not None:
+            obj = bpy.data.objects.new(uid, mesh)
+            context.scene.collection.objects.link(obj)
+            obj.location = mesh.get("simian_location", (0, 0, 0))
+            instance_sources[uid] = (obj, scale_factor)
+            all_objects.append({obj: object_data})
+            continue
+
+        object_file = objaverse.load_objects([uid])[uid]
+
+        if fast_normalize:
+            imported = import_object(object_file)
+            obj = normalize_object_data_api(imported, scale_factor)
+        else:
+            load_object(object_file)
+            obj = [obj for obj in context.view_layer.objects.selected][0]
+
+            apply_and_remove_armatures()
+            apply_all_modifiers(obj)
+            join_objects_in_hierarchy(obj)
+            optimize_meshes_in_hierarchy(obj)
+
+            meshes = get_meshes_in_hierarchy(obj)
+            obj = meshes[0]
+
+            unparent_keep_transform(obj)
+            set_pivot_to_bottom(obj)
+
+            obj.scale = [scale_factor for _ in range(3)]
+            normalize_object_scale(obj)
+        obj.name = uid
+        obj.data["simian_scale_factor"] = scale_factor
+
+        if datablock_cache:
+            obj.data["simian_location"] = list(obj.location)
+            datablock_cache.put(mesh_key, obj.data)
+
+        instance_sources[uid] = (obj, scale_factor)
+        all_objects.append({obj: object_data})
+
+    return all_objects
+
+
+def build_scene(
     output_dir: str,
     context: bpy.types.Context,
     combination_file,
@@ -111,10 +218,20 @@ def render_scene(
     combination=None,
     render_images: bool =False,
     user_blend_file = None,
-    animation_length: int = 100
-) -> None:
+    animation_length: int = 100,
+    lod: bool = False,
+    texture_budget: bool = False,
+    fast_normalize: bool = False,
+    hdri_tier: Optional[str] = None,
+    persistent: bool = False,
+    hdri_path: str = "backgrounds",
+    frame_range: Optional[Tuple[int, int]] = None,
+) -> bool:
     """
-    Renders a scene with specified parameters.
+    Sets up a scene with specified parameters so it is ready to render.
+
+    The output path and format are stored on the scene, so the scene can be saved and
+    rendered by `render_built_scene` in another process.
 
     Args:
         output_dir (str): Path to the directory where the rendered video will be saved.
@@ -126,9 +243,16 @@ def render_scene(
         render_images (bool): Flag to indicate if images should be rendered instead of videos.
         user_blend_file (str): Path to the user-specified Blender file to use as the base scene
         animation_length (int): Percentage animation length. Defaults to 100.
+        lod (bool): Decimate objects to a triangle budget based on their screen coverage. Defaults to False.
+        texture_budget (bool): Downscale object textures based on the render resolution and their screen coverage. Defaults to False.
+        fast_normalize (bool): Normalize imported objects with the data API instead of operators. Defaults to False.
+        hdri_tier (Optional[str]): Background resolution tier ("1k", "2k", "4k", "8k"), or "auto" to pick one from the render width. Defaults to None, the recorded resolution.
+        persistent (bool): Clear the scene of the previous job but keep cached datablocks instead of resetting Blender. Defaults to False.
+        hdri_path (str): Path to the directory where the background HDRs are saved. Defaults to "backgrounds".
+        frame_range (Optional[Tuple[int, int]]): First and last frame of the video chunk to render. The animation still spans start_frame to end_frame. Defaults to None, the whole video.
 
     Returns:
-        None
+        bool: True if the scene is ready to render, False if it could not be built.
     """
 
     console.print("Rendering scene with combination ", style="orange_red1", end="")
@@ -136,13 +260,16 @@ def render_scene(
 
     os.makedirs(output_dir, exist_ok=True)
 
-    initialize_scene()
+    if persistent:
+        reset_scene()
+    else:
+        initialize_scene()
 
     if user_blend_file:
         bpy.ops.wm.open_mainfile(filepath=user_blend_file)
         if not load_user_blend_file(user_blend_file):
             logger.error(f"Unable to load user-specified Blender file: {user_blend_file}")
-            return  # Exit the function if the file could not be loaded
+            return False  # Exit the function if the file could not be loaded
 
     context.scene.render.engine = 'BLENDER_EEVEE'
 
@@ -160,38 +287,34 @@ def render_scene(
         combination = json.loads(combination)
     else:
         combination = read_combination(combination_file, combination_index)
-    all_objects = []
 
     focus_object = None
 
-    for object_data in combination["objects"]:
-        object_file = objaverse.load_objects([object_data["uid"]])[object_data["uid"]]
-
-        load_object(object_file)
-        obj = [obj for obj in context.view_layer.objects.selected][0]
-
-        apply_and_remove_armatures()
-        apply_all_modifiers(obj)
-        join_objects_in_hierarchy(obj)
-        optimize_meshes_in_hierarchy(obj)
+    all_objects = load_combination_objects(combination, context, fast_normalize)
 
-        meshes = get_meshes_in_hierarchy(obj)
-        obj = meshes[0]
-
-        unparent_keep_transform(obj)
-        set_pivot_to_bottom(obj)
+    largest_length = find_largest_length(all_objects)
 
-        obj.scale = [object_data["scale"]["factor"] for _ in range(3)]
-        normalize_object_scale(obj)
-        obj.name = object_data["uid"] 
+    sizes = [
+        (1920, 1080),
+        (1024, 1024),
+        # able to add more options here
+    ]
 
-        all_objects.append({obj: object_data})
+    # Set the output resolution before any step that depends on screen size
+    if render_images:
+        size = random.choice(sizes)
+    else:
+        size = (1920, 1080)
+    scene.render.resolution_x = size[0]
+    scene.render.resolution_y = size[1]
+    scene.render.resolution_percentage = 100
 
-    largest_length = find_largest_length(all_objects)
+    if hdri_tier == "auto":
+        hdri_tier = get_hdri_tier(size[0])
 
     if not user_blend_file:
-        set_background(args.hdri_path, combination)
-        create_photosphere(args.hdri_path, combination).scale = (10, 10, 10)
+        set_background(hdri_path, combination, hdri_tier)
+        create_photosphere(hdri_path, combination, tier=hdri_tier).scale = (10, 10, 10)
         stage = create_stage(combination)
         apply_stage_material(stage, combination)
     
@@ -206,7 +329,7 @@ def render_scene(
     focus_object = select_focus_object(all_objects)
     if focus_object is None or not isinstance(focus_object, bpy.types.Object):
         logger.error("No valid focus object found or focus object is not a Blender object. Cannot position camera.")
-        return  
+        return False
 
     position_camera(combination, focus_object)
 
@@ -214,49 +337,135 @@ def render_scene(
         check_camera_follow = any(obj.get("camera_follow", {}).get("follow", False) for obj in combination['objects'])
         apply_animation(all_objects, focus_object, yaw, scene.frame_start, end_frame, check_camera_follow)
 
-    sizes = [
-        (1920, 1080),
-        (1024, 1024),
-        # able to add more options here
-    ]
+    if lod or texture_budget:
+        coverage = get_scene_coverage(all_objects)
+        if lod:
+            apply_lod(all_objects, coverage)
+        if texture_budget:
+            apply_texture_budget(all_objects, coverage)
 
+    scene["simian_render_images"] = render_images
     if render_images:
         # Render a specific frame as an image with a random size
         middle_frame = (scene.frame_start + scene.frame_end) // 2
-        size = random.choice(sizes)
         scene.frame_set(middle_frame)
-        scene.render.resolution_x = size[0]
-        scene.render.resolution_y = size[1]
-        scene.render.resolution_percentage = 100
         render_path = os.path.join(
             output_dir,
             f"{combination_index}_frame_{middle_frame}_{size[0]}x{size[1]}.png",
         )
         scene.render.filepath = render_path
-        bpy.ops.render.render(write_still=True)
-        logger.info(f"Rendered image saved to {render_path}")
     else:
         # Render the entire animation as a video
-        scene.render.resolution_x = 1920
-        scene.render.resolution_y = 1080
-        scene.render.resolution_percentage = 100
         scene.render.image_settings.file_format = "FFMPEG"
         scene.render.ffmpeg.format = "MPEG4"
         scene.render.ffmpeg.codec = "H264"
         scene.render.ffmpeg.constant_rate_factor = "PERC_LOSSLESS"
         scene.render.ffmpeg.ffmpeg_preset = "BEST"
-        render_path = os.path.join(output_dir, f"{combination_index}.mp4")
+        if frame_range is not None:
+            # Render only this chunk of the animation, which is keyed over the full range
+            scene.frame_start, scene.frame_end = frame_range
+            render_path = get_chunk_path(output_dir, combination_index, frame_range)
+            scene["simian_blend_path"] = ""
+        else:
+            render_path = os.path.join(output_dir, f"{combination_index}.mp4")
+            scene["simian_blend_path"] = os.path.join(output_dir, f"{combination_index}.blend")
         scene.render.filepath = render_path
+
+    return True
+
+
+def render_built_scene(context: bpy.types.Context) -> None:
+    """
+    Renders a scene set up by `build_scene`, possibly after loading it from a saved file.
+
+    Args:
+        context (bpy.types.Context): Blender context.
+
+    Returns:
+        None
+    """
+    scene = context.scene
+    render_path = scene.render.filepath
+    if scene.get("simian_render_images"):
+        bpy.ops.render.render(write_still=True)
+        logger.info(f"Rendered image saved to {render_path}")
+    else:
         bpy.ops.render.render(animation=True)
 
         # uncomment this to prevent generation of blend files
-        bpy.ops.wm.save_as_mainfile(
-            filepath=os.path.join(output_dir, f"{combination_index}.blend")
-        )
+        if scene.get("simian_blend_path"):
+            bpy.ops.wm.save_as_mainfile(filepath=scene["simian_blend_path"])
 
         logger.info(f"Rendered video saved to {render_path}")
 
 
+def render_scene(
+    output_dir: str,
+    context: bpy.types.Context,
+    combination_file,
+    start_frame: int = 1,
+    end_frame: int = 65,
+    combination_index=0,
+    combination=None,
+    render_images: bool =False,
+    user_blend_file = None,
+    animation_length: int = 100,
+    lod: bool = False,
+    texture_budget: bool = False,
+    fast_normalize: bool = False,
+    hdri_tier: Optional[str] = None,
+    persistent: bool = False,
+    hdri_path: str = "backgrounds",
+    frame_range: Optional[Tuple[int, int]] = None,
+) -> bool:
+    """
+    Renders a scene with specified parameters.
+
+    Args:
+        output_dir (str): Path to the directory where the rendered video will be saved.
+        context (bpy.types.Context): Blender context.
+        combination_file (str): Path to the JSON file containing camera combinations.
+        start_frame (int): Start frame of the animation. Defaults to 1.
+        end_frame (int): End frame of the animation. Defaults to 65.
+        combination_index (int): Index of the camera combination to use from the JSON file. Defaults to 0.
+        render_images (bool): Flag to indicate if images should be rendered instead of videos.
+        user_blend_file (str): Path to the user-specified Blender file to use as the base scene
+        animation_length (int): Percentage animation length. Defaults to 100.
+        lod (bool): Decimate objects to a triangle budget based on their screen coverage. Defaults to False.
+        texture_budget (bool): Downscale object textures based on the render resolution and their screen coverage. Defaults to False.
+        fast_normalize (bool): Normalize imported objects with the data API instead of operators. Defaults to False.
+        hdri_tier (Optional[str]): Background resolution tier ("1k", "2k", "4k", "8k"), or "auto" to pick one from the render width. Defaults to None, the recorded resolution.
+        persistent (bool): Clear the scene of the previous job but keep cached datablocks instead of resetting Blender. Defaults to False.
+        hdri_path (str): Path to the directory where the background HDRs are saved. Defaults to "backgrounds".
+        frame_range (Optional[Tuple[int, int]]): First and last frame of the video chunk to render. The animation still spans start_frame to end_frame. Defaults to None, the whole video.
+
+    Returns:
+        bool: True if the scene was built and rendered, False if it could not be built.
+    """
+    built = build_scene(
+        output_dir,
+        context,
+        combination_file,
+        start_frame=start_frame,
+        end_frame=end_frame,
+        combination_index=combination_index,
+        combination=combination,
+        render_images=render_images,
+        user_blend_file=user_blend_file,
+        animation_length=animation_length,
+        lod=lod,
+        texture_budget=texture_budget,
+        fast_normalize=fast_normalize,
+        hdri_tier=hdri_tier,
+        persistent=persistent,
+        hdri_path=hdri_path,
+        frame_range=frame_range,
+    )
+    if built:
+        render_built_scene(context)
+    return bool(built)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -308,6 +517,12 @@ if __name__ == "__main__":
     parser.add_argument(
         "--combination", type=str, default=None, help="Combination dictionary."
     )
+    parser.add_argument(
+        "--combination_store",
+        type=str,
+        default=None,
+        help="Path to a combination store built by simian.combination_store, read instead of combination_file.",
+    )
     parser.add_argument(
         "--images",
         action="store_true",
@@ -327,6 +542,53 @@ if __name__ == "__main__":
         help="Percentage animation length. Defaults to 100%.",
         required=False
     )
+    parser.add_argument(
+        "--lod",
+        action="store_true",
+        help="Decimate objects to a triangle budget based on their screen coverage.",
+    )
+    parser.add_argument(
+        "--texture_budget",
+        action="store_true",
+        help="Downscale object textures based on the render resolution and their screen coverage.",
+    )
+    parser.add_argument(
+        "--fast_normalize",
+        action="store_true",
+        help="Normalize imported objects with the data API instead of operators.",
+    )
+    parser.add_argument(
+        "--hdri_tier",
+        type=str,
+        choices=["auto", "1k", "2k", "4k", "8k"],
+        default=None,
+        help="Background resolution tier, or auto to pick one from the render width. Defaults to the recorded resolution.",
+    )
+    parser.add_argument(
+        "--frame_range",
+        type=int,
+        nargs=2,
+        default=None,
+        metavar=("FIRST", "LAST"),
+        help="Render only this chunk of the video. The animation still spans start_frame to end_frame.",
+    )
+    parser.add_argument(
+        "--end_index",
+        type=int,
+        default=None,
+        help="Render every combination from combination_index up to, but excluding, end_index in this process.",
+    )
+    parser.add_argument(
+        "--datablock_budget",
+        type=int,
+        default=4096,
+        help="Memory budget in MB for images, materials and meshes kept between combinations when using end_index.",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="With end_index, build the next scene in a second Blender process while the current one renders.",
+    )
 
     if "--" in sys.argv:
         argv = sys.argv[sys.argv.index("--") + 1 :]
@@ -339,8 +601,73 @@ if __name__ == "__main__":
     scene = context.scene
     render = scene.render
 
+    if args.end_index is not None:
+        if args.combination_store is not None:
+            combinations = get_stored_combinations(
+                args.combination_store, args.combination_index, args.end_index
+            )
+        else:
+            combinations = read_combinations(
+                args.combination_file, args.combination_index, args.end_index
+            )
+
+    if args.end_index is not None and args.pipeline:
+        from .pipeline import run_pipeline
+
+        run_pipeline(
+            combinations,
+            args.output_dir,
+            datablock_budget=args.datablock_budget * 1024 * 1024,
+            start_frame=args.start_frame,
+            end_frame=args.end_frame,
+            render_images=args.images,
+            user_blend_file=args.blend,
+            lod=args.lod,
+            texture_budget=args.texture_budget,
+            fast_normalize=args.fast_normalize,
+            hdri_tier=args.hdri_tier,
+            hdri_path=args.hdri_path,
+            frame_range=tuple(args.frame_range) if args.frame_range else None,
+        )
+        sys.exit(0)
+
+    if args.end_index is not None:
+        # Render a range of combinations in one process, keeping shared assets resident
+        enable_datablock_cache(args.datablock_budget * 1024 * 1024)
+        initialize_scene()
+        for combination_index, combination in combinations:
+            # One broken combination must not stop the rest of the range
+            try:
+                objaverse.load_objects([obj["uid"] for obj in combination["objects"]])
+                rendered = render_scene(
+                    start_frame=args.start_frame,
+                    end_frame=args.end_frame,
+                    output_dir=args.output_dir,
+                    context=context,
+                    combination_file=args.combination_file,
+                    combination_index=combination_index,
+                    combination=json.dumps(combination),
+                    render_images=args.images,
+                    user_blend_file=args.blend,
+                    lod=args.lod,
+                    texture_budget=args.texture_budget,
+                    fast_normalize=args.fast_normalize,
+                    hdri_tier=args.hdri_tier,
+                    persistent=True,
+                    hdri_path=args.hdri_path,
+                    frame_range=tuple(args.frame_range) if args.frame_range else None,
+                )
+                if not rendered:
+                    logger.error(f"Failed to build combination {combination_index}")
+            except Exception:
+                logger.exception(f"Failed to render combination {combination_index}")
+        sys.exit(0)
+
     if args.combination is not None:
         combination = json.loads(args.combination)
+    elif args.combination_store is not None:
+        combination = get_stored_combination(args.combination_store, args.combination_index)
+        args.combination = json.dumps(combination)
     else:
         combination = read_combination(args.combination_file, args.combination_index)
 
@@ -353,7 +680,7 @@ if __name__ == "__main__":
         downloaded = objaverse.load_objects([uid])
 
     # Render the images
-    render_scene(
+    rendered = render_scene(
         start_frame=args.start_frame,
         end_frame=args.end_frame,
         output_dir=args.output_dir,
@@ -363,4 +690,13 @@ if __name__ == "__main__":
         combination=args.combination,
         render_images=args.images,
         user_blend_file=args.blend,
+        lod=args.lod,
+        texture_budget=args.texture_budget,
+        fast_normalize=args.fast_normalize,
+        hdri_tier=args.hdri_tier,
+        hdri_path=args.hdri_path,
+        frame_range=tuple(args.frame_range) if args.frame_range else None,
     )
+    if not rendered:
+        # the worker records a failure instead of uploading a missing output
+        sys.exit(1)
@@ -1,9 +1,31 @@
 from math import cos, sin
 import bpy
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
 import bmesh
+import hashlib
+import json
+import logging
 import os
-import requests
+
+from .asset_cache import download_to_cache, fetch_cached, get_cache_path
+from .cache_manager import use_cached
+from .datablock_cache import get_datablock_cache
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# File names of the stage texture maps, keyed by map type
+STAGE_TEXTURE_NAMES = {
+    "Diffuse": "Diffuse",
+    "nor_gl": "Normal",
+    "AO": "AO",
+    "Rough": "Rough",
+    "Roughness": "Roughness",
+    "arm": "Arm",
+    "rough_ao": "RoughAO",
+    "Displacement": "Displacement",
+}
 
 
 def initialize_scene() -> None:
@@ -19,10 +41,30 @@ def initialize_scene() -> None:
     bpy.context.scene.render.engine = 'BLENDER_EEVEE'
 
 
+def reset_scene() -> None:
+    """
+    Clears the scene for the next job of a persistent render process.
+
+    Unlike `initialize_scene`, this keeps datablocks with a fake user, such as the ones
+    held by the datablock cache, so the next job can reuse them without loading them again.
+    """
+    bpy.data.batch_remove(list(bpy.data.objects))
+    bpy.data.batch_remove(list(bpy.data.collections))
+    bpy.data.batch_remove(list(bpy.data.worlds))
+
+    datablock_cache = get_datablock_cache()
+    if datablock_cache is not None:
+        datablock_cache.trim()
+    bpy.data.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
+
+    # set render mode of blend file to eevee
+    bpy.context.scene.render.engine = 'BLENDER_EEVEE'
+
+
 def download_texture(url: str, material_name: str, texture_name: str) -> str:
     """
-    Downloads the texture from the given URL and saves it in the materials/<material_name> folder.
-    Returns the local file path of the downloaded texture.
+    Downloads the texture from the given URL and saves it in the materials/<material_name> folder
+    of the shared asset cache. Returns the local file path of the downloaded texture.
 
     Args:
         url (str): The URL of the texture to download.
@@ -32,17 +74,10 @@ def download_texture(url: str, material_name: str, texture_name: str) -> str:
     Returns:
         str: The local file path of the downloaded texture.
     """
-    materials_dir = os.path.join("materials", material_name)
-    os.makedirs(materials_dir, exist_ok=True)
-
-    local_path = os.path.join(materials_dir, f"{texture_name}.jpg")
-
-    if not os.path.exists(local_path):
-        response = requests.get(url)
-        with open(local_path, "wb") as file:
-            file.write(response.content)
-
-    return local_path
+    local_path = get_cache_path("materials", material_name, f"{texture_name}.jpg")
+    return use_cached(
+        local_path, "materials", lambda: download_to_cache(url, local_path)
+    )
 
 
 def create_stage(
@@ -118,24 +153,57 @@ def create_stage(
     return stage
 
 
-def apply_stage_material(stage: bpy.types.Object, combination: dict) -> None:
+def download_textures(maps: Dict[str, str], material_name: str) -> Dict[str, str]:
     """
-    Applies the stage material to the given stage object based on the combination settings.
+    Downloads all texture maps of a material in parallel.
 
     Args:
-        stage (bpy.types.Object): The stage object to apply the material to.
-        combination (dict): A dictionary containing the stage material settings.
+        maps (Dict[str, str]): A dictionary mapping the map type (e.g. "Diffuse") to its URL.
+        material_name (str): The name of the material.
+
+    Returns:
+        Dict[str, str]: A dictionary mapping the map type to the local file path.
     """
-    # Get the stage material settings from the combination
-    stage_data = combination.get("stage", {})
-    stage_material = stage_data.get("material", {})
-    material_name = stage_material.get("name", "DefaultMaterial")
+    known_maps = {key: url for key, url in maps.items() if key in STAGE_TEXTURE_NAMES}
+    if not known_maps:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(known_maps)) as executor:
+        futures = {
+            key: executor.submit(
+                download_texture, url, material_name, STAGE_TEXTURE_NAMES[key]
+            )
+            for key, url in known_maps.items()
+        }
+        return {key: future.result() for key, future in futures.items()}
 
-    # Create a new material for the stage
-    material = bpy.data.materials.new(name="StageMaterial")
 
-    # Assign the material to the stage object
-    stage.data.materials.append(material)
+def get_stage_material_key(material_name: str, maps: Dict[str, str]) -> str:
+    """
+    Get the cache key of a stage material from its name and map set.
+
+    Args:
+        material_name (str): The name of the material.
+        maps (Dict[str, str]): A dictionary mapping the map type to its URL.
+
+    Returns:
+        str: The cache key, also used as the name of the material datablock.
+    """
+    digest = hashlib.sha1(json.dumps(maps, sort_keys=True).encode()).hexdigest()[:12]
+    return f"StageMaterial_{material_name}_{digest}"
+
+
+def build_stage_material(name: str, texture_paths: Dict[str, str]) -> bpy.types.Material:
+    """
+    Builds the stage material node tree from downloaded texture maps.
+
+    Args:
+        name (str): The name of the material datablock.
+        texture_paths (Dict[str, str]): A dictionary mapping the map type to the local file path.
+
+    Returns:
+        bpy.types.Material: The new material.
+    """
+    material = bpy.data.materials.new(name=name)
 
     # Set the material properties based on the combination settings
     material.use_nodes = True
@@ -157,68 +225,49 @@ def apply_stage_material(stage: bpy.types.Object, combination: dict) -> None:
     links = material.node_tree.links
     links.new(tex_coord.outputs["UV"], mapping.inputs["Vector"])
 
+    def new_texture(key: str) -> bpy.types.ShaderNodeTexImage:
+        texture = nodes.new(type="ShaderNodeTexImage")
+        texture.image = bpy.data.images.load(texture_paths[key], check_existing=True)
+        links.new(mapping.outputs["Vector"], texture.inputs["Vector"])
+        return texture
+
     # Load and connect diffuse texture
-    if "Diffuse" in stage_material["maps"]:
-        diffuse_url = stage_material["maps"]["Diffuse"]
-        diffuse_path = download_texture(diffuse_url, material_name, "Diffuse")
-        diffuse_tex = nodes.new(type="ShaderNodeTexImage")
-        diffuse_tex.image = bpy.data.images.load(diffuse_path)
-        links.new(mapping.outputs["Vector"], diffuse_tex.inputs["Vector"])
+    if "Diffuse" in texture_paths:
+        diffuse_tex = new_texture("Diffuse")
         links.new(diffuse_tex.outputs["Color"], principled.inputs["Base Color"])
 
     # Load and connect normal texture
-    if "nor_gl" in stage_material["maps"]:
-        normal_url = stage_material["maps"]["nor_gl"]
-        normal_path = download_texture(normal_url, material_name, "Normal")
-        normal_tex = nodes.new(type="ShaderNodeTexImage")
-        normal_tex.image = bpy.data.images.load(normal_path)
+    if "nor_gl" in texture_paths:
+        normal_tex = new_texture("nor_gl")
         normal_map = nodes.new(type="ShaderNodeNormalMap")
-        links.new(mapping.outputs["Vector"], normal_tex.inputs["Vector"])
         links.new(normal_tex.outputs["Color"], normal_map.inputs["Color"])
         links.new(normal_map.outputs["Normal"], principled.inputs["Normal"])
 
-    if "AO" in stage_material["maps"]:
-        ao_url = stage_material["maps"]["AO"]
-        ao_path = download_texture(ao_url, material_name, "AO")
-        ao_tex = nodes.new(type="ShaderNodeTexImage")
-        ao_tex.image = bpy.data.images.load(ao_path)
+    if "AO" in texture_paths:
+        ao_tex = new_texture("AO")
         mixRGB = nodes.new(type="ShaderNodeMixRGB")
         mixRGB.blend_type = "MULTIPLY"
         links.new(ao_tex.outputs["Color"], mixRGB.inputs["Color2"])
-        links.new(mapping.outputs["Vector"], ao_tex.inputs["Vector"])
 
         # Connect the MixRGB node to the base color input
-        if "Diffuse" in stage_material["maps"]:
+        if "Diffuse" in texture_paths:
             links.new(diffuse_tex.outputs["Color"], mixRGB.inputs["Color1"])
-            links.new(mixRGB.outputs["Color"], principled.inputs["Base Color"])
-    else:
-        # If no diffuse texture, use a default base color
-        principled.inputs["Base Color"].default_value = (1.0, 1.0, 1.0, 1.0)
-        links.new(ao_tex.outputs["Color"], mixRGB.inputs["Color1"])
+        else:
+            # If no diffuse texture, use a default base color
+            principled.inputs["Base Color"].default_value = (1.0, 1.0, 1.0, 1.0)
+            links.new(ao_tex.outputs["Color"], mixRGB.inputs["Color1"])
         links.new(mixRGB.outputs["Color"], principled.inputs["Base Color"])
 
-    if "Rough" in stage_material["maps"]:
-        rough_url = stage_material["maps"]["Rough"]
-        rough_path = download_texture(rough_url, material_name, "Rough")
-        rough_tex = nodes.new(type="ShaderNodeTexImage")
-        rough_tex.image = bpy.data.images.load(rough_path)
-        links.new(mapping.outputs["Vector"], rough_tex.inputs["Vector"])
+    if "Rough" in texture_paths:
+        rough_tex = new_texture("Rough")
         links.new(rough_tex.outputs["Color"], principled.inputs["Roughness"])
 
-    if "Roughness" in stage_material["maps"]:
-        roughness_url = stage_material["maps"]["Roughness"]
-        roughness_path = download_texture(roughness_url, material_name, "Roughness")
-        roughness_tex = nodes.new(type="ShaderNodeTexImage")
-        roughness_tex.image = bpy.data.images.load(roughness_path)
-        links.new(mapping.outputs["Vector"], roughness_tex.inputs["Vector"])
+    if "Roughness" in texture_paths:
+        roughness_tex = new_texture("Roughness")
         links.new(roughness_tex.outputs["Color"], principled.inputs["Roughness"])
 
-    if "arm" in stage_material["maps"]:
-        arm_url = stage_material["maps"]["arm"]
-        arm_path = download_texture(arm_url, material_name, "Arm")
-        arm_tex = nodes.new(type="ShaderNodeTexImage")
-        arm_tex.image = bpy.data.images.load(arm_path)
-        links.new(mapping.outputs["Vector"], arm_tex.inputs["Vector"])
+    if "arm" in texture_paths:
+        arm_tex = new_texture("arm")
 
         # Create separate RGB nodes for ambient occlusion, roughness, and metallic
         ao_rgb = nodes.new(type="ShaderNodeSeparateRGB")
@@ -235,7 +284,7 @@ def apply_stage_material(stage: bpy.types.Object, combination: dict) -> None:
         mixRGB.blend_type = "MULTIPLY"
         links.new(ao_rgb.outputs["R"], mixRGB.inputs["Color2"])
 
-        if "Diffuse" in stage_material["maps"]:
+        if "Diffuse" in texture_paths:
             links.new(diffuse_tex.outputs["Color"], mixRGB.inputs["Color1"])
             links.new(mixRGB.outputs["Color"], principled.inputs["Base Color"])
         else:
@@ -249,24 +298,88 @@ def apply_stage_material(stage: bpy.types.Object, combination: dict) -> None:
         links.new(metal_rgb.outputs["B"], principled.inputs["Metallic"])
 
     # Load and connect rough_ao texture
-    if "rough_ao" in stage_material["maps"]:
-        rough_ao_url = stage_material["maps"]["rough_ao"]
-        rough_ao_path = download_texture(rough_ao_url, material_name, "RoughAO")
-        rough_ao_tex = nodes.new(type="ShaderNodeTexImage")
-        rough_ao_tex.image = bpy.data.images.load(rough_ao_path)
-        links.new(mapping.outputs["Vector"], rough_ao_tex.inputs["Vector"])
+    if "rough_ao" in texture_paths:
+        rough_ao_tex = new_texture("rough_ao")
         links.new(rough_ao_tex.outputs["Color"], principled.inputs["Roughness"])
 
     # Load and connect displacement texture
-    if "Displacement" in stage_material["maps"]:
-        disp_url = stage_material["maps"]["Displacement"]
-        disp_path = download_texture(disp_url, material_name, "Displacement")
-        disp_tex = nodes.new(type="ShaderNodeTexImage")
-        disp_tex.image = bpy.data.images.load(disp_path)
+    if "Displacement" in texture_paths:
+        disp_tex = new_texture("Displacement")
         disp_node = nodes.new(type="ShaderNodeDisplacement")
-        links.new(mapping.outputs["Vector"], disp_tex.inputs["Vector"])
         links.new(disp_tex.outputs["Color"], disp_node.inputs["Height"])
         links.new(disp_node.outputs["Displacement"], output.inputs["Displacement"])
 
     # Connect the nodes
     links.new(principled.outputs["BSDF"], output.inputs["Surface"])
+
+    return material
+
+
+def load_stage_material(material_name: str, maps: Dict[str, str]) -> bpy.types.Material:
+    """
+    Gets the stage material for a name and map set, building it only once.
+
+    The material is reused if it is already loaded, appended from the cached library
+    file if another render built it before, and otherwise built and written to the
+    library file. The textures are always downloaded first, since the library file
+    references them by path.
+
+    Args:
+        material_name (str): The name of the material.
+        maps (Dict[str, str]): A dictionary mapping the map type to its URL.
+
+    Returns:
+        bpy.types.Material: The stage material.
+    """
+    key = get_stage_material_key(material_name, maps)
+    datablock_cache = get_datablock_cache()
+    if datablock_cache is not None:
+        material = datablock_cache.get(("material", key))
+        if material is not None:
+            return material
+    if key in bpy.data.materials:
+        return bpy.data.materials[key]
+
+    texture_paths = download_textures(maps, material_name)
+
+    library_path = get_cache_path("materials", material_name, f"{key}.blend")
+    if os.path.exists(library_path):
+        with bpy.data.libraries.load(library_path, link=False) as (data_from, data_to):
+            data_to.materials = [name for name in data_from.materials if name == key]
+        if data_to.materials and data_to.materials[0] is not None:
+            material = data_to.materials[0]
+            if datablock_cache is not None:
+                datablock_cache.put(("material", key), material)
+            return material
+        logger.warning(f"Cached stage material {library_path} is invalid, rebuilding it")
+        os.remove(library_path)
+
+    material = build_stage_material(key, texture_paths)
+    fetch_cached(
+        library_path,
+        lambda tmp_path: bpy.data.libraries.write(
+            tmp_path, {material}, path_remap="ABSOLUTE"
+        ),
+    )
+    if datablock_cache is not None:
+        datablock_cache.put(("material", key), material)
+    return material
+
+
+def apply_stage_material(stage: bpy.types.Object, combination: dict) -> None:
+    """
+    Applies the stage material to the given stage object based on the combination settings.
+
+    Args:
+        stage (bpy.types.Object): The stage object to apply the material to.
+        combination (dict): A dictionary containing the stage material settings.
+    """
+    # Get the stage material settings from the combination
+    stage_data = combination.get("stage", {})
+    stage_material = stage_data.get("material", {})
+    material_name = stage_material.get("name", "DefaultMaterial")
+
+    material = load_stage_material(material_name, stage_material.get("maps", {}))
+
+    # Assign the material to the stage object
+    stage.data.materials.append(material)
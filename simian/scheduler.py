@@ -0,0 +1,357 @@
+import collections
+import logging
+import math
+import statistics
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Seconds of rendering a task should take once render times are known
+TARGET_TASK_SECONDS = 300.0
+# Tasks queued per node beyond the ones rendering
+QUEUE_DEPTH = 2
+# A running task is a straggler after this many times its expected duration
+STRAGGLER_FACTOR = 3.0
+# Never re-execute tasks that have run for less than this many seconds
+MIN_STRAGGLER_SECONDS = 120.0
+# Recent tasks used to estimate the render time per combination
+RENDER_TIME_SAMPLES = 50
+
+
+def get_task_key(start_index: int, end_index: int) -> str:
+    """
+    Get the key identifying the task of a combination range across all its copies.
+
+    Args:
+        start_index (int): The first index.
+        end_index (int): The index after the last one.
+
+    Returns:
+        str: The task key.
+    """
+    return f"{start_index}-{end_index}"
+
+
+def _new_task(start_index: int, end_index: int) -> Dict[str, Any]:
+    """
+    Create the state of a task covering a range of combinations.
+
+    Args:
+        start_index (int): The first index.
+        end_index (int): The index after the last one.
+
+    Returns:
+        Dict[str, Any]: The range, the number of copies submitted, queued and running,
+        the nodes of the running copies, when the first copy started and the status,
+        "pending", "done" or "failed".
+    """
+    return {
+        "start_index": start_index,
+        "end_index": end_index,
+        "size": end_index - start_index,
+        "copies": 0,
+        "queued": 0,
+        "running": 0,
+        "nodes": [],
+        "started_at": None,
+        "status": "pending",
+    }
+
+
+class AdaptiveScheduler:
+    """
+    Hands out combination ranges sized from measured render times.
+
+    Tasks are submitted a few at a time, keeping `queue_depth` tasks queued per node,
+    instead of all at once. Each new task is sized to take about `target_task_seconds`,
+    and shrinks towards the end of the job so the last tasks spread over all nodes.
+    Once everything is handed out, tasks running far longer than expected are submitted
+    again, the first copy to finish wins and later copies are dropped by the workers.
+    Tasks whose copies were lost with dead nodes are submitted again as soon as possible.
+
+    The scheduler is driven by the completion events of `ProgressTracker.update`.
+    """
+
+    def __init__(
+        self,
+        start_index: int,
+        end_index: int,
+        num_nodes: int,
+        initial_batch_size: int = 1,
+        max_batch_size: int = 64,
+        target_task_seconds: float = TARGET_TASK_SECONDS,
+        queue_depth: int = QUEUE_DEPTH,
+        straggler_factor: float = STRAGGLER_FACTOR,
+        min_straggler_seconds: float = MIN_STRAGGLER_SECONDS,
+        max_copies: int = 2,
+    ):
+        """
+        Args:
+            start_index (int): The first combination index of the job.
+            end_index (int): The index after the last combination of the job.
+            num_nodes (int): The number of worker nodes.
+            initial_batch_size (int, optional): Combinations per task before render times are known. Defaults to 1.
+            max_batch_size (int, optional): Maximum combinations per task. Defaults to 64.
+            target_task_seconds (float, optional): Seconds of rendering per task. Defaults to TARGET_TASK_SECONDS.
+            queue_depth (int, optional): Tasks queued per node. Defaults to QUEUE_DEPTH.
+            straggler_factor (float, optional): Multiple of the expected duration after which a task is re-executed. Defaults to STRAGGLER_FACTOR.
+            min_straggler_seconds (float, optional): Minimum runtime before a task is re-executed. Defaults to MIN_STRAGGLER_SECONDS.
+            max_copies (int, optional): Maximum copies of a task, the original included. Defaults to 2.
+        """
+        self.start_index = start_index
+        self.end_index = end_index
+        self.num_nodes = max(1, num_nodes)
+        self.initial_batch_size = max(1, initial_batch_size)
+        self.max_batch_size = max(self.initial_batch_size, max_batch_size)
+        self.target_task_seconds = target_task_seconds
+        self.queue_depth = queue_depth
+        self.straggler_factor = straggler_factor
+        self.min_straggler_seconds = min_straggler_seconds
+        self.max_copies = max_copies
+
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self.next_index = start_index
+        self.speculated = 0
+        self.recovered = 0
+        # counters kept up to date by every event, so no call scans all tasks
+        self._completed = 0
+        self._failed = 0
+        self._unfinished = 0
+        self._queued = 0
+        # unfinished tasks with a copy that started rendering
+        self._running: Dict[str, Dict[str, Any]] = {}
+        # tasks to submit again because their copies were lost with dead nodes
+        self._lost: Deque[str] = collections.deque()
+        # render seconds per combination of recently finished tasks
+        self._render_times: Deque[float] = collections.deque(maxlen=RENDER_TIME_SAMPLES)
+
+    @property
+    def total(self) -> int:
+        """
+        The number of combinations in the job.
+        """
+        return self.end_index - self.start_index
+
+    @property
+    def completed(self) -> int:
+        """
+        The number of combinations of finished tasks, failed ones included.
+        """
+        return self._completed
+
+    @property
+    def failed(self) -> int:
+        """
+        The number of combinations of failed tasks.
+        """
+        return self._failed
+
+    def is_finished(self) -> bool:
+        """
+        Whether every combination was handed out and its task has finished.
+
+        Returns:
+            bool: True once the job is over.
+        """
+        return self.next_index >= self.end_index and self._unfinished == 0
+
+    def get_seconds_per_combination(self) -> Optional[float]:
+        """
+        Get the typical render time of one combination.
+
+        Returns:
+            Optional[float]: The median of recent tasks, or None before the first one finished.
+        """
+        if not self._render_times:
+            return None
+        return statistics.median(self._render_times)
+
+    def get_batch_size(self) -> int:
+        """
+        Get the number of combinations for the next task.
+
+        Returns:
+            int: The batch size.
+        """
+        seconds = self.get_seconds_per_combination()
+        if seconds is None:
+            size = self.initial_batch_size
+        else:
+            size = int(self.target_task_seconds / max(seconds, 1e-3))
+
+        # near the end, split what is left so every node and queue slot gets a share
+        remaining = self.end_index - self.next_index
+        tail_size = math.ceil(remaining / (self.num_nodes * (self.queue_depth + 1)))
+        return max(1, min(size, tail_size, self.max_batch_size))
+
+    def handle_event(self, event: Dict[str, Any]) -> None:
+        """
+        Update the task states from a completion event.
+
+        Args:
+            event (Dict[str, Any]): An event returned by `ProgressTracker.update`.
+
+        Returns:
+            None
+        """
+        key = event.get("task")
+        task = self.tasks.get(key)
+        # ignore other jobs and copies that lost the race
+        if task is None or task["status"] != "pending":
+            return
+        status = event["status"]
+        if status == "started":
+            if task["queued"] > 0:
+                task["queued"] -= 1
+                self._queued -= 1
+            task["running"] += 1
+            task["nodes"].append(event["node"])
+            if task["started_at"] is None:
+                task["started_at"] = event["timestamp"]
+                self._running[key] = task
+            return
+
+        # copies on nodes declared dead were already written off
+        if event["node"] in task["nodes"]:
+            task["nodes"].remove(event["node"])
+            task["running"] = max(0, task["running"] - 1)
+        if status == "done":
+            if event["combinations"] > 0:
+                self._render_times.append(event["seconds"] / event["combinations"])
+            self._finish(key, "done")
+        elif status == "failed" and task["running"] + task["queued"] == 0:
+            # only fail the task when no other copy can still finish it
+            self._finish(key, "failed")
+
+    def handle_dead_nodes(self, nodes: List[str]) -> None:
+        """
+        Write off the copies running on dead nodes and submit their tasks again.
+
+        Lost copies do not count towards `max_copies`. A task is only submitted again
+        when no other copy is queued or running.
+
+        Args:
+            nodes (List[str]): The names of the dead nodes, as in the completion events.
+
+        Returns:
+            None
+        """
+        dead = set(nodes)
+        for key, task in list(self._running.items()):
+            lost = [node for node in task["nodes"] if node in dead]
+            if not lost:
+                continue
+            task["nodes"] = [node for node in task["nodes"] if node not in dead]
+            task["running"] = max(0, task["running"] - len(lost))
+            task["copies"] -= len(lost)
+            if task["running"] + task["queued"] == 0:
+                logger.info(f"Re-executing {key}, its node {lost[0]} is dead")
+                # the next copy to start restarts the straggler clock
+                task["started_at"] = None
+                self._running.pop(key)
+                self._lost.append(key)
+
+    def _finish(self, key: str, status: str) -> None:
+        """
+        Mark a task as done or failed.
+
+        Args:
+            key (str): The task key.
+            status (str): "done" or "failed".
+
+        Returns:
+            None
+        """
+        task = self.tasks[key]
+        task["status"] = status
+        # queued copies are skipped by the workers once the task is claimed
+        self._queued -= task["queued"]
+        self._running.pop(key, None)
+        self._unfinished -= 1
+        self._completed += task["size"]
+        if status == "failed":
+            self._failed += task["size"]
+
+    def _is_straggler(self, task: Dict[str, Any], now: float) -> bool:
+        """
+        Check whether a task runs far longer than its combinations should take.
+
+        Args:
+            task (Dict[str, Any]): The task state.
+            now (float): The current time.
+
+        Returns:
+            bool: True if the task should be re-executed.
+        """
+        if task["status"] != "pending" or task["started_at"] is None:
+            return False
+        if task["copies"] >= self.max_copies:
+            return False
+        seconds = self.get_seconds_per_combination()
+        if seconds is None:
+            # no task finished yet, e.g. every node hangs on its first one
+            limit = self.min_straggler_seconds
+        else:
+            limit = max(self.min_straggler_seconds, self.straggler_factor * seconds * task["size"])
+        return now - task["started_at"] > limit
+
+    def next_tasks(self, now: Optional[float] = None) -> List[Tuple[str, int, int]]:
+        """
+        Get the tasks to submit now to keep every node busy.
+
+        Args:
+            now (Optional[float], optional): The current time. Defaults to time.time().
+
+        Returns:
+            List[Tuple[str, int, int]]: The task key, first index and index after the last
+            one of every task to submit. Re-executed tasks keep their key.
+        """
+        now = time.time() if now is None else now
+        free_slots = self.num_nodes * self.queue_depth - self._queued
+
+        submit = []
+        # lost tasks go first, the job cannot finish without them
+        while free_slots > 0 and self._lost:
+            key = self._lost.popleft()
+            if self.tasks[key]["status"] == "pending":
+                self.recovered += 1
+                submit.append(key)
+                free_slots -= 1
+
+        while free_slots > 0 and self.next_index < self.end_index:
+            start = self.next_index
+            end = min(start + self.get_batch_size(), self.end_index)
+            self.next_index = end
+            key = get_task_key(start, end)
+            self.tasks[key] = _new_task(start, end)
+            self._unfinished += 1
+            submit.append(key)
+            free_slots -= 1
+
+        # once nothing new is left, idle capacity re-executes the slowest tasks
+        if self.next_index >= self.end_index and free_slots > 0:
+            stragglers = sorted(
+                (
+                    (key, task)
+                    for key, task in self._running.items()
+                    if self._is_straggler(task, now)
+                ),
+                key=lambda item: item[1]["started_at"],
+            )
+            for key, task in stragglers[:free_slots]:
+                logger.info(
+                    f"Re-executing straggler {key}, running for {now - task['started_at']:.0f}s"
+                )
+                self.speculated += 1
+                submit.append(key)
+
+        tasks = []
+        for key in submit:
+            task = self.tasks[key]
+            task["copies"] += 1
+            task["queued"] += 1
+            self._queued += 1
+            tasks.append((key, task["start_index"], task["end_index"]))
+        return tasks
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import threading
+import time
+
+from ..asset_cache import fetch_cached
+
+
+def test_fetch_cached_single_flight():
+    """
+    Test that concurrent requests for the same path fetch it only once.
+    """
+    calls = []
+
+    def fetch(tmp_path):
+        calls.append(tmp_path)
+        time.sleep(0.2)
+        with open(tmp_path, "w") as file:
+            file.write("data")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "assets", "asset.bin")
+        threads = [
+            threading.Thread(target=fetch_cached, args=(path, fetch)) for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        with open(path) as file:
+            assert file.read() == "data"
+        assert not [f for f in os.listdir(os.path.dirname(path)) if f.endswith(".tmp")]
+    print("============ Test Passed: test_fetch_cached_single_flight ============")
+
+
+def test_fetch_cached_failure():
+    """
+    Test that a failed fetch leaves no file behind and can be retried.
+    """
+
+    def failing_fetch(tmp_path):
+        with open(tmp_path, "w") as file:
+            file.write("partial")
+        raise IOError("connection reset")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "asset.bin")
+        try:
+            fetch_cached(path, failing_fetch)
+            assert False, "Expected the fetch to fail"
+        except IOError:
+            pass
+        assert not os.path.exists(path)
+        assert not [f for f in os.listdir(tmp_dir) if f.endswith(".tmp")]
+
+        fetch_cached(path, lambda tmp_path: open(tmp_path, "w").close())
+        assert os.path.exists(path)
+    print("============ Test Passed: test_fetch_cached_failure ============")
+
+
+if __name__ == "__main__":
+    test_fetch_cached_single_flight()
+    test_fetch_cached_failure()
+    print("============ ALL TESTS PASSED ============")
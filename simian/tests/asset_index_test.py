@@ -0,0 +1,98 @@
+import os
+import tempfile
+
+from ..asset_index import (
+    filter_asset_uids,
+    get_asset_weights,
+    load_asset_index,
+    open_asset_index,
+    record_asset_stats,
+)
+
+
+def make_index(index_path):
+    conn = open_asset_index(index_path)
+    record_asset_stats(
+        conn,
+        {
+            "uid": "cheap",
+            "status": "ok",
+            "face_count": 1000,
+            "max_texture_size": 1024,
+            "import_time": 0.5,
+        },
+    )
+    record_asset_stats(
+        conn,
+        {
+            "uid": "dense",
+            "status": "ok",
+            "face_count": 900000,
+            "max_texture_size": 8192,
+            "import_time": 30.0,
+        },
+    )
+    record_asset_stats(
+        conn, {"uid": "broken", "status": "failed", "error": "import failed"}
+    )
+    record_asset_stats(conn, {"uid": "crashed", "status": "scanning"})
+    conn.close()
+
+
+def test_record_and_load_asset_index():
+    """
+    Test that scanned rows round-trip and unfinished scans are ignored.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_path = os.path.join(tmp_dir, "asset_index.sqlite")
+        make_index(index_path)
+        asset_index = load_asset_index(index_path)
+
+    assert set(asset_index.keys()) == {"cheap", "dense", "broken"}
+    assert asset_index["dense"]["face_count"] == 900000
+    assert asset_index["broken"]["error"] == "import failed"
+    print("============ Test Passed: test_record_and_load_asset_index ============")
+
+
+def test_filter_asset_uids():
+    """
+    Test filtering uids by face count and import failures.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_path = os.path.join(tmp_dir, "asset_index.sqlite")
+        make_index(index_path)
+        asset_index = load_asset_index(index_path)
+
+    uids = ["cheap", "dense", "broken", "unscanned"]
+    assert filter_asset_uids(uids, asset_index) == ["cheap", "dense", "unscanned"]
+    assert filter_asset_uids(uids, asset_index, max_faces=100000) == [
+        "cheap",
+        "unscanned",
+    ]
+    assert filter_asset_uids(
+        uids, asset_index, max_texture_size=2048, include_unscanned=False
+    ) == ["cheap"]
+    print("============ Test Passed: test_filter_asset_uids ============")
+
+
+def test_get_asset_weights():
+    """
+    Test that cheap assets are weighted above expensive ones.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_path = os.path.join(tmp_dir, "asset_index.sqlite")
+        make_index(index_path)
+        asset_index = load_asset_index(index_path)
+
+    weights = get_asset_weights(["cheap", "dense", "unscanned"], asset_index)
+    assert len(weights) == 3
+    assert weights[0] > weights[1]
+    assert weights[2] > 0
+    print("============ Test Passed: test_get_asset_weights ============")
+
+
+if __name__ == "__main__":
+    test_record_and_load_asset_index()
+    test_filter_asset_uids()
+    test_get_asset_weights()
+    print("============ ALL TESTS PASSED ============")
@@ -0,0 +1,154 @@
+from ..autoscaler import Autoscaler, LocalProvider, get_node_key
+from ..offers import OfferSelector
+
+
+class HeartbeatClient:
+    """
+    Serves fixed heartbeat hashes and queue lengths like the Redis calls `Autoscaler` makes.
+    """
+
+    def __init__(self, heartbeats, queues):
+        self.heartbeats = heartbeats
+        self.queues = queues
+        self.commands = []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def hgetall(self, key):
+        self.commands.append(self.heartbeats.get(key, {}))
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        return commands
+
+    def llen(self, queue):
+        return self.queues.get(queue, 0)
+
+    def rpoplpush(self, source, destination):
+        if not self.queues.get(source):
+            return None
+        self.queues[source] -= 1
+        self.queues[destination] = self.queues.get(destination, 0) + 1
+        return b"task"
+
+
+def test_autoscaler_scales_up_to_target():
+    """
+    Test that nodes are rented to finish the remaining work within the target time.
+    """
+    provider = LocalProvider()
+    client = HeartbeatClient({}, {"celery": 100})
+    autoscaler = Autoscaler(provider, client, max_nodes=8, target_seconds=100.0)
+    autoscaler.add_nodes(provider.rent(1), now=0.0)
+
+    # 1000 combinations at 1 per second per node need 10 nodes, capped at 8
+    changes = autoscaler.step(1000, node_rate=1.0, now=10.0)
+    assert len(changes["rented"]) == 7 and changes["terminated"] == []
+    assert len(autoscaler.nodes) == 8
+
+    # 200 combinations need only 2 nodes, but starting nodes are never terminated
+    changes = autoscaler.step(200, node_rate=1.0, now=20.0)
+    assert changes == {"rented": [], "terminated": [], "dead": []}
+    print("============ Test Passed: test_autoscaler_scales_up_to_target ============")
+
+
+def test_autoscaler_terminates_idle_and_dead_nodes():
+    """
+    Test that dead nodes and idle surplus nodes with empty queues are terminated, busy ones never.
+    """
+    provider = LocalProvider()
+    nodes = provider.rent(5)
+    now = 10000.0
+    client = HeartbeatClient(
+        {
+            get_node_key("1"): {b"last_seen": str(now), b"busy": b"1", b"state_since": b"0"},
+            get_node_key("2"): {b"last_seen": str(now), b"busy": b"0", b"state_since": b"0"},
+            get_node_key("3"): {
+                b"last_seen": str(now), b"busy": b"0", b"state_since": b"0", b"hostname": b"celery@c"
+            },
+            get_node_key("4"): {
+                b"last_seen": b"0", b"busy": b"1", b"state_since": b"0", b"hostname": b"celery@d"
+            },
+            get_node_key("5"): {
+                b"last_seen": str(now), b"busy": b"0", b"state_since": b"0", b"uploads": b"3"
+            },
+        },
+        {"celery": 0, "celery@c.dq2": 1, "celery@d.dq2": 2},
+    )
+    autoscaler = Autoscaler(provider, client, max_nodes=4)
+    autoscaler.add_nodes(nodes, now=0.0)
+
+    states = autoscaler.get_node_states(now)
+    assert [states[str(i)]["state"] for i in range(1, 6)] == ["busy", "idle", "idle", "dead", "idle"]
+
+    # one task is left: keep the busy node, drop the dead one and the idle one
+    # whose own queue is empty, keep the idle one that still has a routed task
+    # and the idle one that still uploads
+    changes = autoscaler.step(1, now=now)
+    assert sorted(node["instance_id"] for node in changes["terminated"]) == [2, 4]
+    assert [node["instance_id"] for node in changes["dead"]] == [4]
+    # tasks routed to the dead node go back to the shared queue
+    assert client.queues == {"celery": 2, "celery@c.dq2": 1, "celery@d.dq2": 0}
+    assert changes["rented"] == []
+    assert sorted(node["instance_id"] for node in autoscaler.nodes) == [1, 3, 5]
+
+    autoscaler.shutdown()
+    assert autoscaler.nodes == [] and len(provider.terminated) == 5
+    print("============ Test Passed: test_autoscaler_terminates_idle_and_dead_nodes ============")
+
+
+def test_autoscaler_drops_slow_nodes_and_rents_best_value():
+    """
+    Test that offers are rented best value first, and that an idle node benchmarking far
+    below its offer type is replaced and recorded.
+    """
+    offers = [
+        {"id": 1, "gpu_name": "RTX 3090", "num_gpus": 1, "dph_total": 0.2},
+        {"id": 2, "gpu_name": "RTX 4090", "num_gpus": 1, "dph_total": 0.4},
+        {"id": 3, "gpu_name": "A100", "num_gpus": 1, "dph_total": 1.0},
+        {"id": 4, "gpu_name": "RTX 3060", "num_gpus": 1, "dph_total": 0.1},
+    ]
+    selector = OfferSelector(path=None, min_benchmarks=1)
+    selector.record_renders(offers[0], 100, 1.0)
+    selector.record_renders(offers[1], 500, 1.0)
+    selector.record_benchmark(offers[1], 40.0)
+    provider = LocalProvider(offers=offers, selector=selector)
+
+    # the 4090, then the unmeasured 3060 ranked with the median at a lower price
+    nodes = provider.rent(2)
+    assert [node["offer"]["id"] for node in nodes] == [2, 4]
+
+    client = HeartbeatClient(
+        {
+            get_node_key("1"): {
+                b"last_seen": b"3600", b"busy": b"0", b"state_since": b"0",
+                b"combinations": b"30", b"benchmark_fps": b"5.0",
+            },
+            get_node_key("2"): {
+                b"last_seen": b"3600", b"busy": b"1", b"state_since": b"0", b"benchmark_fps": b"1.0",
+            },
+        },
+        {"celery": 5},
+    )
+    autoscaler = Autoscaler(provider, client, max_nodes=2)
+    autoscaler.add_nodes(nodes, now=0.0)
+
+    # the slow 4090 machine is replaced by the cheaper of two equally ranked offers,
+    # and the 3060 sets what its type is expected to do
+    changes = autoscaler.step(10, now=3600.0)
+    assert [node["instance_id"] for node in changes["terminated"]] == [1]
+    assert [node["offer"]["id"] for node in changes["rented"]] == [1]
+    assert provider.excluded_offers == {2}
+    assert selector.get_expected_fps(offers[3]) == 1.0
+
+    # 30 combinations in an hour at 0.4 per hour
+    assert abs(selector.stats["1x RTX 4090"]["renders_per_dollar"] - (500 + 0.3 * (75 - 500))) < 1e-9
+    print("============ Test Passed: test_autoscaler_drops_slow_nodes_and_rents_best_value ============")
+
+
+if __name__ == "__main__":
+    test_autoscaler_scales_up_to_target()
+    test_autoscaler_terminates_idle_and_dead_nodes()
+    test_autoscaler_drops_slow_nodes_and_rents_best_value()
+    print("============ ALL TESTS PASSED ============")
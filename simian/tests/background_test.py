@@ -1,8 +1,11 @@
 import os
+import tempfile
 
 from unittest.mock import patch, MagicMock
 from ..background import (
     get_hdri_path,
+    get_hdri_tier,
+    get_hdri_tier_url,
     get_background,
     set_background,
     create_photosphere,
@@ -27,6 +30,27 @@ def test_get_hdri_path():
     print("============ Test Passed: get_hdri_path ============")
 
 
+def test_hdri_tiers():
+    """
+    Test picking a tier from the render width and rewriting Poly Haven urls.
+    """
+    assert get_hdri_tier(512) == "1k"
+    assert get_hdri_tier(1024) == "2k"
+    assert get_hdri_tier(1920) == "4k"
+    assert get_hdri_tier(7680) == "8k"
+
+    url = "https://dl.polyhaven.org/file/ph-assets/HDRIs/hdr/8k/studio_4k_room_8k.hdr"
+    assert (
+        get_hdri_tier_url(url, "2k")
+        == "https://dl.polyhaven.org/file/ph-assets/HDRIs/hdr/2k/studio_4k_room_2k.hdr"
+    )
+    assert get_hdri_tier_url("http://example.com/image.hdr", "2k") is None
+
+    combination = {"background": {"id": "123", "from": "test_dataset"}}
+    assert get_hdri_path("/fake/path", combination, "2k") == "/fake/path/test_dataset/123_2k.hdr"
+    print("============ Test Passed: test_hdri_tiers ============")
+
+
 def test_get_background():
     """
     Test the get_background function.
@@ -38,19 +62,23 @@ def test_get_background():
             "from": "test_dataset",
         }
     }
-    hdri_path = "/fake/path"
 
-    with patch("os.makedirs"), patch("os.path.exists", return_value=False), patch(
-        "requests.get"
-    ) as mock_get, patch("builtins.open", new_callable=MagicMock):
+    with tempfile.TemporaryDirectory() as hdri_path, patch(
+        "requests.Session.get"
+    ) as mock_get:
         mock_response = MagicMock()
-        mock_response.content = b"fake data"
+        mock_response.iter_content.return_value = [b"fake data"]
         mock_get.return_value = mock_response
 
+        get_background(hdri_path, combination)
+        # A second call is served from disk
         get_background(hdri_path, combination)
         print("get_background called")
 
-        mock_get.assert_called_with("http://example.com/image.hdr")
+        assert mock_get.call_count == 1
+        assert mock_get.call_args[0][0] == "http://example.com/image.hdr"
+        with open(get_hdri_path(hdri_path, combination), "rb") as file:
+            assert file.read() == b"fake data"
         print("============ Test Passed: test_get_background ============")
 
 
@@ -190,6 +218,7 @@ def test_create_photosphere_material():
 # Run tests if this file is executed as a script
 if __name__ == "__main__":
     test_get_hdri_path()
+    test_hdri_tiers()
     test_get_background()
     # test_set_background()
     test_create_photosphere()
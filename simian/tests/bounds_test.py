@@ -0,0 +1,79 @@
+import math
+
+from ..bounds import (
+    get_hierarchy_bounds,
+    get_object_bounds,
+    invalidate_bounds,
+)
+from ..scene import initialize_scene
+import bpy
+
+
+def test_tight_and_loose_bounds():
+    """
+    Test that tight bounds of a rotated cube are exact and loose bounds enclose them.
+    """
+    initialize_scene()
+    bpy.ops.mesh.primitive_cube_add(size=2, location=(0, 0, 0))
+    cube = bpy.context.active_object
+    cube.rotation_euler = (0, 0, math.radians(45))
+
+    tight_min, tight_max = get_object_bounds(cube, tight=True)
+    loose_min, loose_max = get_object_bounds(cube, tight=False)
+
+    expected = math.sqrt(2)
+    assert abs(tight_max[0] - expected) < 0.001
+    assert abs(tight_max[2] - 1.0) < 0.001
+    assert all(loose_max >= tight_max - 0.001)
+    assert all(loose_min <= tight_min + 0.001)
+    print("============ Test Passed: test_tight_and_loose_bounds ============")
+
+
+def test_bounds_follow_transform_without_update():
+    """
+    Test that cached bounds are refreshed when the transform changes.
+    """
+    initialize_scene()
+    bpy.ops.mesh.primitive_cube_add(size=2, location=(0, 0, 0))
+    cube = bpy.context.active_object
+
+    bbox_min, _ = get_object_bounds(cube)
+    assert abs(bbox_min[0] + 1.0) < 0.001
+
+    # No view layer update between moving the object and reading its bounds
+    cube.location.x = 5
+    bbox_min, _ = get_object_bounds(cube)
+    assert abs(bbox_min[0] - 4.0) < 0.001
+
+    # In place vertex edits need an explicit invalidation
+    for vertex in cube.data.vertices:
+        vertex.co.x *= 2
+    invalidate_bounds(cube)
+    bbox_min, _ = get_object_bounds(cube)
+    assert abs(bbox_min[0] - 3.0) < 0.001
+    print("============ Test Passed: test_bounds_follow_transform_without_update ============")
+
+
+def test_hierarchy_bounds():
+    """
+    Test the bounds of a parented hierarchy.
+    """
+    initialize_scene()
+    bpy.ops.object.empty_add(location=(1, 0, 0))
+    empty = bpy.context.active_object
+    bpy.ops.mesh.primitive_cube_add(size=2, location=(0, 0, 0))
+    cube = bpy.context.active_object
+    cube.parent = empty
+    cube.location = (2, 0, 0)
+
+    bbox_min, bbox_max = get_hierarchy_bounds(empty)
+    assert abs(bbox_min[0] - 1.0) < 0.001
+    assert abs(bbox_max[0] - 4.0) < 0.001
+    print("============ Test Passed: test_hierarchy_bounds ============")
+
+
+if __name__ == "__main__":
+    test_tight_and_loose_bounds()
+    test_bounds_follow_transform_without_update()
+    test_hierarchy_bounds()
+    print("============ ALL TESTS PASSED ============")
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import time
+
+from ..cache_manager import (
+    evict_to_quota,
+    get_cache_stats,
+    open_cache_ledger,
+    pin_cache_paths,
+    record_cache_access,
+    register_cache_store,
+    unpin_cache_paths,
+)
+
+
+def make_file(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(b"\0" * size)
+    return path
+
+
+def test_lru_eviction_with_pins():
+    """
+    Test that the least recently used unpinned files are evicted first.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn = open_cache_ledger(os.path.join(tmp_dir, "ledger.sqlite"))
+        old = make_file(os.path.join(tmp_dir, "objaverse", "old.glb"), 100)
+        pinned = make_file(os.path.join(tmp_dir, "materials", "wood", "Diffuse.jpg"), 100)
+        new = make_file(os.path.join(tmp_dir, "backgrounds", "new.hdr"), 100)
+
+        record_cache_access(conn, old, "objaverse", hit=False)
+        time.sleep(0.01)
+        record_cache_access(conn, pinned, "materials", hit=False)
+        time.sleep(0.01)
+        record_cache_access(conn, new, "backgrounds", hit=True)
+
+        # Pinning the directory protects the texture even though it is older than new.hdr
+        pin_cache_paths(conn, [os.path.dirname(pinned)], "job-1")
+        evicted = evict_to_quota(conn, 150)
+
+        assert evicted == [os.path.abspath(old), os.path.abspath(new)]
+        assert os.path.exists(pinned)
+        assert not os.path.exists(old)
+
+        stats = get_cache_stats(conn)
+        assert stats["hits"] == 1
+        assert stats["misses"] == 2
+        assert stats["evictions"] == 2
+        assert stats["evicted_bytes"] == 200
+        assert stats["size_bytes"] == 100
+
+        unpin_cache_paths(conn, "job-1")
+        assert evict_to_quota(conn, 0) == [os.path.abspath(pinned)]
+        conn.close()
+    print("============ Test Passed: test_lru_eviction_with_pins ============")
+
+
+def test_register_cache_store():
+    """
+    Test that files cached before the ledger existed are tracked.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn = open_cache_ledger(os.path.join(tmp_dir, "ledger.sqlite"))
+        root = os.path.join(tmp_dir, "objaverse")
+        make_file(os.path.join(root, "glbs", "000-000", "a.glb"), 10)
+        make_file(os.path.join(root, "glbs", "000-000", "b.glb.tmp"), 10)
+
+        assert register_cache_store(conn, root, "objaverse") == 1
+        assert register_cache_store(conn, root, "objaverse") == 0
+        assert get_cache_stats(conn)["stores"] == {"objaverse": 10}
+        conn.close()
+    print("============ Test Passed: test_register_cache_store ============")
+
+
+if __name__ == "__main__":
+    test_lru_eviction_with_pins()
+    test_register_cache_store()
+    print("============ ALL TESTS PASSED ============")
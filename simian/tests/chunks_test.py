@@ -0,0 +1,64 @@
+import os
+
+from ..chunks import get_chunk_path, get_chunk_upload_name, get_join_command, split_frame_range
+
+
+def test_split_frame_range():
+    """
+    Test that chunks cover the frame range exactly once and differ in length by at most one frame.
+    """
+    chunks = split_frame_range(1, 300, 4)
+    assert chunks == [(1, 75), (76, 150), (151, 225), (226, 300)]
+
+    chunks = split_frame_range(0, 64, 3)
+    assert chunks == [(0, 21), (22, 43), (44, 64)]
+
+    # More chunks than frames gives one frame per chunk
+    assert split_frame_range(1, 3, 8) == [(1, 1), (2, 2), (3, 3)]
+    assert split_frame_range(5, 9, 1) == [(5, 9)]
+
+    try:
+        split_frame_range(10, 9, 2)
+        assert False, "Expected ValueError for an empty range"
+    except ValueError:
+        pass
+    print("============ Test Passed: test_split_frame_range ============")
+
+
+def test_get_chunk_path():
+    """
+    Test that chunk paths sort in playback order.
+    """
+    paths = [
+        get_chunk_path("renders", 7, frame_range)
+        for frame_range in split_frame_range(1, 300, 4)
+    ]
+    assert paths[0] == os.path.join("renders", "7_chunk_00001_00075.mp4")
+    assert paths == sorted(paths)
+    print("============ Test Passed: test_get_chunk_path ============")
+
+
+def test_get_join_command():
+    """
+    Test that the join command lists the uploaded chunk names in playback order.
+    """
+    frame_ranges = split_frame_range(1, 300, 3)
+    assert get_chunk_upload_name(7, (1, 100)) == "00007_chunk_00001_00100.mp4"
+    assert get_join_command(7, frame_ranges) == (
+        "python -m simian.chunks --output 00007.mp4 "
+        "00007_chunk_00001_00100.mp4 00007_chunk_00101_00200.mp4 00007_chunk_00201_00300.mp4"
+    )
+
+    # Hugging Face uploads keep the local chunk file names
+    assert get_chunk_upload_name(7, (1, 100), "hf") == "7_chunk_00001_00100.mp4"
+    assert get_join_command(7, frame_ranges[:1], "hf") == (
+        "python -m simian.chunks --output 7.mp4 7_chunk_00001_00100.mp4"
+    )
+    print("============ Test Passed: test_get_join_command ============")
+
+
+if __name__ == "__main__":
+    test_split_frame_range()
+    test_get_chunk_path()
+    test_get_join_command()
+    print("============ ALL TESTS PASSED ============")
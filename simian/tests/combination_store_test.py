@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+from ..combination_store import (
+    get_stored_combination,
+    get_stored_combinations,
+    load_combination_store,
+    publish_combinations,
+)
+
+
+def test_combination_store_round_trip():
+    """
+    Test that a published combinations file is built into a store once and read by index.
+    """
+    combinations = [{"index": i, "objects": [{"uid": f"uid{i}"}]} for i in range(25)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        combinations_file = os.path.join(tmp_dir, "combinations.json")
+        with open(combinations_file, "w") as file:
+            json.dump({"seed": 1, "count": 25, "combinations": combinations}, file)
+
+        spec = publish_combinations(
+            combinations_file, os.path.join(tmp_dir, "shared", "combinations.json")
+        )
+        assert spec["count"] == 25
+        assert spec["job_id"] == spec["version"][:12]
+
+        cache_path = lambda *parts: os.path.join(tmp_dir, "cache", *parts)
+        with patch("simian.combination_store.get_cache_path", new=cache_path):
+            store_path = load_combination_store(spec)
+            # A second load reuses the built store
+            assert load_combination_store(spec) == store_path
+
+        assert get_stored_combination(store_path, 7) == combinations[7]
+        stored = get_stored_combinations(store_path, 20, 30)
+        assert [index for index, _ in stored] == [20, 21, 22, 23, 24]
+        assert stored[0][1] == combinations[20]
+
+        try:
+            get_stored_combination(store_path, 25)
+            assert False, "Expected IndexError for a missing index"
+        except IndexError:
+            pass
+    print("============ Test Passed: test_combination_store_round_trip ============")
+
+
+def test_combination_store_version_mismatch():
+    """
+    Test that a store is not built from a file that changed after it was published.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        combinations_file = os.path.join(tmp_dir, "combinations.json")
+        with open(combinations_file, "w") as file:
+            json.dump({"combinations": [{"index": 0}]}, file)
+        spec = publish_combinations(combinations_file, combinations_file)
+
+        with open(combinations_file, "w") as file:
+            json.dump({"combinations": [{"index": 1}]}, file)
+
+        cache_path = lambda *parts: os.path.join(tmp_dir, "cache", *parts)
+        with patch("simian.combination_store.get_cache_path", new=cache_path):
+            try:
+                load_combination_store(spec)
+                assert False, "Expected ValueError for a changed file"
+            except ValueError:
+                pass
+    print("============ Test Passed: test_combination_store_version_mismatch ============")
+
+
+if __name__ == "__main__":
+    test_combination_store_round_trip()
+    test_combination_store_version_mismatch()
+    print("============ ALL TESTS PASSED ============")
@@ -33,6 +33,7 @@ def mock_parse_args(*args, **kwargs):
 with patch("argparse.ArgumentParser.parse_args", new=mock_parse_args):
     from ..combiner import (
         read_json_file,
+        generate_combination,
         generate_combinations,
         generate_stage_captions,
         generate_orientation_caption,
@@ -433,6 +434,31 @@ def test_generate_combinations():
         ), "Pitch is out of the specified range."
         print("============ Test Passed: test_generate_combinations ============")
 
+    # Combinations seeded per index can be generated on their own, in any order
+    per_index = generate_combinations(camera_data, 4, seed, dataset_names, dataset_weights,
+                                      object_data, dataset_dict, captions_data,
+                                      background_dict, background_names,
+                                      background_weights, texture_data,
+                                      per_index_seed=True)
+    inputs = {
+        "camera_data": camera_data,
+        "dataset_names": dataset_names,
+        "dataset_weights": dataset_weights,
+        "object_data": object_data,
+        "dataset_dict": dataset_dict,
+        "captions_data": captions_data,
+        "background_dict": background_dict,
+        "background_names": background_names,
+        "background_weights": background_weights,
+        "texture_data": texture_data,
+    }
+    with patch("simian.combiner._get_generator_inputs", return_value=inputs):
+        for index in [3, 0, 2]:
+            assert (
+                generate_combination(index, seed, {}) == per_index["combinations"][index]
+            ), "generate_combination does not match the per index seeded dataset."
+    print("============ Test Passed: test_generate_combination ============")
+
 
 
 def test_generate_stage_captions():
@@ -0,0 +1,51 @@
+from ..datablock_cache import DatablockCache
+from ..scene import initialize_scene, reset_scene
+import bpy
+
+
+def test_datablock_cache_survives_reset():
+    """
+    Test that cached datablocks survive a scene reset and uncached ones are purged.
+    """
+    initialize_scene()
+    cache = DatablockCache(budget_bytes=1024 * 1024 * 1024)
+
+    cached = bpy.data.images.new("cached", 64, 64)
+    bpy.data.images.new("uncached", 64, 64)
+    cache.put(("image", "cached"), cached)
+
+    reset_scene()
+
+    assert "uncached" not in bpy.data.images
+    assert cache.get(("image", "cached")) == bpy.data.images["cached"]
+    assert cache.get(("image", "missing")) is None
+    assert cache.hits == 1
+    assert cache.misses == 1
+    print("============ Test Passed: test_datablock_cache_survives_reset ============")
+
+
+def test_datablock_cache_trim():
+    """
+    Test that the least recently used datablocks are released when over budget.
+    """
+    initialize_scene()
+    # Each 64x64 byte image with 4 channels is estimated at 16384 bytes
+    cache = DatablockCache(budget_bytes=40000)
+
+    for name in ["first", "second", "third"]:
+        cache.put(("image", name), bpy.data.images.new(name, 64, 64))
+    # Touch the first image so the second one is the least recently used
+    cache.get(("image", "first"))
+
+    assert cache.trim() == 1
+    assert "second" not in bpy.data.images
+    assert "first" in bpy.data.images
+    assert "third" in bpy.data.images
+    assert cache.size_bytes <= cache.budget_bytes
+    print("============ Test Passed: test_datablock_cache_trim ============")
+
+
+if __name__ == "__main__":
+    test_datablock_cache_survives_reset()
+    test_datablock_cache_trim()
+    print("============ ALL TESTS PASSED ============")
@@ -0,0 +1,121 @@
+import contextlib
+import json
+from unittest.mock import patch
+
+from .. import distributed
+from ..distributed import start_submission, submit_tasks
+
+
+class SubmitApp:
+    """
+    Records the producers acquired and the groups sent like the celery calls of `submit_tasks`.
+    """
+
+    def __init__(self):
+        self.producers = []
+        self.groups = []
+        self.consumed = 0
+
+    @contextlib.contextmanager
+    def producer_or_acquire(self):
+        producer = object()
+        self.producers.append(producer)
+        yield producer
+
+    def task_args(self, num_tasks, fail_at=None):
+        """Yield task arguments, counting how many were taken."""
+        for i in range(num_tasks):
+            if i == fail_at:
+                raise ConnectionError("broker went away")
+            self.consumed += 1
+            yield {"combination_index": i}
+
+    def group(self, signatures):
+        app = self
+
+        class Group:
+            def apply_async(self, producer=None, **options):
+                app.groups.append(
+                    {
+                        "size": len(signatures),
+                        "producer": producer,
+                        "options": options,
+                        "consumed": app.consumed,
+                    }
+                )
+
+                class GroupResult:
+                    results = list(signatures)
+
+                return GroupResult()
+
+        return Group()
+
+
+class SubmitTask:
+    def s(self, func_name, args):
+        return func_name, json.loads(args)
+
+
+class SubmitDistributask:
+    def __init__(self):
+        self.app = SubmitApp()
+        self.call_function_task = SubmitTask()
+
+
+def test_submit_tasks_in_chunks():
+    """
+    Test that tasks are sent in groups through one producer, taking the arguments lazily.
+    """
+    distributask = SubmitDistributask()
+    app = distributask.app
+    with patch.object(distributed, "group", app.group):
+        results = submit_tasks(distributask, "run_job", app.task_args(2500), chunk_size=1000)
+
+    assert len(app.producers) == 1
+    assert [sent["size"] for sent in app.groups] == [1000, 1000, 500]
+    assert all(sent["producer"] is app.producers[0] for sent in app.groups)
+    assert all(sent["options"] == {} for sent in app.groups)
+    # each chunk is sent before the next one is taken from the generator
+    assert [sent["consumed"] for sent in app.groups] == [1000, 2000, 2500]
+    assert results == [("run_job", {"combination_index": i}) for i in range(2500)]
+
+    with patch.object(distributed, "group", app.group):
+        submit_tasks(distributask, "run_job", [{"combination_index": 0}], queue="node-1.dq2")
+    assert app.groups[-1]["options"] == {"queue": "node-1.dq2"}
+    print("============ Test Passed: test_submit_tasks_in_chunks ============")
+
+
+def test_start_submission_raises_errors():
+    """
+    Test that the submission future completes with the results, or raises the error of the thread.
+    """
+    distributask = SubmitDistributask()
+    app = distributask.app
+    with patch.object(distributed, "group", app.group):
+        submission, results = start_submission(
+            distributask, "run_job", app.task_args(30), chunk_size=10
+        )
+        assert submission.result(timeout=5) == results
+    assert len(results) == 30
+
+    distributask = SubmitDistributask()
+    app = distributask.app
+    with patch.object(distributed, "group", app.group):
+        submission, results = start_submission(
+            distributask, "run_job", app.task_args(30, fail_at=15), chunk_size=10
+        )
+        try:
+            submission.result(timeout=5)
+            assert False, "Expected the submission error"
+        except ConnectionError:
+            pass
+    # the chunk sent before the error is still recorded
+    assert len(results) == 10
+    print("============ Test Passed: test_start_submission_raises_errors ============")
+
+
+if __name__ == "__main__":
+    test_submit_tasks_in_chunks()
+    test_start_submission_raises_errors()
+    print("============ ALL TESTS PASSED ============")
@@ -0,0 +1,128 @@
+import signal
+import sys
+
+from ..ledger import (
+    classify_error,
+    get_failure_ledger,
+    get_output_key,
+    get_output_status,
+    get_rendered_outputs,
+    mark_rendered,
+    record_failure,
+    run_render,
+)
+
+
+class LedgerClient:
+    """
+    Keeps hashes and sets in memory like the Redis calls of the failure ledger.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.results = []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        results, self.results = self.results, []
+        return results
+
+    def hincrby(self, key, field, amount=1):
+        hash_ = self.data.setdefault(key, {})
+        hash_[field] = hash_.get(field, 0) + amount
+        self.results.append(hash_[field])
+
+    def hset(self, key, field, value):
+        self.data.setdefault(key, {})[field] = value
+        self.results.append(1)
+
+    def hgetall(self, key):
+        self.results.append(dict(self.data.get(key, {})))
+
+    def sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(members)
+        self.results.append(len(members))
+
+    def sismember(self, key, member):
+        self.results.append(member in self.data.get(key, set()))
+
+    def smembers(self, key):
+        self.results.append(set(self.data.get(key, set())))
+
+    def expire(self, key, seconds):
+        self.results.append(True)
+
+
+def test_classify_error():
+    """
+    Test that render failures are classified from their exit code and output.
+    """
+    assert classify_error(None, "") == "timeout"
+    assert classify_error(-signal.SIGKILL, "") == "memory"
+    assert classify_error(1, "requests.exceptions.ConnectionError: Max retries exceeded") == "download"
+    assert classify_error(1, "RuntimeError: Failed to import object.glb") == "asset"
+    assert classify_error(-signal.SIGSEGV, "Segmentation fault") == "crash"
+    # a crash while importing is not the asset's fault
+    assert classify_error(-signal.SIGSEGV, "INFO: Loading glTF: Failed to import object.glb") == "crash"
+    assert classify_error(1, "ValueError: Invalid value, glTF extension is not a valid") == "render"
+    assert classify_error(1, "KeyError: 'stage'") == "render"
+    assert get_output_key(7) == "7" and get_output_key(7, [0, 30]) == "7:0-30"
+    print("============ Test Passed: test_classify_error ============")
+
+
+def test_run_render_retries():
+    """
+    Test that transient errors are retried and other errors fail on the first attempt.
+    """
+    assert run_render([sys.executable, "-c", "print('ok')"]) is None
+
+    failure = run_render(
+        [sys.executable, "-c", "raise RuntimeError('Failed to import model')"], retry_delay=0.0
+    )
+    assert failure["error"] == "asset" and failure["attempts"] == 1
+    assert "Failed to import model" in failure["message"]
+
+    failure = run_render(
+        [sys.executable, "-c", "import time; time.sleep(5)"], timeout=0.5, retry_delay=0.0
+    )
+    assert failure["error"] == "timeout" and failure["attempts"] == 2
+    print("============ Test Passed: test_run_render_retries ============")
+
+
+def test_failure_ledger():
+    """
+    Test that bad assets are quarantined at once, transient errors after repeated failures.
+    """
+    client = LedgerClient()
+    assert get_output_status(client, "job", "1") is None
+
+    mark_rendered(client, "job", "1")
+    assert get_output_status(client, "job", "1") == "rendered"
+
+    asset_failure = {"error": "asset", "message": "Failed to import", "attempts": 1}
+    assert record_failure(client, "job", "2", asset_failure, node="a")
+    assert get_output_status(client, "job", "2") == "quarantined"
+
+    timeout_failure = {"error": "timeout", "message": "", "attempts": 2}
+    assert not record_failure(client, "job", "3", timeout_failure, node="a")
+    assert get_output_status(client, "job", "3") is None
+    assert record_failure(client, "job", "3", timeout_failure, node="b")
+
+    ledger = get_failure_ledger(client, "job")
+    assert sorted(ledger) == ["2", "3"]
+    assert ledger["2"]["failures"] == 1 and ledger["2"]["error"] == "asset"
+    assert ledger["3"]["failures"] == 2 and ledger["3"]["node"] == "b"
+    assert ledger["3"]["quarantined"]
+
+    mark_rendered(client, "job", get_output_key(4, [1, 32]))
+    assert get_rendered_outputs(client, "job") == {"1", "4:1-32"}
+    print("============ Test Passed: test_failure_ledger ============")
+
+
+if __name__ == "__main__":
+    test_classify_error()
+    test_run_render_retries()
+    test_failure_ledger()
+    print("============ ALL TESTS PASSED ============")
@@ -0,0 +1,87 @@
+import time
+
+from ..locality import LocalityRouter, get_combination_assets, order_by_assets
+
+
+def make_combination(background_id, material, uids):
+    return {
+        "background": {"id": background_id, "name": background_id},
+        "stage": {"material": {"name": material}},
+        "objects": [{"uid": uid} for uid in uids],
+    }
+
+
+def test_order_by_assets():
+    """
+    Test that combinations sharing a background and stage material end up next to each other.
+    """
+    combinations = [
+        make_combination("b", "wood", ["1"]),
+        make_combination("a", "stone", ["2"]),
+        make_combination("b", "wood", ["3"]),
+        make_combination("a", "stone", ["1"]),
+    ]
+    assert get_combination_assets(combinations[0]) == {"hdri:b", "material:wood", "object:1"}
+    assert order_by_assets(combinations) == [3, 1, 0, 2]
+    print("============ Test Passed: test_order_by_assets ============")
+
+
+def test_locality_router():
+    """
+    Test that tasks go to the node caching most of their assets, within its routed limit.
+    """
+    router = LocalityRouter(None, max_routed=1)
+    router.nodes = {
+        "node-a": {"hostname": "celery@a", "last_seen": time.time(), "assets": {"hdri:b", "object:1"}},
+        "node-b": {"hostname": "celery@b", "last_seen": time.time(), "assets": {"object:3"}},
+        "node-c": {"hostname": "celery@c", "last_seen": 0.0, "assets": {"hdri:c"}},
+    }
+    router._refreshed_at = time.time()
+
+    assets = get_combination_assets(make_combination("b", "wood", ["3"]))
+    # the cached background outweighs the cached object
+    assert router.route("0-1", assets) == "celery@a"
+    # node-a is at its limit, so the next task goes to the next best node
+    assert router.route("1-2", assets) == "celery@b"
+    # no node caches anything of this task, stale nodes are skipped
+    assert router.route("2-3", get_combination_assets(make_combination("c", "", []))) is None
+
+    router.handle_event({"task": "0-1", "status": "done"})
+    assert router.route("3-4", assets) == "celery@a"
+    assert router.routed == 3
+    print("============ Test Passed: test_locality_router ============")
+
+
+def test_locality_router_stranded_tasks():
+    """
+    Test that routed tasks that did not start on a dead or busy node are handed back.
+    """
+    router = LocalityRouter(None, max_routed=2, start_timeout=60.0)
+    router.nodes = {
+        "node-a": {"hostname": "celery@a", "last_seen": time.time(), "assets": {"object:1"}},
+        "node-b": {"hostname": "celery@b", "last_seen": time.time(), "assets": {"object:2"}},
+    }
+    router._refreshed_at = time.time()
+    now = time.time()
+
+    assert router.route("0-1", {"object:1"}) == "celery@a"
+    assert router.route("1-2", {"object:1"}) == "celery@a"
+    assert router.route("2-3", {"object:2"}) == "celery@b"
+    router.handle_event({"task": "0-1", "status": "started"})
+    assert router.get_stranded(now=now) == []
+
+    # the started task on node-a is lost with it, the waiting one is handed back
+    assert router.get_stranded(["node-a"], now=now) == ["1-2"]
+    assert router.route("3-4", {"object:1"}) is None
+    # the task waiting on node-b for too long is handed back once
+    assert router.get_stranded(now=now + 61.0) == ["2-3"]
+    assert router.get_stranded(now=now + 120.0) == []
+    assert router.route("4-5", {"object:2"}) == "celery@b"
+    print("============ Test Passed: test_locality_router_stranded_tasks ============")
+
+
+if __name__ == "__main__":
+    test_order_by_assets()
+    test_locality_router()
+    test_locality_router_stranded_tasks()
+    print("============ ALL TESTS PASSED ============")
@@ -0,0 +1,132 @@
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import bpy
+
+from .. import lod
+from ..lod import (
+    apply_lod,
+    apply_texture_budget,
+    get_lod_path,
+    get_sample_frames,
+    get_texture_budget,
+    get_triangle_budget,
+)
+from ..scene import initialize_scene
+
+
+def test_get_triangle_budget():
+    """
+    Test that the triangle budget grows with the covered area and is a power of two.
+    """
+    # 0.5 faces per pixel of a 100 pixel square is 5000, rounded down to 4096
+    assert get_triangle_budget(100.0) == 4096
+    assert get_triangle_budget(1000.0) == 1 << 18
+    assert get_triangle_budget(100.0, faces_per_pixel=2.0) == 16384
+    # small or hidden objects keep the minimum
+    assert get_triangle_budget(0.0) == 512
+    assert get_triangle_budget(10.0) == 512
+    assert get_triangle_budget(10.0, min_faces=100) == 64
+    for coverage in [1.0, 37.0, 250.0, 1920.0]:
+        budget = get_triangle_budget(coverage)
+        assert budget & (budget - 1) == 0
+        assert budget <= max(512, 0.5 * coverage * coverage)
+    print("============ Test Passed: test_get_triangle_budget ============")
+
+
+def test_get_sample_frames():
+    """
+    Test that sampled frames span the frame range.
+    """
+    scene = SimpleNamespace(frame_start=1, frame_end=65)
+    assert get_sample_frames(scene) == [1, 17, 33, 49, 65]
+    assert get_sample_frames(scene, samples=2) == [1, 65]
+    assert get_sample_frames(SimpleNamespace(frame_start=5, frame_end=5)) == [5]
+    assert get_sample_frames(SimpleNamespace(frame_start=0, frame_end=2), samples=5) == [0, 1, 2]
+    print("============ Test Passed: test_get_sample_frames ============")
+
+
+def test_get_lod_path():
+    """
+    Test that decimated variants are cached per uid, budget and scale factor.
+    """
+    path = get_lod_path("uid", 1024, 1.5)
+    assert path.endswith("lod_1024_1.5.blend")
+    assert "uid" in path
+    assert path != get_lod_path("uid", 2048, 1.5)
+    assert path != get_lod_path("uid", 1024, 2.0)
+    print("============ Test Passed: test_get_lod_path ============")
+
+
+def test_apply_lod_shares_decimated_mesh():
+    """
+    Test that linked duplicates with the same budget end up sharing one decimated mesh.
+    """
+    initialize_scene()
+    bpy.ops.mesh.primitive_uv_sphere_add(segments=64, ring_count=32)
+    source = bpy.context.active_object
+    duplicate = source.copy()
+    bpy.context.scene.collection.objects.link(duplicate)
+    object_data = {"uid": "sphere", "scale": {"factor": 1.0}}
+    all_objects = [{source: object_data}, {duplicate: object_data}]
+
+    with tempfile.TemporaryDirectory() as tmp_dir, patch.object(lod, "PREPROCESSED_PATH", tmp_dir):
+        apply_lod(all_objects, coverage={source.name: 10.0, duplicate.name: 10.0})
+
+    assert source.data == duplicate.data
+    assert len(source.data.polygons) <= 512
+    print("============ Test Passed: test_apply_lod_shares_decimated_mesh ============")
+
+
+def test_get_texture_budget():
+    """
+    Test that the texture size follows the coverage, within its bounds, as a power of two.
+    """
+    # 2 texels per pixel of 100 pixels is 200, rounded up to 256
+    assert get_texture_budget(100.0, 1920) == 256
+    assert get_texture_budget(300.0, 1920, texels_per_pixel=1.0) == 512
+    assert get_texture_budget(0.0, 1920) == 128
+    assert get_texture_budget(0.0, 1920, min_size=100) == 128
+    # capped by the render resolution before rounding
+    assert get_texture_budget(1000.0, 1920) == 2048
+    assert get_texture_budget(1000.0, 512) == 512
+    print("============ Test Passed: test_get_texture_budget ============")
+
+
+def test_apply_texture_budget_keeps_original_material():
+    """
+    Test that downscaled textures go into a per-scene copy of the material.
+    """
+    initialize_scene()
+    bpy.ops.mesh.primitive_plane_add()
+    obj = bpy.context.active_object
+    material = bpy.data.materials.new("textured")
+    material.use_nodes = True
+    image_node = material.node_tree.nodes.new("ShaderNodeTexImage")
+    image_node.image = bpy.data.images.new("texture", 1024, 1024)
+    obj.data.materials.append(material)
+    all_objects = [{obj: {"uid": "plane", "scale": {"factor": 1.0}}}]
+
+    with tempfile.TemporaryDirectory() as tmp_dir, patch.object(lod, "PREPROCESSED_PATH", tmp_dir):
+        apply_texture_budget(all_objects, coverage={obj.name: 10.0})
+
+    # the mesh, which the datablock cache may keep, still has the full resolution material
+    assert obj.data.materials[0] == material
+    assert tuple(image_node.image.size) == (1024, 1024)
+
+    slot = obj.material_slots[0]
+    assert slot.link == "OBJECT" and slot.material != material
+    scaled = [node for node in slot.material.node_tree.nodes if node.type == "TEX_IMAGE"]
+    assert max(scaled[0].image.size) == 128
+    print("============ Test Passed: test_apply_texture_budget_keeps_original_material ============")
+
+
+if __name__ == "__main__":
+    test_get_triangle_budget()
+    test_get_sample_frames()
+    test_get_lod_path()
+    test_apply_lod_shares_decimated_mesh()
+    test_get_texture_budget()
+    test_apply_texture_budget_keeps_original_material()
+    print("============ ALL TESTS PASSED ============")
@@ -0,0 +1,122 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from ..vendor import objaverse
+
+
+def test_object_paths_index():
+    """
+    Test building the object path index and looking up uids in it.
+    """
+    object_paths = {
+        "uid_a": "glbs/000-000/uid_a.glb",
+        "uid_b": "glbs/000-001/uid_b.glb",
+    }
+    original_index = objaverse._OBJECT_PATHS_INDEX
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = os.path.join(tmp_dir, "object-paths.json.gz")
+        with gzip.open(json_path, "wt") as f:
+            json.dump(object_paths, f)
+
+        index_path = os.path.join(tmp_dir, "object-paths.sqlite")
+        objaverse._build_object_paths_index(json_path, index_path)
+        assert os.path.exists(index_path)
+        assert not [file for file in os.listdir(tmp_dir) if file.endswith(".tmp")]
+
+        objaverse._OBJECT_PATHS_INDEX = index_path
+        objaverse._get_object_paths_index.cache_clear()
+        objaverse._load_object_paths.cache_clear()
+        try:
+            assert objaverse.get_object_paths(["uid_b", "missing", "uid_b"]) == {
+                "uid_b": "glbs/000-001/uid_b.glb"
+            }
+            assert sorted(objaverse.load_uids()) == ["uid_a", "uid_b"]
+            assert objaverse._load_object_paths() == object_paths
+            # The connection is memoized for the process
+            assert (
+                objaverse._get_object_paths_index()
+                is objaverse._get_object_paths_index()
+            )
+        finally:
+            objaverse._get_object_paths_index().close()
+            objaverse._OBJECT_PATHS_INDEX = original_index
+            objaverse._get_object_paths_index.cache_clear()
+            objaverse._load_object_paths.cache_clear()
+    print("============ Test Passed: test_object_paths_index ============")
+
+
+def make_file_server(content: bytes) -> HTTPServer:
+    """
+    Start a local server that serves `content` with Range support and a sha256 ETag.
+    """
+    sha256 = hashlib.sha256(content).hexdigest()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            offset = 0
+            if "Range" in self.headers:
+                offset = int(self.headers["Range"].split("=")[1].split("-")[0])
+            if offset >= len(content):
+                self.send_response(416)
+                self.end_headers()
+                return
+            self.send_response(206 if offset else 200)
+            self.send_header("X-Linked-Etag", f'"{sha256}"')
+            self.send_header("Content-Length", str(len(content) - offset))
+            self.end_headers()
+            self.wfile.write(content[offset:])
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_download_file_resume():
+    """
+    Test that a partial download is resumed and verified against the server checksum.
+    """
+    content = os.urandom(4096)
+    server = make_file_server(content)
+    url = f"http://127.0.0.1:{server.server_port}/glbs/000-000/uid_a.glb"
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            local_path = os.path.join(tmp_dir, "uid_a.glb")
+            with open(local_path + ".tmp", "wb") as f:
+                f.write(content[:1000])
+
+            objaverse._download_file(url, local_path, timeout=5, retries=0)
+
+            with open(local_path, "rb") as f:
+                assert f.read() == content
+            assert not os.path.exists(local_path + ".tmp")
+
+            # A corrupt partial file fails the checksum and is discarded
+            with open(local_path + ".tmp", "wb") as f:
+                f.write(b"corrupt")
+            os.remove(local_path)
+            try:
+                objaverse._download_file(url, local_path, timeout=5, retries=0)
+                assert False, "Expected a checksum mismatch"
+            except IOError:
+                pass
+            assert not os.path.exists(local_path + ".tmp")
+            objaverse._download_file(url, local_path, timeout=5, retries=0)
+            with open(local_path, "rb") as f:
+                assert f.read() == content
+    finally:
+        server.shutdown()
+    print("============ Test Passed: test_download_file_resume ============")
+
+
+if __name__ == "__main__":
+    test_object_paths_index()
+    test_download_file_resume()
+    print("============ ALL TESTS PASSED ============")
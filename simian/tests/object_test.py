@@ -7,6 +7,7 @@ from ..object import (
     get_hierarchy_bbox,
     join_objects_in_hierarchy,
     lock_all_objects,
+    normalize_object_data_api,
     normalize_object_scale,
     optimize_meshes_in_hierarchy,
     get_meshes_in_hierarchy,
@@ -134,9 +135,43 @@ def test_normalize_object_scale():
     print("============ Test Passed: test_normalize_object_scale ============")
 
 
+def test_normalize_object_data_api():
+    """
+    Test the normalize_object_data_api function.
+    """
+    initialize_scene()
+    existing = set(bpy.data.objects)
+
+    # Two cubes side by side, one parented to the other
+    bpy.ops.mesh.primitive_cube_add(size=2, location=(0, 0, 3))
+    parent = bpy.context.active_object
+    bpy.ops.mesh.primitive_cube_add(size=2, location=(4, 0, 3))
+    child = bpy.context.active_object
+    child.parent = parent
+    child.matrix_parent_inverse = parent.matrix_world.inverted()
+    child.modifiers.new(name="Bevel", type="BEVEL")
+
+    imported = [obj for obj in bpy.data.objects if obj not in existing]
+    obj = normalize_object_data_api(imported, 1.0)
+
+    assert parent.name not in bpy.data.objects or bpy.data.objects[parent.name] == obj
+    assert len([o for o in bpy.data.objects if o not in existing]) == 1
+    assert len(obj.modifiers) == 0
+    assert obj.parent is None
+
+    bpy.context.view_layer.update()
+    assert abs(max(obj.dimensions) - 1.0) < 0.001
+    # Pivot sits at the bottom center of the joined mesh
+    min_z = min(vertex.co.z for vertex in obj.data.vertices)
+    assert abs(min_z) < 0.001
+    assert abs(obj.location.x - 2.0) < 0.001
+    print("============ Test Passed: test_normalize_object_data_api ============")
+
+
 # Run tests if this file is executed as a script
 if __name__ == "__main__":
     test_hierarchy_bbox()
     test_remove_small_geometry()
     test_normalize_object_scale()
+    test_normalize_object_data_api()
     print("============ ALL TESTS PASSED ============")
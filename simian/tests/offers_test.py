@@ -0,0 +1,68 @@
+import os
+import tempfile
+
+from ..offers import OfferSelector, get_offer_type
+
+
+OFFERS = [
+    {"id": 1, "gpu_name": "RTX 3090", "num_gpus": 1, "dph_total": 0.20},
+    {"id": 2, "gpu_name": "RTX 4090", "num_gpus": 1, "dph_total": 0.40},
+    {"id": 3, "gpu_name": "A100", "num_gpus": 1, "dph_total": 1.00},
+    {"id": 4, "gpu_name": "RTX 3060", "num_gpus": 1, "dph_total": 0.10},
+]
+
+
+def test_offer_selector_ranking():
+    """
+    Test that offers are ranked by price, then benchmark per dollar, then renders per dollar.
+    """
+    selector = OfferSelector(path=None)
+    assert get_offer_type(OFFERS[1]) == "1x RTX 4090"
+    assert [offer["id"] for offer in selector.rank_offers(OFFERS)] == [4, 1, 2, 3]
+
+    # the 4090 renders 4 times faster than the 3090 at twice the price
+    selector.record_benchmark(OFFERS[0], 10.0)
+    selector.record_benchmark(OFFERS[1], 40.0)
+    assert [offer["id"] for offer in selector.rank_offers(OFFERS)][0] == 2
+
+    # measured renders replace the benchmark, unmeasured types rank with the median
+    selector.record_renders(OFFERS[0], 300, 1.0)
+    selector.record_renders(OFFERS[1], 100, 1.0)
+    selector.record_renders(OFFERS[2], 200, 1.0)
+    selector.record_renders(OFFERS[3], 0, 0.0)
+    assert [offer["id"] for offer in selector.rank_offers(OFFERS)] == [1, 4, 3, 2]
+
+    # later measurements move the running average
+    selector.record_renders(OFFERS[1], 1100, 1.0)
+    assert abs(selector.stats["1x RTX 4090"]["renders_per_dollar"] - 400.0) < 1e-9
+    print("============ Test Passed: test_offer_selector_ranking ============")
+
+
+def test_offer_selector_underperforming_and_save():
+    """
+    Test that nodes far below their type are flagged once the type is known, and that stats persist.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "stats", "offer_stats.json")
+        selector = OfferSelector(path=path, min_benchmarks=2)
+
+        # too few benchmarks to know what to expect
+        assert not selector.record_benchmark(OFFERS[1], 40.0)
+        assert not selector.record_benchmark(OFFERS[1], 5.0)
+        assert not selector.record_benchmark(OFFERS[1], 40.0)
+        expected = selector.get_expected_fps(OFFERS[1])
+
+        assert selector.record_benchmark(OFFERS[1], 0.4 * expected)
+        assert selector.get_expected_fps(OFFERS[1]) == expected
+        assert not selector.record_benchmark(OFFERS[1], 0.8 * expected)
+        assert selector.get_expected_fps(OFFERS[0]) is None
+
+        selector.save()
+        assert OfferSelector(path=path).stats == selector.stats
+    print("============ Test Passed: test_offer_selector_underperforming_and_save ============")
+
+
+if __name__ == "__main__":
+    test_offer_selector_ranking()
+    test_offer_selector_underperforming_and_save()
+    print("============ ALL TESTS PASSED ============")
@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+from ..pipeline import save_built_scene
+from ..scene import initialize_scene
+import bpy
+
+
+def test_save_built_scene():
+    """
+    Test that built scenes leave out unused cached datablocks and keep their fake user.
+    """
+    initialize_scene()
+    used = bpy.data.materials.new("used")
+    mesh = bpy.data.meshes.new("mesh")
+    mesh.materials.append(used)
+    bpy.context.scene.collection.objects.link(bpy.data.objects.new("object", mesh))
+    unused = bpy.data.materials.new("unused")
+    unused.use_fake_user = True
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "0.blend")
+        save_built_scene(path)
+
+        assert os.path.exists(path)
+        assert unused.use_fake_user
+        assert bpy.data.filepath != path
+
+        with bpy.data.libraries.load(path) as (data_from, _):
+            assert "used" in data_from.materials
+            assert "unused" not in data_from.materials
+    print("============ Test Passed: test_save_built_scene ============")
+
+
+if __name__ == "__main__":
+    test_save_built_scene()
+    print("============ ALL TESTS PASSED ============")
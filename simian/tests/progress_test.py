@@ -0,0 +1,82 @@
+from ..progress import ProgressTracker, get_progress_keys
+
+
+class StreamClient:
+    """
+    Serves fixed counters and stream entries like the Redis calls `ProgressTracker` makes.
+    """
+
+    def __init__(self, counts, entries):
+        self.counts = counts
+        self.entries = entries
+
+    def xread(self, streams, count=None, block=None):
+        (key, last_id), = streams.items()
+        last_id = tuple(int(part) for part in last_id.split("-"))
+        entries = [
+            entry
+            for entry in self.entries
+            if tuple(int(part) for part in entry[0].decode().split("-")) > last_id
+        ][:count]
+        return [(key, entries)] if entries else []
+
+    def hgetall(self, key):
+        return self.counts
+
+
+def test_progress_tracker_throughput_and_eta():
+    """
+    Test that throughput and ETA are computed from completion events.
+    """
+    tracker = ProgressTracker(None, "job", total=10, window=100.0)
+    assert tracker.get_eta() is None
+
+    for i in range(4):
+        tracker.record(1000.0 + 10 * i, "node-a", "done", 2, seconds=10.0)
+    tracker.record(1030.0, "node-b", "done", 1, seconds=30.0)
+    tracker.record(1030.0, "node-b", "failed", 1, seconds=30.0)
+    tracker.done, tracker.failed = 5, 1
+
+    # 5 tasks done within the 40 seconds since the first task started
+    assert abs(tracker.get_task_rate() - 5 / 40) < 1e-9
+    assert abs(tracker.get_eta() - 4 / (5 / 40)) < 1e-9
+    throughput = tracker.get_node_throughput()
+    assert abs(throughput["node-a"] - 8 * 60 / 40) < 1e-9
+    assert abs(throughput["node-b"] - 1 * 60 / 40) < 1e-9
+    assert tracker.node_tasks == {"node-a": 4, "node-b": 2}
+
+    # completions older than the window no longer count
+    tracker.record(1200.0, "node-b", "done", 1, seconds=10.0)
+    assert list(tracker.get_node_throughput()) == ["node-b"]
+    print("============ Test Passed: test_progress_tracker_throughput_and_eta ============")
+
+
+def test_progress_tracker_update():
+    """
+    Test that update reads counters and only the events it has not seen yet.
+    """
+    counts_key, events_key = get_progress_keys("job")
+    assert counts_key != events_key
+
+    client = StreamClient(
+        {b"done": b"2", b"failed": b"1", b"combinations": b"4"},
+        [
+            (b"1000000-0", {b"node": b"a", b"status": b"done", b"combinations": b"2", b"seconds": b"5"}),
+            (b"1001000-0", {b"node": b"b", b"status": b"done", b"combinations": b"2", b"seconds": b"5"}),
+            (b"1002000-0", {b"node": b"b", b"status": b"failed", b"combinations": b"1", b"seconds": b"5"}),
+        ],
+    )
+    tracker = ProgressTracker(client, "job", total=3)
+    assert len(tracker.update(block=0)) == 3
+    assert tracker.completed == 3 and tracker.failed == 1 and tracker.combinations == 4
+    assert tracker.is_finished()
+    assert tracker.get_eta() == 0.0
+    assert tracker.node_tasks == {"a": 1, "b": 2}
+    assert tracker.update(block=0) == []
+    print("============ Test Passed: test_progress_tracker_update ============")
+
+
+if __name__ == "__main__":
+    test_progress_tracker_throughput_and_eta()
+    test_progress_tracker_update()
+    print("============ ALL TESTS PASSED ============")
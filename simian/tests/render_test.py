@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+
+from .. import render
+from ..render import load_combination_objects, read_combinations
+
+
+def make_object(data):
+    """
+    Make a mock Blender object whose copies share its data, like `bpy.types.Object.copy`.
+    """
+    obj = MagicMock()
+    obj.data = data
+    obj.users_collection = [MagicMock()]
+    obj.copy.side_effect = lambda: make_object(data)
+    return obj
+
+
+def test_load_combination_objects_instances_repeated_uids():
+    """
+    Test that a repeated uid is imported once and its copies share the mesh, scaled relative to it.
+    """
+    combination = {
+        "objects": [
+            {"uid": "chair", "scale": {"factor": 2.0}},
+            {"uid": "table", "scale": {"factor": 1.0}},
+            {"uid": "chair", "scale": {"factor": 4.0}},
+            {"uid": "chair", "scale": {"factor": 1.0}},
+        ]
+    }
+    imported = {"chair": make_object(MagicMock()), "table": make_object(MagicMock())}
+
+    with patch.object(render, "get_datablock_cache", return_value=None), patch.object(
+        render.objaverse, "load_objects", side_effect=lambda uids: {uid: f"{uid}.glb" for uid in uids}
+    ) as load_objects, patch.object(
+        render, "import_object", side_effect=lambda path: path
+    ), patch.object(
+        render, "normalize_object_data_api", side_effect=lambda path, factor: imported[path[:-4]]
+    ):
+        all_objects = load_combination_objects(combination, MagicMock(), fast_normalize=True)
+
+    assert [call.args[0] for call in load_objects.call_args_list] == [["chair"], ["table"]]
+
+    objects = [list(entry.keys())[0] for entry in all_objects]
+    source = imported["chair"]
+    assert objects[0] is source and objects[1] is imported["table"]
+    assert all(obj.data is source.data for obj in objects[2:])
+    assert objects[2] is not objects[3]
+
+    # the shared mesh is normalized for the first factor of 2.0
+    assert objects[2].scale == [0.5, 0.5, 0.5]
+    assert objects[3].scale == [2.0, 2.0, 2.0]
+    collection = source.users_collection[0]
+    assert [call.args[0] for call in collection.objects.link.call_args_list] == objects[2:]
+    assert [list(entry.values())[0] for entry in all_objects] == combination["objects"]
+    print("============ Test Passed: test_load_combination_objects_instances_repeated_uids ============")
+
+
+def test_read_combinations_parses_file_once():
+    """
+    Test that a range of combinations is read with a single parse of the file.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        combination_file = os.path.join(tmp_dir, "combinations.json")
+        with open(combination_file, "w") as file:
+            json.dump({"combinations": [{"index": index} for index in range(10)]}, file)
+
+        with patch.object(render.json, "load", wraps=json.load) as load:
+            combinations = read_combinations(combination_file, 3, 7)
+
+    assert load.call_count == 1
+    assert combinations == [(index, {"index": index}) for index in range(3, 7)]
+    print("============ Test Passed: test_read_combinations_parses_file_once ============")
+
+
+if __name__ == "__main__":
+    test_load_combination_objects_instances_repeated_uids()
+    test_read_combinations_parses_file_once()
+    print("============ ALL TESTS PASSED ============")
@@ -0,0 +1,140 @@
+import os
+import tempfile
+import threading
+from unittest.mock import patch
+
+import bpy
+
+from .. import scene
+from ..scene import (
+    build_stage_material,
+    download_textures,
+    get_stage_material_key,
+    initialize_scene,
+    load_stage_material,
+)
+
+MAPS = {
+    "Diffuse": "https://example.com/wood/diffuse.jpg",
+    "nor_gl": "https://example.com/wood/normal.jpg",
+    "Rough": "https://example.com/wood/rough.jpg",
+}
+
+
+def save_texture(path):
+    """
+    Save a small generated image as a texture map.
+    """
+    image = bpy.data.images.new(os.path.basename(path), 4, 4)
+    image.filepath_raw = path
+    image.file_format = "JPEG"
+    image.save()
+    bpy.data.images.remove(image)
+    return path
+
+
+def test_get_stage_material_key():
+    """
+    Test that the key follows the map set and not the order of the maps.
+    """
+    key = get_stage_material_key("wood", MAPS)
+    assert key.startswith("StageMaterial_wood_")
+    assert key == get_stage_material_key("wood", dict(reversed(list(MAPS.items()))))
+    assert key != get_stage_material_key("wood", {**MAPS, "AO": "https://example.com/wood/ao.jpg"})
+    assert key != get_stage_material_key("wood", {**MAPS, "Rough": "https://example.com/rough2.jpg"})
+    assert key != get_stage_material_key("stone", MAPS)
+    print("============ Test Passed: test_get_stage_material_key ============")
+
+
+def test_download_textures_in_parallel():
+    """
+    Test that every known map is downloaded once, all at the same time.
+    """
+    # only passes once every download waits at the same time
+    barrier = threading.Barrier(len(MAPS), timeout=5)
+    calls = []
+
+    def download_texture(url, material_name, texture_name):
+        calls.append((url, texture_name))
+        barrier.wait()
+        return f"/cache/{material_name}/{texture_name}.jpg"
+
+    with patch.object(scene, "download_texture", download_texture):
+        paths = download_textures({**MAPS, "unknown": "https://example.com/x.jpg"}, "wood")
+
+    assert sorted(calls) == sorted((url, scene.STAGE_TEXTURE_NAMES[key]) for key, url in MAPS.items())
+    assert paths == {
+        "Diffuse": "/cache/wood/Diffuse.jpg",
+        "nor_gl": "/cache/wood/Normal.jpg",
+        "Rough": "/cache/wood/Rough.jpg",
+    }
+    print("============ Test Passed: test_download_textures_in_parallel ============")
+
+
+def test_load_stage_material_builds_once():
+    """
+    Test that the material is reused when loaded, appended from the library file when
+    cached, and only built the first time.
+    """
+    initialize_scene()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        material_dir = os.path.join(tmp_dir, "materials", "wood")
+        os.makedirs(material_dir)
+        texture_paths = {
+            key: save_texture(os.path.join(material_dir, f"{scene.STAGE_TEXTURE_NAMES[key]}.jpg"))
+            for key in MAPS
+        }
+
+        with patch.object(
+            scene, "get_cache_path", lambda *parts: os.path.join(tmp_dir, *parts)
+        ), patch.object(scene, "download_textures", return_value=texture_paths), patch.object(
+            scene, "build_stage_material", wraps=build_stage_material
+        ) as build:
+            material = load_stage_material("wood", MAPS)
+            key = get_stage_material_key("wood", MAPS)
+            assert material.name == key and build.call_count == 1
+            assert os.path.exists(os.path.join(material_dir, f"{key}.blend"))
+
+            # loaded in this session
+            assert load_stage_material("wood", MAPS) == material
+            assert build.call_count == 1
+
+            # built by another render, appended from the library file
+            bpy.data.materials.remove(material)
+            material = load_stage_material("wood", MAPS)
+            assert material.name == key and build.call_count == 1
+            assert any(node.type == "TEX_IMAGE" for node in material.node_tree.nodes)
+
+            # another map set is another material
+            load_stage_material("wood", {"Diffuse": MAPS["Diffuse"]})
+            assert build.call_count == 2
+    print("============ Test Passed: test_load_stage_material_builds_once ============")
+
+
+def test_build_stage_material_without_ao():
+    """
+    Test the base colour links with and without an AO map, the missing AO map used to raise.
+    """
+    initialize_scene()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        diffuse = save_texture(os.path.join(tmp_dir, "Diffuse.jpg"))
+        ao = save_texture(os.path.join(tmp_dir, "AO.jpg"))
+
+        def base_color_source(material):
+            principled = material.node_tree.nodes["Principled BSDF"]
+            links = principled.inputs["Base Color"].links
+            return links[0].from_node.type if links else None
+
+        assert base_color_source(build_stage_material("diffuse", {"Diffuse": diffuse})) == "TEX_IMAGE"
+        assert base_color_source(build_stage_material("none", {})) is None
+        assert base_color_source(build_stage_material("ao", {"AO": ao})) == "MIX_RGB"
+        assert base_color_source(build_stage_material("both", {"Diffuse": diffuse, "AO": ao})) == "MIX_RGB"
+    print("============ Test Passed: test_build_stage_material_without_ao ============")
+
+
+if __name__ == "__main__":
+    test_get_stage_material_key()
+    test_download_textures_in_parallel()
+    test_load_stage_material_builds_once()
+    test_build_stage_material_without_ao()
+    print("============ ALL TESTS PASSED ============")
@@ -0,0 +1,117 @@
+from ..scheduler import AdaptiveScheduler
+
+
+def event(task, status, timestamp=0.0, combinations=0, seconds=0.0, node="node"):
+    return {
+        "task": task,
+        "status": status,
+        "timestamp": timestamp,
+        "combinations": combinations,
+        "seconds": seconds,
+        "node": node,
+    }
+
+
+def test_batch_size_follows_render_times():
+    """
+    Test that batches grow from measured render times and shrink at the end of the job.
+    """
+    scheduler = AdaptiveScheduler(0, 1000, num_nodes=2, target_task_seconds=100.0, queue_depth=1)
+    first = scheduler.next_tasks(now=0.0)
+    assert [(start, end) for _, start, end in first] == [(0, 1), (1, 2)]
+
+    key = first[0][0]
+    scheduler.handle_event(event(key, "started", 0.0))
+    scheduler.handle_event(event(key, "done", 10.0, combinations=1, seconds=10.0))
+    assert scheduler.get_seconds_per_combination() == 10.0
+
+    # one free queue slot, sized to take 100 seconds at 10 seconds per combination
+    (_, start, end), = scheduler.next_tasks(now=10.0)
+    assert (start, end) == (2, 12)
+
+    # near the end, what is left is split over nodes and queue slots
+    scheduler.next_index = 995
+    assert scheduler.get_batch_size() == 2
+    print("============ Test Passed: test_batch_size_follows_render_times ============")
+
+
+def test_stragglers_are_reexecuted_once():
+    """
+    Test that slow tasks get one more copy at the tail and the first finished copy wins.
+    """
+    scheduler = AdaptiveScheduler(
+        0, 3, num_nodes=3, queue_depth=1, min_straggler_seconds=1.0, straggler_factor=3.0
+    )
+    tasks = scheduler.next_tasks(now=0.0)
+    assert len(tasks) == 3
+    for key, _, _ in tasks:
+        scheduler.handle_event(event(key, "started", 0.0))
+    for key, _, _ in tasks[:2]:
+        scheduler.handle_event(event(key, "done", 10.0, combinations=1, seconds=10.0))
+    slow = tasks[2][0]
+
+    assert scheduler.next_tasks(now=20.0) == []
+    assert scheduler.next_tasks(now=31.0) == [(slow, 2, 3)]
+    assert scheduler.next_tasks(now=100.0) == []
+    assert scheduler.speculated == 1
+
+    # the original fails while the copy is still queued, the task stays open
+    scheduler.handle_event(event(slow, "failed", 40.0, combinations=1, seconds=40.0))
+    assert not scheduler.is_finished()
+    scheduler.handle_event(event(slow, "started", 41.0))
+    scheduler.handle_event(event(slow, "done", 45.0, combinations=1, seconds=4.0))
+    assert scheduler.is_finished()
+    assert scheduler.completed == 3 and scheduler.failed == 0
+    print("============ Test Passed: test_stragglers_are_reexecuted_once ============")
+
+
+def test_stragglers_without_render_times():
+    """
+    Test that tasks hanging before any task finished are re-executed after the minimum runtime.
+    """
+    scheduler = AdaptiveScheduler(0, 2, num_nodes=2, queue_depth=1, min_straggler_seconds=60.0)
+    tasks = scheduler.next_tasks(now=0.0)
+    assert len(tasks) == 2
+    for key, _, _ in tasks:
+        scheduler.handle_event(event(key, "started", 0.0))
+    assert scheduler.get_seconds_per_combination() is None
+
+    assert scheduler.next_tasks(now=30.0) == []
+    assert scheduler.next_tasks(now=61.0) == tasks
+    assert scheduler.speculated == 2
+    print("============ Test Passed: test_stragglers_without_render_times ============")
+
+
+def test_tasks_on_dead_nodes_are_reexecuted():
+    """
+    Test that copies lost with dead nodes are submitted again without counting towards max_copies.
+    """
+    scheduler = AdaptiveScheduler(
+        0, 1, num_nodes=1, queue_depth=1, min_straggler_seconds=10.0, max_copies=2
+    )
+    (key, _, _), = scheduler.next_tasks(now=0.0)
+    scheduler.handle_event(event(key, "started", 0.0, node="a"))
+    assert scheduler.next_tasks(now=11.0) == [(key, 0, 1)]
+    scheduler.handle_event(event(key, "started", 12.0, node="b"))
+
+    # both copies are used up, only dead nodes free them again
+    assert scheduler.next_tasks(now=100.0) == []
+    scheduler.handle_dead_nodes(["a", "b", "c"])
+    assert scheduler.next_tasks(now=100.0) == [(key, 0, 1)]
+    assert scheduler.recovered == 1 and scheduler.speculated == 1
+
+    # a late failure from a dead node does not fail the new copy
+    scheduler.handle_event(event(key, "failed", 101.0, node="a"))
+    assert not scheduler.is_finished()
+    scheduler.handle_event(event(key, "started", 102.0, node="d"))
+    scheduler.handle_event(event(key, "done", 110.0, combinations=1, seconds=8.0, node="d"))
+    assert scheduler.is_finished() and scheduler.failed == 0
+    print("============ Test Passed: test_tasks_on_dead_nodes_are_reexecuted ============")
+
+
+if __name__ == "__main__":
+    test_batch_size_follows_render_times()
+    test_stragglers_are_reexecuted_once()
+    test_stragglers_without_render_times()
+    test_tasks_on_dead_nodes_are_reexecuted()
+    print("============ ALL TESTS PASSED ============")
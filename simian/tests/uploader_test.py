@@ -0,0 +1,151 @@
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from celery.signals import worker_process_shutdown
+
+from .. import uploader
+from ..uploader import UploadQueue, get_upload_queue
+
+
+def test_upload_queue_batches_and_deletes():
+    """
+    Test that files are uploaded in batches and deleted once their upload is confirmed.
+    """
+    batches = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i in range(5):
+            path = os.path.join(tmp_dir, f"{i}.mp4")
+            with open(path, "wb") as file:
+                file.write(b"x" * 10)
+            paths.append(path)
+
+        reported = []
+        upload_queue = UploadQueue(
+            lambda files: batches.append(list(files)),
+            batch_size=2,
+            batch_interval=0.2,
+            on_pending=reported.append,
+        )
+        for path in paths:
+            upload_queue.submit(path, os.path.basename(path))
+
+        assert upload_queue.flush(timeout=10)
+        assert upload_queue.pending == 0
+        assert reported[-1] == 0 and max(reported) <= 5
+        assert sorted(upload_queue.uploaded) == [f"{i}.mp4" for i in range(5)]
+        assert all(len(batch) <= 2 for batch in batches)
+        assert not any(os.path.exists(path) for path in paths)
+    print("============ Test Passed: test_upload_queue_batches_and_deletes ============")
+
+
+def test_upload_queue_retries_and_keeps_failed_files():
+    """
+    Test that failed uploads are retried and files are kept when all attempts fail.
+    """
+    attempts = []
+    confirmed = []
+
+    def flaky_upload(files):
+        attempts.append(files)
+        if len(attempts) < 2:
+            raise ConnectionError("connection reset")
+
+    def failing_upload(files):
+        raise ConnectionError("connection reset")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "0.mp4")
+        with open(path, "wb") as file:
+            file.write(b"x")
+
+        upload_queue = UploadQueue(flaky_upload, retries=3)
+        upload_queue.submit(path, "0.mp4", lambda: confirmed.append("0.mp4"))
+        assert upload_queue.flush(timeout=10)
+        assert len(attempts) == 2
+        assert upload_queue.uploaded == ["0.mp4"]
+        assert confirmed == ["0.mp4"]
+
+        with open(path, "wb") as file:
+            file.write(b"x")
+        upload_queue = UploadQueue(failing_upload, retries=1)
+        upload_queue.submit(path, "0.mp4", lambda: confirmed.append("failed"))
+        assert upload_queue.flush(timeout=10)
+        assert upload_queue.failed == [path]
+        assert confirmed == ["0.mp4"]
+        assert os.path.exists(path)
+    print("============ Test Passed: test_upload_queue_retries_and_keeps_failed_files ============")
+
+
+def test_upload_queue_bounds_inflight_bytes():
+    """
+    Test that submit blocks while the in-flight byte limit is reached.
+    """
+    release = threading.Event()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i in range(2):
+            path = os.path.join(tmp_dir, f"{i}.mp4")
+            with open(path, "wb") as file:
+                file.write(b"x" * 100)
+            paths.append(path)
+
+        upload_queue = UploadQueue(lambda files: release.wait(), max_inflight_bytes=150)
+        upload_queue.submit(paths[0], "0.mp4")
+
+        submitted = threading.Event()
+        thread = threading.Thread(
+            target=lambda: (upload_queue.submit(paths[1], "1.mp4"), submitted.set())
+        )
+        thread.start()
+        time.sleep(0.2)
+        assert not submitted.is_set()
+
+        release.set()
+        thread.join(timeout=10)
+        assert submitted.is_set()
+        assert upload_queue.flush(timeout=10)
+    print("============ Test Passed: test_upload_queue_bounds_inflight_bytes ============")
+
+
+def test_upload_queue_flushed_on_worker_process_shutdown():
+    """
+    Test that pending uploads finish when a Celery worker process shuts down.
+    """
+    uploaded = []
+
+    def slow_upload(files):
+        time.sleep(0.5)
+        uploaded.extend(remote_name for _, remote_name in files)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "0.mp4")
+        with open(path, "wb") as file:
+            file.write(b"x")
+
+        get_upload_queue.cache_clear()
+        with patch.dict(os.environ, {"S3_BUCKET_NAME": "bucket"}), patch.object(
+            uploader, "create_s3_upload_queue", lambda bucket: UploadQueue(slow_upload)
+        ), patch.object(uploader, "_upload_queues", []):
+            upload_queue = get_upload_queue("s3")
+            upload_queue.submit(path, "0.mp4")
+            assert upload_queue.pending == 1
+
+            worker_process_shutdown.send(sender=None, pid=os.getpid(), exitcode=0)
+            assert upload_queue.pending == 0
+            assert uploaded == ["0.mp4"]
+        get_upload_queue.cache_clear()
+    print("============ Test Passed: test_upload_queue_flushed_on_worker_process_shutdown ============")
+
+
+if __name__ == "__main__":
+    test_upload_queue_batches_and_deletes()
+    test_upload_queue_retries_and_keeps_failed_files()
+    test_upload_queue_bounds_inflight_bytes()
+    test_upload_queue_flushed_on_worker_process_shutdown()
+    print("============ ALL TESTS PASSED ============")
@@ -1,8 +1,13 @@
 import json
+import os
 import sys
-from unittest.mock import patch
+import tempfile
+from unittest.mock import MagicMock, patch
 
+from .. import worker
+from ..ledger import get_failure_ledger, get_output_status
 from ..worker import run_job
+from .ledger_test import LedgerClient
 
 
 @patch("..worker.subprocess.run")
@@ -41,6 +46,65 @@ def test_run_job(mock_subprocess_run):
     mock_subprocess_run.assert_called_once_with(["bash", "-c", command], check=False)
 
 
+class UploadRecorder:
+    """
+    Uploads files at once, like an upload queue that never fails.
+    """
+
+    def __init__(self):
+        self.on_pending = None
+        self.pending = 0
+        self.uploaded = []
+
+    def submit(self, local_path, remote_name, on_uploaded=None):
+        self.uploaded.append(remote_name)
+        if on_uploaded is not None:
+            on_uploaded()
+
+
+def test_run_job_without_output():
+    """
+    Test that a render exiting cleanly without writing its output is a failure, not marked rendered.
+    """
+    client = LedgerClient()
+    upload_queue = UploadRecorder()
+
+    def run_render(command):
+        # only combination 1 writes its video
+        combination_index = int(command[command.index("--combination_index") + 1])
+        output_dir = command[command.index("--output_dir") + 1]
+        if combination_index == 1:
+            open(os.path.join(output_dir, f"{combination_index}.mp4"), "w").close()
+        return None
+
+    with tempfile.TemporaryDirectory() as output_dir, patch.multiple(
+        worker,
+        get_redis_client=MagicMock(return_value=client),
+        get_upload_queue=MagicMock(return_value=upload_queue),
+        run_render=run_render,
+        report_start=MagicMock(),
+        report_completion=MagicMock(return_value=True),
+        set_node_busy=MagicMock(),
+        publish_node_assets=MagicMock(),
+        get_combination_asset_paths=MagicMock(return_value=[]),
+        get_combination_assets=MagicMock(return_value=set()),
+        order_by_assets=lambda combinations: list(range(len(combinations))),
+        pin_assets=MagicMock(),
+        unpin_assets=MagicMock(),
+    ):
+        run_job([1, 2], [{"objects": []}, {"objects": []}], 64, 64, output_dir, "hdri", "s3", job_id="job")
+
+        assert upload_queue.uploaded == ["00001.mp4"]
+        assert get_output_status(client, "job", "1") == "rendered"
+        assert get_output_status(client, "job", "2") == "quarantined"
+        ledger = get_failure_ledger(client, "job")
+        assert ledger["2"]["error"] == "render" and ledger["2"]["message"] == "Render wrote no output"
+        num_rendered = worker.report_completion.call_args.args[2]
+        assert num_rendered == 1
+    print("============ Test Passed: test_run_job_without_output ============")
+
+
 if __name__ == "__main__":
     # test_run_job()
-    pass
+    test_run_job_without_output()
+    print("============ ALL TESTS PASSED ============")
@@ -7,6 +7,8 @@ import bpy
 import mathutils
 from mathutils import Vector
 
+from .bounds import get_objects_bounds
+
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
@@ -146,16 +148,9 @@ def find_largest_length(objects: List[Dict[bpy.types.Object, Dict]]) -> float:
     largest_dimension = 0
     for obj_dict in objects:
         obj = list(obj_dict.keys())[0]
-        bpy.context.view_layer.update()
-        bbox_corners = obj.bound_box
-        width = (
-            max(bbox_corners, key=lambda v: v[0])[0]
-            - min(bbox_corners, key=lambda v: v[0])[0]
-        )
-        height = (
-            max(bbox_corners, key=lambda v: v[1])[1]
-            - min(bbox_corners, key=lambda v: v[1])[1]
-        )
+        bbox_min, bbox_max = get_objects_bounds([obj])
+        width = bbox_max[0] - bbox_min[0]
+        height = bbox_max[1] - bbox_min[1]
         current_max = max(width, height)
         largest_dimension = max(largest_dimension, current_max)
 
@@ -171,11 +166,7 @@ def get_world_bounding_box_xy(obj: bpy.types.Object) -> List[Vector]:
     Returns:
         List[Vector]: List of 2D bounding box corners in world space.
     """
-    world_bbox = [obj.matrix_world @ Vector(corner) for corner in obj.bound_box]
-    min_x = min(corner.x for corner in world_bbox)
-    max_x = max(corner.x for corner in world_bbox)
-    min_y = min(corner.y for corner in world_bbox)
-    max_y = max(corner.y for corner in world_bbox)
+    (min_x, min_y, _), (max_x, max_y, _) = get_objects_bounds([obj])
     corners_xy = [
         Vector((min_x, min_y, 0)),
         Vector((max_x, min_y, 0)),
@@ -248,9 +239,7 @@ def bring_objects_to_origin(objects):
             
             # Move the parent object and all its children
             move_object_and_children(obj, move_vector)
-            
-            bpy.context.view_layer.update()
-            
+
             current_obj_bbox = get_world_bounding_box_xy(obj)
             collision = False
 
@@ -265,7 +254,6 @@ def bring_objects_to_origin(objects):
             if collision:
                 # Revert the movement
                 move_object_and_children(obj, -move_vector)
-                bpy.context.view_layer.update()
                 step_size *= 0.5
                 if step_size < 0.001:
                     break
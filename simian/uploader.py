@@ -0,0 +1,330 @@
+import atexit
+import functools
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from celery.signals import worker_process_shutdown
+from huggingface_hub import CommitOperationAdd, HfApi
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# Bytes of rendered files waiting for upload before rendering blocks
+MAX_INFLIGHT_BYTES = int(os.environ.get("SIMIAN_UPLOAD_MAX_INFLIGHT_BYTES", 4 * 1024**3))
+UPLOAD_RETRIES = 5
+# Files and seconds collected into one Hugging Face commit
+HF_COMMIT_FILES = 50
+HF_COMMIT_INTERVAL = 60.0
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=64 * 1024 * 1024,
+    multipart_chunksize=64 * 1024 * 1024,
+    max_concurrency=8,
+)
+
+# (local path, remote name) pairs
+UploadBatch = List[Tuple[str, str]]
+
+
+class UploadQueue:
+    """
+    Uploads files on a background thread while the caller keeps rendering.
+
+    Files are uploaded in batches of up to `batch_size` files, or whatever arrived within
+    `batch_interval` seconds. Failed batches are retried with exponential backoff.
+    Local files are deleted once their upload is confirmed. `submit` blocks while more
+    than `max_inflight_bytes` are waiting, so a slow uplink cannot fill the disk.
+    """
+
+    def __init__(
+        self,
+        upload_batch: Callable[[UploadBatch], None],
+        batch_size: int = 1,
+        batch_interval: float = 0.0,
+        max_inflight_bytes: int = MAX_INFLIGHT_BYTES,
+        retries: int = UPLOAD_RETRIES,
+        delete_uploaded: bool = True,
+        on_pending: Optional[Callable[[int], None]] = None,
+    ):
+        """
+        Args:
+            upload_batch (Callable[[UploadBatch], None]): Uploads a batch of (local path, remote name) pairs, raising on failure.
+            batch_size (int, optional): Maximum number of files per batch. Defaults to 1.
+            batch_interval (float, optional): Seconds to wait for more files before uploading a partial batch. Defaults to 0.
+            max_inflight_bytes (int, optional): Bytes waiting for upload before `submit` blocks. Defaults to MAX_INFLIGHT_BYTES.
+            retries (int, optional): Attempts per batch before giving up on it. Defaults to UPLOAD_RETRIES.
+            delete_uploaded (bool, optional): Delete local files after their upload is confirmed. Defaults to True.
+            on_pending (Optional[Callable[[int], None]], optional): Called with the number of pending files whenever it changes. Defaults to None.
+        """
+        self.upload_batch = upload_batch
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.max_inflight_bytes = max_inflight_bytes
+        self.retries = retries
+        self.delete_uploaded = delete_uploaded
+        self.on_pending = on_pending
+        self.uploaded: List[str] = []
+        self.failed: List[str] = []
+
+        self._queue: "queue.Queue[Tuple[str, str, int, Optional[Callable[[], None]]]]" = queue.Queue()
+        self._condition = threading.Condition()
+        self._inflight_bytes = 0
+        self._pending = 0
+        # reports read the pending count under this lock, so the last one is never stale
+        self._report_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="simian-uploader", daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        local_path: str,
+        remote_name: str,
+        on_uploaded: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        Queue a file for upload, waiting while too many bytes are in flight.
+
+        Args:
+            local_path (str): The file to upload.
+            remote_name (str): The object key or path in the repository.
+            on_uploaded (Optional[Callable[[], None]], optional): Called on the upload thread
+                once the upload is confirmed, never if it fails. Defaults to None.
+
+        Returns:
+            None
+        """
+        size = os.path.getsize(local_path)
+        with self._condition:
+            # A single file larger than the limit is let through once nothing else is in flight
+            while self._pending and self._inflight_bytes + size > self.max_inflight_bytes:
+                self._condition.wait()
+            self._inflight_bytes += size
+            self._pending += 1
+        self._queue.put((local_path, remote_name, size, on_uploaded))
+        self._report_pending()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every submitted file is uploaded or has failed.
+
+        Args:
+            timeout (Optional[float], optional): Maximum seconds to wait. Defaults to None, no limit.
+
+        Returns:
+            bool: True if nothing is pending anymore.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    @property
+    def pending(self) -> int:
+        """
+        The number of files submitted but not uploaded yet.
+        """
+        with self._condition:
+            return self._pending
+
+    def _report_pending(self) -> None:
+        """
+        Pass the number of pending files to `on_pending`.
+
+        Returns:
+            None
+        """
+        if self.on_pending is None:
+            return
+        with self._report_lock:
+            try:
+                self.on_pending(self.pending)
+            except Exception:
+                logger.exception("Failed to report pending uploads")
+
+    def _next_batch(self) -> List[Tuple[str, str, int, Optional[Callable[[], None]]]]:
+        """
+        Collect the next batch, waiting for its first file.
+
+        Returns:
+            List[Tuple[str, str, int, Optional[Callable[[], None]]]]: (local path, remote
+            name, size, upload callback) of every file in the batch.
+        """
+        batch = [self._queue.get()]
+        deadline = time.time() + self.batch_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        """
+        Upload batches until the process exits.
+
+        Returns:
+            None
+        """
+        while True:
+            batch = self._next_batch()
+            files = [(local_path, remote_name) for local_path, remote_name, _, _ in batch]
+            uploaded = False
+            for attempt in range(self.retries):
+                try:
+                    self.upload_batch(files)
+                    uploaded = True
+                    break
+                except Exception as e:
+                    delay = min(2**attempt, 60)
+                    logger.warning(
+                        f"Upload of {len(files)} files failed (attempt {attempt + 1}/{self.retries}): {e}"
+                    )
+                    if attempt + 1 < self.retries:
+                        time.sleep(delay)
+
+            for local_path, remote_name, _, on_uploaded in batch:
+                if not uploaded:
+                    logger.error(f"Giving up on uploading {local_path}, keeping the local file")
+                    self.failed.append(local_path)
+                    continue
+                self.uploaded.append(remote_name)
+                if self.delete_uploaded and os.path.exists(local_path):
+                    os.remove(local_path)
+                if on_uploaded is not None:
+                    try:
+                        on_uploaded()
+                    except Exception:
+                        logger.exception(f"Upload callback of {remote_name} failed")
+            if uploaded:
+                logger.info(f"Uploaded {len(files)} files")
+
+            with self._condition:
+                self._inflight_bytes -= sum(size for _, _, size, _ in batch)
+                self._pending -= len(batch)
+                self._condition.notify_all()
+            self._report_pending()
+
+
+@functools.lru_cache(maxsize=None)
+def get_s3_client():
+    """
+    Get the S3 client shared by all uploads of this process.
+
+    Returns:
+        botocore.client.S3: A client with a connection pool sized for multipart uploads.
+    """
+    return boto3.client("s3", config=Config(max_pool_connections=32))
+
+
+def create_s3_upload_queue(bucket: str, **kwargs) -> UploadQueue:
+    """
+    Create a queue that uploads files to an S3 bucket with multipart transfers.
+
+    Args:
+        bucket (str): The bucket name.
+        **kwargs: Further arguments for `UploadQueue`.
+
+    Returns:
+        UploadQueue: The queue.
+    """
+
+    def upload_batch(files: UploadBatch) -> None:
+        for local_path, remote_name in files:
+            get_s3_client().upload_file(
+                local_path, bucket, remote_name, Config=S3_TRANSFER_CONFIG
+            )
+
+    return UploadQueue(upload_batch, **kwargs)
+
+
+def create_hf_upload_queue(repo_id: str, token: Optional[str] = None, **kwargs) -> UploadQueue:
+    """
+    Create a queue that adds files to a Hugging Face dataset in batched commits.
+
+    Batching keeps the number of commits within the Hub's rate limits.
+
+    Args:
+        repo_id (str): The dataset repository.
+        token (Optional[str], optional): The Hugging Face token. Defaults to None.
+        **kwargs: Further arguments for `UploadQueue`.
+
+    Returns:
+        UploadQueue: The queue.
+    """
+    api = HfApi(token=token)
+
+    def upload_batch(files: UploadBatch) -> None:
+        api.create_commit(
+            repo_id=repo_id,
+            repo_type="dataset",
+            operations=[
+                CommitOperationAdd(path_in_repo=remote_name, path_or_fileobj=local_path)
+                for local_path, remote_name in files
+            ],
+            commit_message=f"Add {len(files)} renders",
+        )
+
+    kwargs.setdefault("batch_size", HF_COMMIT_FILES)
+    kwargs.setdefault("batch_interval", HF_COMMIT_INTERVAL)
+    return UploadQueue(upload_batch, **kwargs)
+
+
+# Upload queues of this process, flushed before it exits
+_upload_queues: List[UploadQueue] = []
+
+
+@worker_process_shutdown.connect
+def flush_upload_queues(**kwargs) -> None:
+    """
+    Wait until the uploads of every queue of this process are done.
+
+    Runs when the process exits, and when a Celery worker process shuts down, since the
+    prefork pool leaves its child processes with `os._exit`, which skips atexit handlers.
+
+    Returns:
+        None
+    """
+    for upload_queue in _upload_queues:
+        upload_queue.flush()
+
+
+atexit.register(flush_upload_queues)
+
+
+@functools.lru_cache(maxsize=None)
+def get_upload_queue(destination: str) -> UploadQueue:
+    """
+    Get the upload queue of this worker process, created on first use.
+
+    The queue outlives single jobs, so outputs of one job upload while the next renders.
+    Pending uploads are flushed when the process exits, see `flush_upload_queues`.
+
+    Args:
+        destination (str): "hf" for the Hugging Face dataset in HF_REPO_ID, anything else
+            for the S3 bucket in S3_BUCKET_NAME.
+
+    Returns:
+        UploadQueue: The queue.
+    """
+    if destination == "hf":
+        upload_queue = create_hf_upload_queue(
+            os.environ["HF_REPO_ID"], token=os.environ.get("HF_TOKEN")
+        )
+    else:
+        upload_queue = create_s3_upload_queue(os.environ["S3_BUCKET_NAME"])
+    _upload_queues.append(upload_queue)
+    return upload_queue
@@ -1,17 +1,102 @@
+import functools
 import json
 import logging
 import os
+import socket
 import sys
-import subprocess
-import boto3
-import shlex
 import time
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from celery import current_task
+
+from .asset_cache import get_cache_path
+from .autoscaler import publish_benchmark, publish_uploads, set_node_busy, start_heartbeat
+from .background import get_hdri_path
+from .cache_manager import (
+    CACHE_QUOTA_BYTES,
+    get_cache_ledger,
+    get_host_cache_stats,
+    pin_assets,
+    register_cache_store,
+    unpin_assets,
+)
+from .chunks import get_chunk_path, get_chunk_upload_name
+from .combination_store import resolve_combination_indices, resolve_combinations
+from .ledger import get_output_key, get_output_status, mark_rendered, record_failure, run_render
+from .locality import get_combination_assets, order_by_assets, publish_node_assets
+from .offers import BENCHMARK_ON_STARTUP, run_benchmark_process
+from .pipeline import run_pipeline
+from .progress import get_redis_client, is_task_claimed, report_completion, report_start
+from .uploader import UploadQueue, get_upload_queue
+from .vendor import objaverse
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
 
+def get_combination_asset_paths(combination: Dict[str, Any], hdri_path: str) -> List[str]:
+    """
+    Get the cached paths of the objects, background and stage textures a combination uses.
+
+    Args:
+        combination (Dict[str, Any]): The combination dictionary.
+        hdri_path (str): The base directory for storing background images.
+
+    Returns:
+        List[str]: The file and directory paths of the combination's assets.
+    """
+    uids = [obj["uid"] for obj in combination.get("objects", [])]
+    paths = list(objaverse.get_object_local_paths(uids).values())
+    if "background" in combination:
+        paths.append(get_hdri_path(hdri_path, combination))
+    material_name = combination.get("stage", {}).get("material", {}).get("name")
+    if material_name:
+        paths.append(get_cache_path("materials", material_name))
+    return paths
+
+
+def submit_outputs(
+    upload_queue: UploadQueue,
+    output_dir: str,
+    submitted: Set[str],
+    on_uploaded: Optional[Callable[[], None]] = None,
+) -> None:
+    """
+    Queue the files in an output directory that were not queued for upload yet.
+
+    Args:
+        upload_queue (UploadQueue): The worker's upload queue.
+        output_dir (str): The directory with rendered outputs.
+        submitted (Set[str]): Paths queued so far, updated in place.
+        on_uploaded (Optional[Callable[[], None]], optional): Called once every newly
+            queued file is uploaded, never if one fails. Defaults to None.
+
+    Returns:
+        None
+    """
+    paths = []
+    for name in sorted(os.listdir(output_dir)):
+        path = os.path.join(output_dir, name)
+        if path not in submitted and os.path.isfile(path):
+            submitted.add(path)
+            paths.append(path)
+    if on_uploaded is not None and not paths:
+        on_uploaded()
+
+    # callbacks run on the single upload thread, so the count needs no lock
+    remaining = [len(paths)]
+
+    def file_uploaded():
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            on_uploaded()
+
+    for path in paths:
+        upload_queue.submit(
+            path, os.path.basename(path), file_uploaded if on_uploaded is not None else None
+        )
+
+
 def run_job(
     combination_indeces: int,
     combinations: Dict[str, Any],
@@ -21,11 +106,20 @@ def run_job(
     hdri_path: str,
     upload_dest: str,
     start_frame: int = 0,
-    end_frame: int = 65
+    end_frame: int = 65,
+    pipeline: bool = False,
+    frame_range: Optional[List[int]] = None,
+    combination_store: Optional[Dict[str, Any]] = None,
+    index_range: Optional[List[int]] = None,
+    job_id: Optional[str] = None,
+    task_key: Optional[str] = None,
 ) -> None:
     """
     Run a rendering job with the specified combination index and settings.
 
+    Every combination renders in its own process with a timeout, and transient errors are
+    retried, see `simian.ledger`. A failed combination does not fail the rest of the batch.
+
     Args:
         combination_index (int): The index of the combination to render.
         combination (Dict[str, Any]): The combination dictionary.
@@ -35,66 +129,242 @@ def run_job(
         hdri_path (str): The path to the HDRI file.
         start_frame (int, optional): The starting frame number. Defaults to 0.
         end_frame (int, optional): The ending frame number. Defaults to 65.
+        pipeline (bool, optional): Build the next scene in a second Blender process while the current one renders. Defaults to False.
+        frame_range (Optional[List[int]], optional): First and last frame of the video chunk to render. Defaults to None, the whole video.
+        combination_store (Optional[Dict[str, Any]], optional): Spec of the job's combination store, see `simian.combination_store`. When given, the combinations are read from the store, or generated from its seed and config, instead of the task arguments. Defaults to None.
+        index_range (Optional[List[int]], optional): First index and the index after the last one to read from the combination store. Defaults to None, read the indices in combination_indeces.
+        job_id (Optional[str], optional): Job to report the task's completion to, see `simian.progress`. With a job id, failed combinations are added to the job's failure ledger, and combinations rendered or quarantined by an earlier task are skipped. Defaults to None, no reporting.
+        task_key (Optional[str], optional): Key shared by all copies of a re-executed task. With a job id, the task is skipped once another copy finished it, and only the first finished copy is counted. Defaults to None.
 
     Returns:
         None
     """
-    combination_strings = []
-    for combo in combinations:
-        combination_string = json.dumps(combo)
-        combination_string = shlex.quote(combination_string)
-        combination_strings.append(combination_string)
+    if job_id is not None and task_key is not None:
+        # another copy of a re-executed task may have finished it already
+        if is_task_claimed(get_redis_client(), job_id, task_key):
+            logger.info(f"Task {task_key} of job {job_id} is done, skipping")
+            return "Task completed"
+        num_combinations = (
+            index_range[1] - index_range[0] if index_range else len(combination_indeces)
+        )
+        try:
+            report_start(get_redis_client(), job_id, task_key, num_combinations)
+        except Exception:
+            logger.exception(f"Failed to report start of task {task_key}")
 
-    # upload to Hugging Face
-    if upload_dest == "hf":
+    if job_id is not None:
+        try:
+            set_node_busy(
+                get_redis_client(),
+                True,
+                hostname=current_task.request.hostname if current_task else None,
+            )
+        except Exception:
+            logger.exception("Failed to mark node busy")
 
-        # create output directory, add time to name so each new directory is unique
-        output_dir += str(time.time())
-        os.makedirs(output_dir, exist_ok=True)
+    task_start = time.time()
+    rendered = False
+    num_rendered = 0
+    num_failed = 0
+    pin_id = f"{socket.gethostname()}-{os.getpid()}-{time.time()}"
 
-        # render images in batches (batches to handle rate limiting of uploads)
-        batch_size = len(combination_indeces)
-        for i in range(batch_size):
+    # shared by all jobs of this worker, so uploads overlap with rendering
+    upload_queue = get_upload_queue(upload_dest)
+    if job_id is not None and upload_queue.on_pending is None:
+        # the autoscaler keeps idle nodes until their outputs are uploaded
+        upload_queue.on_pending = functools.partial(publish_uploads, get_redis_client())
 
-            args = f" --width {width} --height {height} --combination_index {combination_indeces[i]}"
-            args += f" --output_dir {output_dir}"
-            args += f" --hdri_path {hdri_path}"
-            args += f" --start_frame {start_frame} --end_frame {end_frame}"
-            args += f" --combination {combination_strings[i]}"
+    try:
+        # Resolve the combinations of index-only tasks from the job's store
+        store_path = None
+        if combination_store is not None:
+            if index_range is not None:
+                store_path, stored = resolve_combinations(
+                    combination_store, index_range[0], index_range[1]
+                )
+            else:
+                store_path, stored = resolve_combination_indices(
+                    combination_store, combination_indeces
+                )
+            combination_indeces = [index for index, _ in stored]
+            combinations = [combination for _, combination in stored]
 
-            command = f"{sys.executable} -m simian.render -- {args}"
-            logger.info(f"Worker running simian.render")
+        # Render combinations sharing backgrounds, materials and objects back to back
+        order = order_by_assets(combinations)
+        combination_indeces = [combination_indeces[i] for i in order]
+        combinations = [combinations[i] for i in order]
 
-            subprocess.run(["bash", "-c", command], check=True)
+        # Keep the assets of the whole batch cached while it renders
+        asset_paths = []
+        for combo in combinations:
+            asset_paths += get_combination_asset_paths(combo, hdri_path)
+        pin_assets(asset_paths, pin_id)
 
-        distributask.upload_directory(output_dir)
+        if upload_dest == "hf":
+            # add time to name so each new directory is unique
+            output_dir += str(time.time())
+        os.makedirs(output_dir, exist_ok=True)
+        submitted = set()
 
-    # upload to aws s3 bucket
-    else:
+        # an earlier copy or delivery of this task may have rendered some of them already
+        pending = []
+        for combination_index, combination in zip(combination_indeces, combinations):
+            output_key = get_output_key(combination_index, frame_range)
+            if job_id is not None:
+                status = get_output_status(get_redis_client(), job_id, output_key)
+                if status is not None:
+                    logger.info(f"Combination {output_key} is {status}, skipping")
+                    continue
+            pending.append((combination_index, combination))
 
-        os.makedirs(output_dir, exist_ok=True)
+        def add_failure(combination_index: int, failure: Dict[str, Any]) -> None:
+            """Add a combination that could not be rendered to the job's failure ledger."""
+            if job_id is None:
+                return
+            output_key = get_output_key(combination_index, frame_range)
+            if record_failure(get_redis_client(), job_id, output_key, failure):
+                logger.warning(
+                    f"Quarantined combination {output_key} after a {failure['error']} error"
+                )
+
+        def mark_uploaded(combination_indices: List[int]) -> None:
+            """Mark combinations rendered once their outputs are uploaded, so retried and re-executed tasks skip them."""
+            if job_id is None:
+                return
+            for combination_index in combination_indices:
+                output_key = get_output_key(combination_index, frame_range)
+                mark_rendered(get_redis_client(), job_id, output_key)
+
+        def submit_rendered(combination_indices: List[int]) -> List[int]:
+            """Queue the outputs of rendered combinations for upload, and fail the ones without an output."""
+            uploaded = []
+            for combination_index in combination_indices:
+                if frame_range:
+                    file_location = get_chunk_path(output_dir, combination_index, frame_range)
+                else:
+                    file_location = f"{output_dir}/{combination_index}.mp4"
+                if not os.path.isfile(file_location):
+                    # marking it rendered would skip it in every later task
+                    add_failure(
+                        combination_index,
+                        {"error": "render", "message": "Render wrote no output", "attempts": 1},
+                    )
+                    continue
+                uploaded.append(combination_index)
+
+                if upload_dest == "hf":
+                    continue
+                if frame_range:
+                    # chunks are joined with the commands the coordinator lists at the end of the job
+                    file_upload_name = get_chunk_upload_name(combination_index, frame_range)
+                else:
+                    file_upload_name = f"{combination_index:05d}.mp4"
 
-        combination_index = combination_indeces[0]
-        combination = combination_strings[0]
+                upload_queue.submit(
+                    file_location,
+                    file_upload_name,
+                    functools.partial(mark_uploaded, [combination_index]),
+                )
 
-        args = f" --width {width} --height {height} --combination_index {combination_index}"
-        args += f" --output_dir {output_dir}"
-        args += f" --hdri_path {hdri_path}"
-        args += f" --start_frame {start_frame} --end_frame {end_frame}"
-        args += f" --combination {combination}"
+            if upload_dest == "hf" and uploaded:
+                submit_outputs(
+                    upload_queue,
+                    output_dir,
+                    submitted,
+                    functools.partial(mark_uploaded, uploaded),
+                )
+            return uploaded
 
-        command = f"{sys.executable} -m simian.render -- {args}"
-        logger.info(f"Worker running simian.render")
+        if pipeline:
+            # overlap building the next scene with rendering the current one
+            rendered_indices = set()
+            if pending:
+                rendered_indices = set(
+                    run_pipeline(
+                        pending,
+                        output_dir,
+                        hdri_path=hdri_path,
+                        start_frame=start_frame,
+                        end_frame=end_frame,
+                        frame_range=tuple(frame_range) if frame_range else None,
+                    )
+                )
 
-        subprocess.run(["bash", "-c", command], check=True)
+            # the pipeline logs why, a crashed stage loses the combinations it still had
+            for combination_index, _ in pending:
+                if combination_index not in rendered_indices:
+                    num_failed += 1
+                    add_failure(
+                        combination_index,
+                        {"error": "crash", "message": "Not rendered by the pipeline", "attempts": 1},
+                    )
+            uploaded = submit_rendered(sorted(rendered_indices))
+            num_rendered = len(uploaded)
+            num_failed += len(rendered_indices) - len(uploaded)
 
+        else:
+            # render every combination on its own, so a bad asset only fails its combination
+            for combination_index, combination in pending:
+                command = [sys.executable, "-m", "simian.render", "--"]
+                command += ["--width", str(width), "--height", str(height)]
+                command += ["--combination_index", str(combination_index)]
+                command += ["--output_dir", output_dir, "--hdri_path", hdri_path]
+                command += ["--start_frame", str(start_frame), "--end_frame", str(end_frame)]
+                # with a store, render reads the combination from it instead of the command line
+                if store_path is not None:
+                    command += ["--combination_store", store_path]
+                else:
+                    command += ["--combination", json.dumps(combination)]
+                if frame_range:
+                    command += ["--frame_range", str(frame_range[0]), str(frame_range[1])]
 
-        file_location = f"{output_dir}/{combination_index}.mp4"
+                logger.info(f"Worker running simian.render")
+                failure = run_render(command)
+                if failure is not None:
+                    num_failed += 1
+                    add_failure(combination_index, failure)
+                    continue
 
-        file_upload_name = f"{combination_index:05d}.mp4"
+                # upload in the background while the worker renders the next combination
+                if submit_rendered([combination_index]):
+                    num_rendered += 1
+                else:
+                    num_failed += 1
 
-        s3_client = boto3.client('s3')
-        s3_client.upload_file(file_location, os.getenv("S3_BUCKET_NAME"), file_upload_name)
+        # a task fails only when none of its combinations could be rendered
+        rendered = num_rendered > 0 or num_failed == 0
+    finally:
+        unpin_assets(pin_id)
+        if job_id is not None:
+            # failed tasks are reported too, so the coordinator knows when the job is over
+            try:
+                if rendered:
+                    # let the coordinator route tasks needing these assets here
+                    publish_node_assets(
+                        get_redis_client(),
+                        set().union(*map(get_combination_assets, combinations)),
+                        current_task.request.hostname if current_task else None,
+                    )
+                counted = report_completion(
+                    get_redis_client(),
+                    job_id,
+                    num_rendered if rendered else len(combination_indeces),
+                    time.time() - task_start,
+                    failed=not rendered,
+                    task_key=task_key,
+                )
+                if not counted:
+                    logger.info(f"Task {task_key} of job {job_id} was finished by another copy")
+            except Exception:
+                logger.exception(f"Failed to report progress of job {job_id}")
+            # a node left busy would never be scaled down
+            try:
+                set_node_busy(get_redis_client(), False, combinations=num_rendered)
+            except Exception:
+                logger.exception("Failed to mark node idle")
+
+    logger.info(f"Asset cache: {get_host_cache_stats()}")
+    logger.info(f"Uploads pending: {upload_queue.pending}")
 
     return "Task completed"
 
@@ -106,6 +376,26 @@ if __name__ == "__main__" or any("celery" in arg for arg in sys.argv):
     from distributask.distributask import create_from_config
 
     distributask = create_from_config()
+
+    # Track assets cached before the worker started so they count against the quota
+    if CACHE_QUOTA_BYTES > 0:
+        register_cache_store(get_cache_ledger(), objaverse.BASE_PATH, "objaverse")
+        register_cache_store(get_cache_ledger(), get_cache_path("materials"), "materials")
     distributask.register_function(run_job)
 
     celery = distributask.app
+    # every worker also consumes its own queue, for tasks routed to its cached assets
+    celery.conf.worker_direct = True
+
+    # lets the coordinator tell idle and dead nodes apart, see simian.autoscaler
+    start_heartbeat(get_redis_client())
+
+    # lets the coordinator rank offer types and drop slow machines, see simian.offers
+    if BENCHMARK_ON_STARTUP:
+        benchmark = run_benchmark_process()
+        if benchmark is not None:
+            logger.info(f"Benchmark: {benchmark}")
+            try:
+                publish_benchmark(get_redis_client(), benchmark)
+            except Exception:
+                logger.exception("Failed to publish benchmark")